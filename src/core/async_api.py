@@ -0,0 +1,164 @@
+import os
+import asyncio
+import threading
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from src.core.processor import ImageProcessor, OperationCancelled
+from src.utils.logger import get_logger
+
+logger = get_logger("core.async_api")
+
+EXECUTOR_THREAD = 'thread'
+EXECUTOR_PROCESS = 'process'
+
+_DONE = object()
+
+
+def _split_to_list(source, **kwargs):
+    """
+    split_to_buffers collected in a worker process, whose generators cannot
+    be sent back.
+    """
+    return list(ImageProcessor.split_to_buffers(source, **kwargs))
+
+
+class AsyncImageProcessor:
+    """
+    Asyncio front end for ImageProcessor.
+
+    Every operation runs on an executor, so the event loop never waits for
+    decoding or encoding: executor='thread' (the default) or 'process'
+    with max_workers workers, or an Executor passed in, which is left
+    running on close(). At most max_concurrency operations run at once
+    (max_workers by default); further calls wait their turn without
+    taking a worker.
+
+    progress(done, total) callbacks are called on the event loop.
+    Cancelling the awaiting task stops a running split or stitch at its
+    next tile or image boundary; its partial outputs are removed before
+    the CancelledError propagates. Worker processes cannot be reached
+    once started, so with 'process' a cancelled job still runs to its
+    end (in the background) and progress is not reported.
+
+        async with AsyncImageProcessor(max_workers=4) as images:
+            tiles = await images.split("scan.png", "out", rows=3, cols=3)
+            async for name, data in images.split_tiles(upload_bytes):
+                ...
+    """
+    def __init__(self, executor=EXECUTOR_THREAD, max_workers=None, max_concurrency=None):
+        max_workers = max_workers or os.cpu_count() or 1
+        self._owns_executor = not isinstance(executor, Executor)
+        if executor == EXECUTOR_THREAD:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-image")
+        elif executor == EXECUTOR_PROCESS:
+            executor = ProcessPoolExecutor(max_workers=max_workers)
+        elif self._owns_executor:
+            raise ValueError(f"unknown executor: {executor}")
+        self._executor = executor
+        self._in_process = isinstance(executor, ProcessPoolExecutor)
+        self.max_concurrency = max_concurrency or max_workers
+        self._slots = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """
+        Shuts down an executor created here once its jobs are done.
+        """
+        if self._owns_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    async def split(self, image_path, output_dir, progress=None, **kwargs):
+        """
+        ImageProcessor.split_image; returns the output paths.
+        """
+        return await self._run(ImageProcessor.split_image, image_path, output_dir, progress=progress, **kwargs)
+
+    async def stitch(self, image_paths, output_path, progress=None, **kwargs):
+        """
+        ImageProcessor.stitch_images; returns the output path (or paths).
+        """
+        return await self._run(ImageProcessor.stitch_images, list(image_paths), output_path, progress=progress, **kwargs)
+
+    async def stitch_to_bytes(self, sources, progress=None, **kwargs):
+        """
+        ImageProcessor.stitch_to_bytes; returns the encoded result.
+        """
+        return await self._run(ImageProcessor.stitch_to_bytes, list(sources), progress=progress, **kwargs)
+
+    async def preview(self, image_paths, mode='resize', max_width=300, overlap=False):
+        """
+        ImageProcessor.generate_stitch_preview; returns a PIL image or None.
+        Cancelling only helps before the preview has started.
+        """
+        return await self._run(ImageProcessor.generate_stitch_preview, list(image_paths), mode, max_width, overlap,
+                               cancellable=False)
+
+    async def split_tiles(self, source, progress=None, **kwargs):
+        """
+        Async iterator over the (file name, encoded bytes) tiles of
+        ImageProcessor.split_to_buffers. On threads each tile is encoded
+        only when the consumer asks for it, and leaving the loop early
+        stops the split; a worker process splits the whole image first.
+        """
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            if self._in_process:
+                tiles = await loop.run_in_executor(self._executor, functools.partial(_split_to_list, source, **kwargs))
+                for tile in tiles:
+                    yield tile
+                return
+
+            if progress:
+                kwargs['progress_callback'] = lambda done, total: loop.call_soon_threadsafe(progress, done, total)
+            tiles = ImageProcessor.split_to_buffers(source, **kwargs)
+            pending = None
+            try:
+                while True:
+                    pending = loop.run_in_executor(self._executor, next, tiles, _DONE)
+                    tile = await pending
+                    pending = None
+                    if tile is _DONE:
+                        return
+                    yield tile
+            finally:
+                # The generator can only be closed once it is not running
+                if pending is not None:
+                    await asyncio.wait([pending])
+                await loop.run_in_executor(self._executor, tiles.close)
+
+    async def _run(self, fn, *args, progress=None, cancellable=True, **kwargs):
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            cancelled = threading.Event()
+            if cancellable and not self._in_process:
+                def progress_callback(done, total):
+                    if cancelled.is_set():
+                        raise OperationCancelled()
+                    if progress:
+                        loop.call_soon_threadsafe(progress, done, total)
+                kwargs['progress_callback'] = progress_callback
+            future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                cancelled.set()
+                if self._in_process:
+                    # Still runs; retrieve its outcome so nothing is reported as lost
+                    future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                else:
+                    # Hold the slot until the job has stopped and cleaned up
+                    await asyncio.wait([future])
+                    if not future.cancelled() and not isinstance(future.exception(), OperationCancelled):
+                        logger.debug(f"{fn.__name__} finished before it could be cancelled")
+                raise
+
+    def _slot(self):
+        # Created on first use, inside the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
@@ -0,0 +1,99 @@
+import threading
+from PyQt6.QtCore import QObject, pyqtSignal
+from src.utils.logger import get_logger
+
+logger = get_logger("core.batch")
+
+
+class BatchRun(QObject):
+    """
+    A group of workers submitted through a JobScheduler that can be paused,
+    resumed and cancelled as a whole.
+
+    Pausing takes the batch's queued jobs out of the scheduler and blocks
+    running jobs at their next checkpoint (tile or image boundary).
+    Cancelling drops queued jobs immediately, reporting them through their
+    own cancelled/finished signals, and makes running jobs raise
+    OperationCancelled at their next checkpoint.
+    """
+    RUNNING = 'running'
+    PAUSED = 'paused'
+    CANCELLED = 'cancelled'
+    FINISHED = 'finished'
+
+    state_changed = pyqtSignal(str)
+
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.state = self.RUNNING
+        self._resume_event = threading.Event()
+        self._resume_event.set()
+        self._costs = {}
+        self._held = []
+        self._outstanding = 0
+
+    def submit(self, worker, cost=0):
+        worker.batch = self
+        self._costs[worker] = cost
+        self._outstanding += 1
+        worker.signals.finished.connect(self._on_worker_finished)
+        if self.state == self.PAUSED:
+            self._held.append(worker)
+            self.scheduler.track(worker)
+        else:
+            self.scheduler.submit(worker, cost)
+
+    def is_active(self):
+        return self.state in (self.RUNNING, self.PAUSED)
+
+    def checkpoint(self):
+        """
+        Called from worker threads between tiles/images. Blocks while the
+        batch is paused; cancellation is raised by the worker itself.
+        """
+        self._resume_event.wait()
+
+    def pause(self):
+        if self.state != self.RUNNING:
+            return
+        self._resume_event.clear()
+        self._held.extend(w for w in self._costs if self.scheduler.cancel_pending(w))
+        self._set_state(self.PAUSED)
+        logger.info(f"Batch paused, {len(self._held)} queued jobs held")
+
+    def resume(self):
+        if self.state != self.PAUSED:
+            return
+        held, self._held = self._held, []
+        self._set_state(self.RUNNING)
+        self._resume_event.set()
+        for worker in held:
+            self.scheduler.requeue(worker, self._costs[worker])
+
+    def cancel(self):
+        if not self.is_active():
+            return
+        held, self._held = self._held, []
+        dropped = held + [w for w in self._costs if self.scheduler.cancel_pending(w)]
+        for worker in self._costs:
+            worker.cancel()
+        self._set_state(self.CANCELLED)
+        # Wake paused workers so they can observe the cancellation
+        self._resume_event.set()
+        logger.info(f"Batch cancelled, {len(dropped)} queued jobs dropped")
+        for worker in dropped:
+            worker.signals.cancelled.emit()
+            worker.signals.finished.emit()
+
+    def _on_worker_finished(self):
+        self._outstanding -= 1
+        if self._outstanding <= 0 and self.state == self.RUNNING:
+            self._set_state(self.FINISHED)
+        elif self._outstanding <= 0 and self.state == self.CANCELLED:
+            # Emitted again once the last in-flight job has stopped
+            self.state_changed.emit(self.CANCELLED)
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
@@ -0,0 +1,187 @@
+import os
+import shutil
+import hashlib
+import threading
+from src.core.processor import ImageProcessor
+from src.core.journal import file_digest
+from src.utils.logger import get_logger
+
+logger = get_logger("core.dedup")
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif')
+
+# Bytes hashed from each end of a file before falling back to a full hash
+PARTIAL_BYTES = 64 * 1024
+
+
+def partial_digest(path, size):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        h.update(f.read(PARTIAL_BYTES))
+        if size > 2 * PARTIAL_BYTES:
+            f.seek(-PARTIAL_BYTES, os.SEEK_END)
+            h.update(f.read(PARTIAL_BYTES))
+    return h.hexdigest()
+
+
+def iter_image_files(paths):
+    """
+    Expands files and folders into image file paths, in walk order.
+    """
+    for p in paths:
+        if os.path.isfile(p):
+            if p.lower().endswith(IMAGE_EXTENSIONS):
+                yield p
+        elif os.path.isdir(p):
+            for root, _, filenames in os.walk(p):
+                for name in filenames:
+                    if name.lower().endswith(IMAGE_EXTENSIONS):
+                        yield os.path.join(root, name)
+
+
+class DuplicateIndex:
+    """
+    Thread-safe content index of imported files.
+
+    Files are compared by size first; only files of equal size get a
+    partial hash (head and tail), and only equal partial hashes get a full
+    hash. Most imports therefore hash nothing at all. Every duplicate is
+    mapped to the first file seen with the same content (its canonical).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = set()
+        self._by_size = {}
+        self._partial = {}
+        self._full = {}
+        self._duplicates = {}
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _partial_of(self, path, size):
+        digest = self._partial.get(path)
+        if digest is None:
+            digest = self._partial[path] = partial_digest(path, size)
+        return digest
+
+    def _full_of(self, path):
+        digest = self._full.get(path)
+        if digest is None:
+            digest = self._full[path] = file_digest(path)
+        return digest
+
+    def add(self, path):
+        """
+        Registers a file. Returns None if its content is new, otherwise the
+        canonical path it duplicates (which is path itself when the very
+        same file is imported twice).
+        """
+        key = self._key(path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if key in self._paths:
+                return path
+            candidates = self._by_size.get(size, [])
+            if candidates:
+                partial = self._partial_of(path, size)
+                for canonical in candidates:
+                    if self._partial_of(canonical, size) != partial:
+                        continue
+                    if self._full_of(canonical) == self._full_of(path):
+                        self._paths.add(key)
+                        self._duplicates.setdefault(canonical, []).append(path)
+                        return canonical
+            self._paths.add(key)
+            self._by_size.setdefault(size, []).append(path)
+            return None
+
+    def duplicates_of(self, path):
+        with self._lock:
+            return list(self._duplicates.get(path, []))
+
+    def remove(self, path):
+        """
+        Forgets a canonical file together with the duplicates mapped to it.
+        """
+        with self._lock:
+            for p in [path] + self._duplicates.pop(path, []):
+                self._paths.discard(self._key(p))
+                self._partial.pop(p, None)
+                self._full.pop(p, None)
+            for size, paths in list(self._by_size.items()):
+                if path in paths:
+                    paths.remove(path)
+                    if not paths:
+                        del self._by_size[size]
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+            self._by_size.clear()
+            self._partial.clear()
+            self._full.clear()
+            self._duplicates.clear()
+
+
+def scan_imports(paths, index):
+    """
+    Expands dropped paths and filters them through the index. Meant to run
+    in a worker thread. Returns (unique_paths, duplicates) where duplicates
+    is a list of (path, canonical_path) pairs.
+    """
+    unique = []
+    duplicates = []
+    for path in iter_image_files(paths):
+        try:
+            canonical = index.add(path)
+        except OSError as e:
+            logger.warning(f"Could not read {path} for deduplication: {e}")
+            continue
+        if canonical is None:
+            unique.append(path)
+        else:
+            duplicates.append((path, canonical))
+    if duplicates:
+        logger.info(f"Collapsed {len(duplicates)} duplicate files on import")
+    return unique, duplicates
+
+
+def fan_out_outputs(outputs, source_path, duplicate_path, output_dir):
+    """
+    Copies the tiles produced for source_path to the names they would have
+    had for duplicate_path in output_dir.
+    """
+    source_base = os.path.splitext(os.path.basename(source_path))[0]
+    duplicate_base = os.path.splitext(os.path.basename(duplicate_path))[0]
+    copies = []
+    for output in outputs:
+        name = os.path.basename(output)
+        target = os.path.join(output_dir, duplicate_base + name[len(source_base):])
+        if os.path.abspath(target) != os.path.abspath(output):
+            shutil.copyfile(output, target)
+        copies.append(target)
+    return copies
+
+
+def split_with_duplicates(image_path, output_dir, duplicate_targets=(), progress_callback=None, split_fn=None, **kwargs):
+    """
+    Splits image_path once and fans the tiles out to every duplicate.
+    duplicate_targets is a list of (duplicate_path, output_dir) pairs.
+    split_fn replaces ImageProcessor.split_image, e.g. with a pyramid
+    export. Tiles written into archives or by another split_fn cannot be
+    copied by name, so duplicates are split on their own in that case.
+    """
+    if split_fn is None:
+        split_fn = ImageProcessor.split_image
+    outputs = split_fn(image_path, output_dir, progress_callback=progress_callback, **kwargs)
+    all_outputs = list(outputs)
+    writer = kwargs.get('writer')
+    to_archive = kwargs.get('archive') or (writer is not None and not writer.writes_files)
+    for duplicate_path, duplicate_dir in duplicate_targets:
+        if to_archive or split_fn is not ImageProcessor.split_image:
+            all_outputs.extend(split_fn(duplicate_path, duplicate_dir, **kwargs))
+        else:
+            all_outputs.extend(fan_out_outputs(outputs, image_path, duplicate_path, duplicate_dir))
+    return all_outputs
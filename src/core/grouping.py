@@ -0,0 +1,115 @@
+import os
+import re
+from src.utils.logger import get_logger
+
+logger = get_logger("core.grouping")
+
+GROUP_BY_FOLDER = 'folder'
+GROUP_BY_PATTERN = 'pattern'
+GROUP_EVERY_N = 'every'
+
+_DIGITS = re.compile(r'(\d+)')
+_UNSAFE = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def natural_key(path):
+    """
+    Sort key that orders page_2 before page_10.
+    """
+    parts = _DIGITS.split(os.path.normcase(path))
+    return [int(p) if p.isdigit() else p for p in parts]
+
+
+def safe_name(name):
+    """
+    Turns a group name into something usable as a file name.
+    """
+    return _UNSAFE.sub("_", name).strip("._") or "group"
+
+
+def unique_file_names(names):
+    """
+    safe_name of each group name, with a numeric suffix where two would
+    end up the same (ignoring case, as on Windows).
+    """
+    result = []
+    used = set()
+    for name in names:
+        base = safe_name(name)
+        unique, n = base, 2
+        while unique.casefold() in used:
+            unique = f"{base}_{n}"
+            n += 1
+        used.add(unique.casefold())
+        result.append(unique)
+    return result
+
+
+def group_by_folder(paths):
+    """
+    One group per parent folder, named after the folder.
+    Folders with the same name in different places get a numeric suffix.
+    """
+    groups = {}
+    for path in paths:
+        groups.setdefault(os.path.dirname(os.path.abspath(path)), []).append(path)
+    result = []
+    used = set()
+    for folder in sorted(groups, key=natural_key):
+        name = os.path.basename(folder) or "root"
+        unique, n = name, 2
+        while unique in used:
+            unique = f"{name}_{n}"
+            n += 1
+        used.add(unique)
+        result.append((unique, sorted(groups[folder], key=natural_key)))
+    return result
+
+
+def group_by_pattern(paths, pattern):
+    """
+    Groups by the part of the file name matched by a regular expression:
+    its first capture group, or the whole match when the pattern has no
+    groups or the first one did not take part. Files that do not match are
+    left out and logged.
+    """
+    regex = re.compile(pattern)
+    groups = {}
+    unmatched = 0
+    for path in paths:
+        m = regex.search(os.path.splitext(os.path.basename(path))[0])
+        if not m:
+            unmatched += 1
+            continue
+        key = m.group(1) if regex.groups and m.group(1) is not None else m.group(0)
+        groups.setdefault(key, []).append(path)
+    if unmatched:
+        logger.info(f"{unmatched} files did not match group pattern {pattern!r}")
+    return [(key, sorted(groups[key], key=natural_key)) for key in sorted(groups, key=natural_key)]
+
+
+def group_every(paths, n):
+    """
+    Consecutive groups of n images in natural sort order; the last group
+    takes the remainder.
+    """
+    if n < 1:
+        raise ValueError("group size must be at least 1")
+    ordered = sorted(paths, key=natural_key)
+    count = (len(ordered) + n - 1) // n
+    width = max(3, len(str(count)))
+    return [(f"group_{i + 1:0{width}d}", ordered[i * n:(i + 1) * n]) for i in range(count)]
+
+
+def plan_groups(paths, by, pattern=None, n=None):
+    """
+    Returns [(group_name, paths)] for a batch stitch. Within a group images
+    are in natural file name order.
+    """
+    if by == GROUP_BY_FOLDER:
+        return group_by_folder(paths)
+    if by == GROUP_BY_PATTERN:
+        return group_by_pattern(paths, pattern)
+    if by == GROUP_EVERY_N:
+        return group_every(paths, n)
+    raise ValueError(f"unknown grouping: {by}")
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from src.utils.logger import get_logger
+
+logger = get_logger("core.journal")
+
+JOURNAL_NAME = ".imageprocessor_journal.jsonl"
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class JobJournal:
+    """
+    Append-only journal of completed jobs, stored as JSON lines in the
+    output directory.
+
+    Each entry records the identity of the inputs (size and mtime, plus a
+    content hash when identity='hash'), the processing parameters and the
+    produced outputs with their sizes. A job whose inputs, parameters and
+    outputs still match its entry is up to date and can be skipped. Entries
+    are appended as soon as a job finishes, so a crashed run resumes where
+    it stopped. The last entry for a key wins; the file is compacted when
+    superseded entries pile up. The file is read on first use rather than
+    on construction, so a journal can be created on the UI thread.
+    """
+    _registry = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(self, output_dir, identity='stat', verify='size'):
+        self.output_dir = os.path.abspath(output_dir)
+        self.path = os.path.join(self.output_dir, JOURNAL_NAME)
+        self.identity = identity
+        self.verify = verify
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._lines = 0
+        self._needs_newline = False
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def for_directory(cls, output_dir, identity='stat', verify='size'):
+        """
+        Returns the shared journal of a directory so that concurrent jobs
+        writing to it use the same lock and in-memory index.
+        """
+        key = os.path.normcase(os.path.abspath(output_dir))
+        with cls._registry_lock:
+            journal = cls._registry.get(key)
+            if journal is None:
+                journal = cls._registry[key] = cls(output_dir, identity, verify)
+            return journal
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                self._needs_newline = not line.endswith("\n")
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash; the job is simply redone
+                    continue
+                self._entries[entry['key']] = entry
+                self._lines += 1
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                self._load()
+            except OSError as e:
+                # Unreadable journal: every job is simply redone
+                logger.warning(f"Journal unavailable for {self.output_dir}: {e}")
+            self._loaded = True
+        if self._lines > 2 * len(self._entries) + 100:
+            self.compact()
+
+    def input_identity(self, path, with_hash=None):
+        st = os.stat(path)
+        identity = {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+        if with_hash is None:
+            with_hash = self.identity == 'hash'
+        if with_hash:
+            identity['hash'] = file_digest(path)
+        return identity
+
+    def _input_unchanged(self, recorded, path):
+        current = self.input_identity(path, with_hash=False)
+        if recorded['path'] != current['path'] or recorded['size'] != current['size']:
+            return False
+        if recorded['mtime_ns'] == current['mtime_ns']:
+            return True
+        # Touched but with identical content still counts as unchanged
+        return self.identity == 'hash' and 'hash' in recorded and recorded['hash'] == file_digest(path)
+
+    @staticmethod
+    def _normalize_params(params):
+        return json.loads(json.dumps(params, sort_keys=True))
+
+    def _output_valid(self, output):
+        path = os.path.join(self.output_dir, output['name'])
+        try:
+            if os.path.getsize(path) != output['size']:
+                return False
+        except OSError:
+            return False
+        if self.verify == 'hash' and output.get('hash'):
+            return file_digest(path) == output['hash']
+        return True
+
+    def lookup(self, key, input_paths, params):
+        """
+        Returns the recorded output paths if the job is up to date and its
+        outputs verify, otherwise None.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or entry['params'] != self._normalize_params(params):
+            return None
+        recorded = entry['inputs']
+        if len(recorded) != len(input_paths):
+            return None
+        try:
+            if not all(self._input_unchanged(r, p) for r, p in zip(recorded, input_paths)):
+                return None
+        except OSError:
+            return None
+        if not all(self._output_valid(o) for o in entry['outputs']):
+            return None
+        return [os.path.join(self.output_dir, o['name']) for o in entry['outputs']]
+
+    def record(self, key, input_paths, params, output_paths):
+        outputs = []
+        for p in output_paths:
+            output = {'name': os.path.relpath(os.path.abspath(p), self.output_dir), 'size': os.path.getsize(p)}
+            if self.verify == 'hash':
+                output['hash'] = file_digest(p)
+            outputs.append(output)
+        entry = {
+            'key': key,
+            'inputs': [self.input_identity(p) for p in input_paths],
+            'params': self._normalize_params(params),
+            'outputs': outputs,
+            'time': time.time(),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        self._ensure_loaded()
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                if self._needs_newline:
+                    f.write("\n")
+                    self._needs_newline = False
+                f.write(line + "\n")
+            self._entries[key] = entry
+            self._lines += 1
+
+    def __len__(self):
+        self._ensure_loaded()
+        with self._lock:
+            return len(self._entries)
+
+    def compact(self):
+        """
+        Rewrites the journal with only the latest entry per key.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._entries)
+        logger.info(f"Compacted journal {self.path} to {self._lines} entries")
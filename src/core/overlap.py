@@ -0,0 +1,158 @@
+import collections
+from PIL import Image, ImageChops, ImageStat
+from src.utils.logger import get_logger
+
+logger = get_logger("core.overlap")
+
+# Width of a row signature in cells
+SIGNATURE_WIDTH = 16
+# Cells and quantisation of the row keys used to propose offsets; coarse
+# enough that JPEG noise rarely changes a key
+KEY_WIDTH = 4
+KEY_SHIFT = 5
+# Keys this common (blank or ruled lines) say nothing about the offset
+MAX_KEY_REPEATS = 8
+# Proposed offsets that are verified row by row
+CANDIDATES = 5
+# A row matches when its mean difference is at most this (0-255)
+ROW_TOLERANCE = 6
+# Share of matching rows needed to accept an overlap; the rest may be
+# compression noise or an element that changed while scrolling
+MIN_MATCH = 0.9
+# Overlaps shorter than this are not trusted
+MIN_OVERLAP = 16
+# Featureless overlaps (blank margins) match at any offset and are ignored
+MIN_CONTRAST = 4.0
+# Fixed bars longer than this share of the height are not treated as bars
+MAX_BAR_SHARE = 0.25
+
+
+def row_signature(img):
+    """
+    Reduces an image to SIGNATURE_WIDTH grey cells per row at full height.
+    Each signature row depends only on the matching image row, so repeated
+    rows give repeated signatures.
+    """
+    if img.mode in ('RGB', 'RGBA', 'RGBX'):
+        # Green carries most of the luminance and skips a full conversion
+        img = img.getchannel('G')
+    elif img.mode != 'L':
+        img = img.convert('L')
+    return img.reduce((max(1, img.size[0] // SIGNATURE_WIDTH), 1))
+
+
+def _row_keys(signature):
+    width, height = signature.size
+    keys = signature.reduce((max(1, width // KEY_WIDTH), 1)).point(lambda v: v >> KEY_SHIFT)
+    step = keys.size[0]
+    data = keys.tobytes()
+    return [data[i:i + step] for i in range(0, len(data), step)]
+
+
+def _row_differences(a, b):
+    """
+    Mean difference of each pair of rows of two same-size signatures.
+    """
+    return ImageChops.difference(a, b).resize((1, a.size[1]), Image.Resampling.BOX).tobytes()
+
+
+def fixed_bars(upper_signature, lower_signature):
+    """
+    Heights of a header and a footer that are the same at the top and at the
+    bottom of both images, like the status and navigation bars of phone
+    screenshots. They do not scroll and are left out of the matching.
+    """
+    width = upper_signature.size[0]
+    height_a, height_b = upper_signature.size[1], lower_signature.size[1]
+    limit = int(min(height_a, height_b) * MAX_BAR_SHARE)
+    if limit < 1:
+        return 0, 0
+    top = _row_differences(upper_signature.crop((0, 0, width, limit)), lower_signature.crop((0, 0, width, limit)))
+    bottom = _row_differences(upper_signature.crop((0, height_a - limit, width, height_a)),
+                              lower_signature.crop((0, height_b - limit, width, height_b)))
+    header = next((i for i, d in enumerate(top) if d > ROW_TOLERANCE), limit)
+    footer = next((i for i, d in enumerate(reversed(bottom)) if d > ROW_TOLERANCE), limit)
+    # Identical images would be all bar
+    if header == limit or footer == limit:
+        return 0, 0
+    return header, footer
+
+
+def _match(upper, lower, k, header=0, footer=0):
+    """
+    Share of matching rows when lower starts k rows above the bottom of
+    upper, leaving out the bars, and the contrast of the compared rows.
+    """
+    width, height = upper.size
+    a = upper.crop((0, height - k + header, width, height - footer))
+    b = lower.crop((0, header, width, k - footer))
+    rows = _row_differences(a, b)
+    matched = sum(1 for d in rows if d <= ROW_TOLERANCE) / len(rows)
+    return matched, ImageStat.Stat(b).stddev[0]
+
+
+def find_overlap(upper, lower, upper_signature=None, lower_signature=None, min_overlap=MIN_OVERLAP):
+    """
+    Where two consecutive screenshots repeat each other. Returns
+    (cut_upper, cut_lower): rows to drop from the bottom of upper (its
+    fixed footer) and from the top of lower (its header and the repeated
+    rows), or (0, 0) if there is no convincing overlap. Both images must
+    have the same width.
+    Signatures can be passed in to reuse them across consecutive pairs.
+    """
+    if upper.size[0] != lower.size[0]:
+        raise ValueError("overlap detection needs images of the same width")
+    sig_a = upper_signature if upper_signature is not None else row_signature(upper)
+    sig_b = lower_signature if lower_signature is not None else row_signature(lower)
+    return match_signatures(sig_a, sig_b, min_overlap)
+
+
+def match_signatures(sig_a, sig_b, min_overlap=MIN_OVERLAP):
+    """
+    find_overlap on the row signatures of two same-width images.
+    Rows of the lower image whose quantised signature is rare in the upper
+    one vote for the offset that would align them, and the best voted
+    offsets are verified on the full signatures. A pair of screenshots
+    takes a few milliseconds.
+    """
+    height_a = sig_a.size[1]
+    limit = min(height_a, sig_b.size[1])
+    if limit < min_overlap:
+        return 0, 0
+    header, footer = fixed_bars(sig_a, sig_b)
+
+    rows_by_key = collections.defaultdict(list)
+    for row, key in enumerate(_row_keys(sig_a)[:height_a - footer]):
+        rows_by_key[key].append(row)
+    votes = collections.Counter()
+    for row, key in enumerate(_row_keys(sig_b)[:limit]):
+        rows = rows_by_key.get(key)
+        if row < header or not rows or len(rows) > MAX_KEY_REPEATS:
+            continue
+        for match in rows:
+            # lower starts at upper row match - row, overlapping height_a - that
+            k = height_a - match + row
+            if row < k <= limit:
+                votes[k] += 1
+
+    best = (0.0, 0)
+    for k, _ in votes.most_common(CANDIDATES):
+        if k - header - footer < min_overlap:
+            continue
+        matched, contrast = _match(sig_a, sig_b, k, header, footer)
+        if contrast >= MIN_CONTRAST and (matched, k) > best:
+            best = (matched, k)
+    matched, k = best
+    if matched < MIN_MATCH:
+        return 0, 0
+    return footer, k - footer
+
+
+def find_overlaps(images):
+    """
+    find_overlap for each pair of consecutive same-width images.
+    """
+    signatures = [row_signature(img) for img in images]
+    overlaps = [find_overlap(images[i], images[i + 1], signatures[i], signatures[i + 1]) for i in range(len(images) - 1)]
+    logger.debug(f"Detected overlaps: {overlaps}")
+    return overlaps
@@ -0,0 +1,212 @@
+import math
+import threading
+import collections
+from PIL import Image
+from src.core.overlap import match_signatures, row_signature
+from src.core.processor import ImageProcessor
+from src.core.segments import fitted_height, stitch_width
+from src.core.tiled_tiff import open_overview
+from src.utils.logger import get_logger
+from src.utils.tracing import tracer
+
+logger = get_logger("core.preview")
+
+# Width of the first, coarsest rendering of a whole stitch
+DRAFT_WIDTH = 64
+# Decoded sources kept for further renders (bytes)
+CACHE_BYTES = 256 * 1024 * 1024
+# Longest side of the downsample a split is previewed on
+SPLIT_PREVIEW_SIZE = 1024
+
+
+class StitchPreviewRenderer:
+    """
+    Renders any region of a stitch at any scale without composing it.
+
+    The layout (stitch width, the rows each image keeps and where they
+    land) comes from the image headers; with overlap the repeated rows
+    are matched on full-resolution row signatures once, as in
+    generate_stitch_preview. render(scale, box) then reads only the
+    images that box touches, at the lowest resolution the scale allows,
+    and resizes just the rows that are visible. Decoded sources are
+    cached up to CACHE_BYTES, so panning and zooming reuse them. Safe to
+    use from several threads.
+    """
+    def __init__(self, image_paths, mode='resize', overlap=False):
+        self.mode = mode
+        self.paths = []
+        self.sizes = []
+        for path in image_paths:
+            try:
+                with Image.open(path) as img:
+                    self.sizes.append(img.size)
+                self.paths.append(path)
+            except Exception as e:
+                logger.warning(f"Could not load {path} for preview: {e}")
+        if not self.paths:
+            raise ValueError("No images to preview")
+
+        self.width = stitch_width([w for w, _ in self.sizes], mode)
+        fitted = [fitted_height(size, self.width, mode) for size in self.sizes]
+        self.spans = [[0, h] for h in fitted]
+        if overlap:
+            with tracer.stage("overlap", images=len(self.paths)):
+                self._cut_overlaps(fitted)
+        self.offsets = []
+        y = 0
+        for top, bottom in self.spans:
+            self.offsets.append(y)
+            y += max(0, bottom - top)
+        self.height = y
+        self._cache = collections.OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    def fit_scale(self, max_width, max_height=None):
+        """
+        Scale at which the whole stitch fits max_width x max_height.
+        """
+        scale = max_width / self.width
+        if max_height:
+            scale = min(scale, max_height / max(1, self.height))
+        return scale
+
+    def render(self, scale, box=None):
+        """
+        The region box = (left, top, right, bottom) of the stitch, in
+        stitch pixels (the whole stitch by default), rendered at scale.
+        """
+        left, top, right, bottom = box or (0, 0, self.width, self.height)
+
+        def px(value, origin):
+            return round((value - origin) * scale)
+
+        canvas = Image.new('RGB', (max(1, px(right, left)), max(1, px(bottom, top))), 'white')
+        for i, (span_top, span_bottom) in enumerate(self.spans):
+            y0 = self.offsets[i]
+            visible_top = max(top, y0)
+            visible_bottom = min(bottom, y0 + span_bottom - span_top)
+            if visible_top >= visible_bottom:
+                continue
+            # Columns of the stitch this image covers
+            src_w, src_h = self.sizes[i]
+            if self.mode == 'fill':
+                inset = (self.width - src_w) // 2
+                covered = (max(left, inset), min(right, inset + src_w))
+            else:
+                covered = (left, right)
+            if covered[0] >= covered[1]:
+                continue
+            dest = (px(covered[0], left), px(visible_top, top), px(covered[1], left), px(visible_bottom, top))
+            if dest[2] <= dest[0] or dest[3] <= dest[1]:
+                continue
+            rows = (span_top + visible_top - y0, span_top + visible_bottom - y0)
+            with tracer.stage("render", image=i):
+                piece = self._piece(i, covered, rows, (dest[2] - dest[0], dest[3] - dest[1]), scale)
+            canvas.paste(piece, dest[:2])
+        return canvas
+
+    def _piece(self, i, columns, rows, size, scale):
+        """
+        Columns and rows of the fitted image i, resized to size.
+        """
+        src_w, src_h = self.sizes[i]
+        if self.mode == 'resize':
+            ratio = src_w / self.width
+            shift = 0
+        else:
+            ratio = 1
+            shift = (src_w - self.width) // 2 if self.mode == 'crop' else -((self.width - src_w) // 2)
+        img, decoded = self._source(i, scale / ratio)
+        k = ratio * decoded
+        box = ((columns[0] + shift) * ratio * decoded, rows[0] * k, (columns[1] + shift) * ratio * decoded, rows[1] * k)
+        box = (max(0, box[0]), max(0, box[1]), min(img.size[0], box[2]), min(img.size[1], box[3]))
+        return img.resize(size, Image.Resampling.BILINEAR, box=box, reducing_gap=2.0)
+
+    def _source(self, i, needed):
+        """
+        Image i decoded at no less than needed of its full size, and that
+        share. JPEGs are decoded reduced and tiled TIFFs read from their
+        pyramid where possible.
+        """
+        with self._lock:
+            cached = self._cache.get(i)
+            if cached is not None and cached[1] >= min(1.0, needed):
+                self._cache.move_to_end(i)
+                return cached
+        src_w, src_h = self.sizes[i]
+        with tracer.stage("decode", file=self.paths[i]):
+            img = open_overview(self.paths[i], math.ceil(max(src_w, src_h) * needed)) if needed < 1 else None
+            if img is None:
+                img = Image.open(self.paths[i])
+                if img.format == 'JPEG' and needed < 1:
+                    img.draft('RGB', (math.ceil(src_w * needed), math.ceil(src_h * needed)))
+            img = img.convert('RGB')
+        entry = (img, img.size[0] / src_w)
+        with self._lock:
+            old = self._cache.pop(i, None)
+            if old is not None:
+                self._cache_bytes -= _footprint(old[0])
+            self._cache[i] = entry
+            self._cache_bytes += _footprint(img)
+            while self._cache_bytes > CACHE_BYTES and len(self._cache) > 1:
+                _, (dropped, _) = self._cache.popitem(last=False)
+                self._cache_bytes -= _footprint(dropped)
+        return entry
+
+    def _cut_overlaps(self, fitted):
+        signatures = []
+        for path in self.paths:
+            with Image.open(path) as img:
+                signatures.append(row_signature(img))
+        for i in range(len(self.paths) - 1):
+            if self.sizes[i][0] != self.sizes[i + 1][0]:
+                continue
+            cut_upper, cut_lower = match_signatures(signatures[i], signatures[i + 1])
+            self.spans[i][1] -= round(cut_upper * fitted[i] / self.sizes[i][1])
+            self.spans[i + 1][0] = round(cut_lower * fitted[i + 1] / self.sizes[i + 1][1])
+
+
+def load_split_preview(path, max_size=SPLIT_PREVIEW_SIZE):
+    """
+    The image at path fitted into max_size x max_size, decoded at the
+    lowest resolution that allows it, and the size of the original.
+    Oriented as split_image reads it (EXIF orientation is not applied).
+    """
+    with Image.open(path) as source, tracer.stage("decode", file=path):
+        size = source.size
+        overview = open_overview(path, max_size)
+        img = source if overview is None else overview
+        if overview is None and img.format == 'JPEG':
+            img.draft('RGB', (max_size, max_size))
+        preview = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        if overview is not None:
+            overview.close()
+        preview.thumbnail((max_size, max_size))
+    return preview, size
+
+
+def grid_overlay(source_size, preview_size, rows, cols):
+    """
+    The tiles split_image cuts an image of source_size into, as pairs of
+    (crop box in the original, the same box in a preview of
+    preview_size). Boxes come from ImageProcessor.split_regions, so the
+    last row and column keep the remainder pixels; shared edges map to
+    the same preview pixel, and every preview box is at least 1 px.
+    """
+    sx = preview_size[0] / source_size[0]
+    sy = preview_size[1] / source_size[1]
+    cells = []
+    for left, top, right, bottom in ImageProcessor.split_regions(source_size[0], source_size[1], rows, cols):
+        x0, y0 = min(round(left * sx), preview_size[0] - 1), min(round(top * sy), preview_size[1] - 1)
+        box = (x0, y0, max(x0 + 1, round(right * sx)), max(y0 + 1, round(bottom * sy)))
+        cells.append(((left, top, right, bottom), box))
+    return cells
+
+
+def _footprint(img):
+    return img.size[0] * img.size[1] * len(img.getbands())
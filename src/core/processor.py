@@ -1,81 +1,360 @@
 import os
-from PIL import Image, ImageOps
-from src.utils.logger import logger
+import io
+import json
+from PIL import Image, ImageOps, TiffImagePlugin
+from src.utils.logger import get_logger
+from src.utils.tracing import tracer
+from src.core.writer import default_writer, ArchiveWriter
+from src.core.overlap import find_overlaps, match_signatures, row_signature
+from src.core.slicing import page_regions
+from src.core.tile_filter import ACTION_REFERENCE, reference_name, relative_reference
+from src.core.target_size import encode_within
+from src.core.segments import BIG_TIFF_BYTES, fitted_height, plan_segments, segment_limit, segment_paths, stitch_width
+from src.core.tiled_tiff import BAND_TILES, TILE_SIZE, TiledTiffWriter, encode_tiled_tiff, open_overview
+
+logger = get_logger("core.processor")
+
+class OperationCancelled(Exception):
+    """
+    Raised from a progress callback to stop an operation at the next tile or
+    image boundary.
+    """
+    pass
 
 class ImageProcessor:
     @staticmethod
-    def split_image(image_path, output_dir, output_format=None, quality=95, rows=2, cols=2):
+    def split_image(image_path, output_dir, output_format=None, quality=95, rows=2, cols=2, progress_callback=None, journal=None, writer=None, archive=None, page_height=None, tile_filter=None, max_bytes=None, downscale=False, tiled=None):
         """
-        Splits an image into rows * cols equal parts.
+        Splits an image into rows * cols equal parts, or with page_height
+        into pages of about that height cut at low-content rows (see
+        src/core/slicing.py).
+        Tiles are encoded here and handed to writer (an AsyncWriter, the
+        shared default_writer() if None) so encoding continues while earlier
+        tiles are still being written; the call returns once all of its
+        tiles are on disk.
+        progress_callback(done, total) is called once the image is decoded and
+        after each tile is encoded, the last call after every write finished;
+        it may raise OperationCancelled to abort the split. Tiles are written
+        atomically and the tiles of an aborted split are removed again, so an
+        input is either fully split or absent.
+        With a JobJournal, an input whose recorded outputs are still up to
+        date is skipped and each finished split is recorded.
+        archive='zip' or 'tar' writes the tiles into output_dir/<name>.<archive>
+        instead and returns [archive path]. A shared ArchiveWriter passed as
+        writer collects the tiles of many inputs in one archive; the journal
+        is not used then, since the tiles are not files of their own.
+        The tiles of an input are held in memory until all of them are
+        encoded and only then added to a shared archive, so a cancelled or
+        failed input leaves no entries in it; its last progress call comes
+        before they are added.
+        A TileFilter leaves blank and repeated tiles out before they are
+        encoded; with its 'reference' action they are listed in
+        <name>_refs.json instead. Tiles of other inputs are referred to only
+        once their split has completed, and not at all with archive.
+        max_bytes caps the size of each tile: the quality of a tile that
+        would be larger is lowered, and with downscale its size too, in
+        trial encodes held in memory (see src/core/target_size.py).
+        tiled='deflate', 'jpeg' or 'none' writes each tile as a tiled,
+        pyramidal TIFF with that compression (see src/core/tiled_tiff.py).
         """
+        output_files = []
+        references = {}
+        pending = []
+        own_archive = None
+        if writer is None:
+            writer = default_writer()
+        if not writer.writes_files:
+            journal = None
         try:
-            img = Image.open(image_path)
-            # Preserve metadata
-            exif = img.info.get('exif')
-            
-            width, height = img.size
-            
-            # Calculate grid sizes
-            part_width = width // cols
-            part_height = height // rows
-
-            # Define regions
-            regions = []
-            for r in range(rows):
-                for c in range(cols):
-                    left = c * part_width
-                    top = r * part_height
-                    # For the last column/row, take the remaining pixels to handle rounding
-                    right = width if c == cols - 1 else (c + 1) * part_width
-                    bottom = height if r == rows - 1 else (r + 1) * part_height
-                    regions.append((left, top, right, bottom))
-            
             base_name = os.path.splitext(os.path.basename(image_path))[0]
-            ext = output_format if output_format else os.path.splitext(image_path)[1][1:]
-            if not ext:
-                ext = "jpg"
-            
-            output_files = []
-            
-            for i, box in enumerate(regions):
-                cropped = img.crop(box)
-                output_filename = f"{base_name}_{i+1}.{ext}"
-                output_path = os.path.join(output_dir, output_filename)
-                
-                save_kwargs = {'quality': quality}
-                if exif:
-                    save_kwargs['exif'] = exif
-                
-                # Handle RGBA to RGB conversion for JPEG
-                if ext.lower() in ['jpg', 'jpeg'] and cropped.mode == 'RGBA':
-                    cropped = cropped.convert('RGB')
-                    
-                cropped.save(output_path, **save_kwargs)
-                output_files.append(output_path)
-                
-            logger.info(f"Successfully split image: {image_path} into {rows}x{cols}")
+            if tiled:
+                output_format = "tif"
+            ext = ImageProcessor.split_extension(image_path, output_format)
+            params = ImageProcessor.split_params(image_path, output_format, quality, rows, cols, page_height)
+            if tiled:
+                params['tiled'] = tiled
+            if max_bytes:
+                params['max_bytes'] = max_bytes
+                params['downscale'] = downscale
+            if archive:
+                params['archive'] = archive
+            if tile_filter is not None:
+                params['tile_filter'] = tile_filter.params()
+            if journal is not None:
+                cached = journal.lookup(os.path.abspath(image_path), [image_path], params)
+                if cached is not None:
+                    logger.debug(f"Skipping up-to-date input: {image_path}")
+                    return cached
+
+            with tracer.stage("open", file=image_path):
+                img = Image.open(image_path)
+            with tracer.stage("decode", file=image_path):
+                img.load()
+            if page_height:
+                with tracer.stage("scan", file=image_path):
+                    regions = page_regions(img, page_height)
+            else:
+                regions = ImageProcessor.split_regions(img.size[0], img.size[1], rows, cols)
+            if archive:
+                own_archive = writer = ArchiveWriter(os.path.join(output_dir, f"{base_name}.{archive}"), root=output_dir)
+            # Entries of a shared archive cannot be taken back once added
+            staged = [] if not writer.writes_files and own_archive is None else None
+            total = len(regions)
+            if progress_callback:
+                progress_callback(0, total)
+
+            def tile_path(i):
+                return os.path.join(output_dir, f"{base_name}_{i+1}.{ext}")
+
+            # A reference cannot reach into the archive of another input
+            across_inputs = own_archive is None
+            skip = None
+            if tile_filter is not None:
+                def skip(i, tile):
+                    with tracer.stage("classify", file=image_path, tile=i + 1):
+                        reference = tile_filter.check(tile, tile_path(i), image_path, across_inputs)
+                    if reference is not None:
+                        references[os.path.basename(tile_path(i))] = relative_reference(reference, output_dir)
+                    return reference is not None
+
+            for i, data in ImageProcessor._iter_encoded_tiles(img, ext, quality, label=image_path, regions=regions, skip=skip,
+                                                                   max_bytes=max_bytes, downscale=downscale, tiled=tiled):
+                if data is not None:
+                    output_path = tile_path(i)
+                    output_files.append(output_path)
+                    if staged is not None:
+                        staged.append((output_path, data))
+                    else:
+                        pending.append(writer.submit(output_path, data))
+                if progress_callback and i + 1 < total:
+                    progress_callback(i + 1, total)
+
+            if references and tile_filter.action == ACTION_REFERENCE:
+                manifest_path = os.path.join(output_dir, reference_name(base_name))
+                output_files.append(manifest_path)
+                manifest = json.dumps(references, indent=2).encode('utf-8')
+                if staged is not None:
+                    staged.append((manifest_path, manifest))
+                else:
+                    pending.append(writer.submit(manifest_path, manifest))
+
+            if staged is not None:
+                if progress_callback:
+                    progress_callback(total, total)
+                for output_path, data in staged:
+                    pending.append(writer.submit(output_path, data))
+
+            with tracer.stage("flush", file=image_path):
+                for future in pending:
+                    future.result()
+            if own_archive is not None:
+                own_archive.close()
+                output_files = [own_archive.archive_path]
+            if progress_callback and staged is None:
+                progress_callback(total, total)
+            if journal is not None:
+                journal.record(os.path.abspath(image_path), [image_path], params, output_files)
+            if page_height:
+                logger.info(f"Successfully sliced image: {image_path} into {total} pages")
+            else:
+                logger.info(f"Successfully split image: {image_path} into {rows}x{cols}")
+            if references:
+                logger.debug(f"Left {len(references)} blank or repeated tiles of {image_path} out")
+            if tile_filter is not None:
+                tile_filter.commit(image_path, across_inputs)
             return output_files
 
+        except OperationCancelled:
+            ImageProcessor._discard_writes(pending, writer, archive=own_archive)
+            if tile_filter is not None:
+                tile_filter.forget(image_path)
+            logger.info(f"Split cancelled: {image_path}")
+            raise
         except Exception as e:
+            ImageProcessor._discard_writes(pending, writer, archive=own_archive)
+            if tile_filter is not None:
+                tile_filter.forget(image_path)
             logger.error(f"Error splitting image {image_path}: {e}")
             raise
 
     @staticmethod
-    def stitch_images(image_paths, output_path, mode='resize', output_format=None, quality=95):
+    def split_regions(width, height, rows=2, cols=2):
+        """
+        Crop boxes of the rows * cols grid of an image, row by row.
+        """
+        # Calculate grid sizes
+        part_width = width // cols
+        part_height = height // rows
+
+        # Define regions
+        regions = []
+        for r in range(rows):
+            for c in range(cols):
+                left = c * part_width
+                top = r * part_height
+                # For the last column/row, take the remaining pixels to handle rounding
+                right = width if c == cols - 1 else (c + 1) * part_width
+                bottom = height if r == rows - 1 else (r + 1) * part_height
+                regions.append((left, top, right, bottom))
+        return regions
+
+    @staticmethod
+    def _iter_encoded_tiles(img, ext, quality=95, rows=2, cols=2, label=None, regions=None, skip=None, max_bytes=None, downscale=False, tiled=None):
+        """
+        Yields (index, encoded bytes) for the rows * cols tiles of a decoded
+        image, row by row, or for the given crop boxes. Shared by
+        split_image and the streaming service.
+        Tiles for which skip(index, tile) is true are not encoded and come
+        with None instead of bytes. max_bytes, downscale and tiled work as
+        in split_image.
+        """
+        # Preserve metadata
+        exif = img.info.get('exif')
+        
+        if regions is None:
+            regions = ImageProcessor.split_regions(img.size[0], img.size[1], rows, cols)
+
+        save_kwargs = {'quality': quality}
+        if exif:
+            save_kwargs['exif'] = exif
+
+        for i, box in enumerate(regions):
+            with tracer.stage("crop", file=label, tile=i + 1):
+                cropped = img.crop(box)
+            if skip is not None and skip(i, cropped):
+                yield i, None
+                continue
+            
+            # Handle RGBA to RGB conversion for JPEG
+            if ext.lower() in ['jpg', 'jpeg'] and cropped.mode == 'RGBA':
+                with tracer.stage("convert", file=label, tile=i + 1):
+                    cropped = cropped.convert('RGB')
+                
+            with tracer.stage("encode", file=label, tile=i + 1):
+                if tiled:
+                    data = encode_tiled_tiff(cropped, tiled, quality)
+                else:
+                    data = ImageProcessor._encode_limited(cropped, ext, save_kwargs, max_bytes, downscale)
+            yield i, data
+
+    @staticmethod
+    def split_to_buffers(source, output_format=None, quality=95, rows=2, cols=2, name="tile", progress_callback=None, max_bytes=None, downscale=False):
+        """
+        Splits an image without touching the disk. source may be encoded
+        bytes, a binary file-like object, an open PIL image or a path.
+        Yields (file name, encoded bytes) for each tile, named like the files
+        of split_image. The format defaults to the source's own, png if it
+        has none. progress_callback, max_bytes and downscale work as in
+        split_image.
+        """
+        img = ImageProcessor._open_source(source)
+        ext = output_format if output_format else ImageProcessor.image_extension(img)
+        total = rows * cols
+        if progress_callback:
+            progress_callback(0, total)
+        for i, data in ImageProcessor._iter_encoded_tiles(img, ext, quality, rows, cols, label=name,
+                                                                   max_bytes=max_bytes, downscale=downscale):
+            if progress_callback:
+                progress_callback(i + 1, total)
+            yield f"{name}_{i+1}.{ext}", data
+
+    @staticmethod
+    def stitch_to_bytes(sources, mode='resize', output_format=None, quality=95, progress_callback=None, overlap=False, max_bytes=None, downscale=False):
+        """
+        Stitches images held in memory (anything split_to_buffers accepts)
+        and returns the encoded result. The format defaults to that of the
+        first image. progress_callback(done, total) counts decoded images,
+        composed images and the encode step. overlap, max_bytes and
+        downscale work as in stitch_images.
+        """
+        total_steps = 2 * len(sources) + 1
+        step = [0]
+
+        def advance():
+            step[0] += 1
+            if progress_callback:
+                progress_callback(step[0], total_steps)
+
+        images = ImageProcessor._open_sources(sources, on_step=advance)
+        ext = output_format if output_format else ImageProcessor.image_extension(images[0])
+        exif = images[0].info.get('exif')
+        with tracer.stage("compose", images=len(images)):
+            final_img = ImageProcessor._stitch_in_memory(images, mode, advance, overlap)
+        data = ImageProcessor._encode_output(final_img, ext, quality, exif, max_bytes=max_bytes, downscale=downscale)
+        advance()
+        return data
+
+    @staticmethod
+    def image_extension(img, fallback="png"):
+        """
+        File extension matching the format an image was decoded from.
+        """
+        fmt = (img.format or fallback).lower()
+        return "jpg" if fmt == "jpeg" else fmt
+
+    @staticmethod
+    def split_extension(image_path, output_format=None):
+        ext = output_format if output_format else os.path.splitext(image_path)[1][1:]
+        return ext if ext else "jpg"
+
+    @staticmethod
+    def split_params(image_path, output_format=None, quality=95, rows=2, cols=2, page_height=None):
+        """
+        Parameters identifying a split job in a JobJournal.
+        """
+        ext = ImageProcessor.split_extension(image_path, output_format)
+        if page_height:
+            return {'op': 'slice', 'page_height': page_height, 'format': ext.lower(), 'quality': quality}
+        return {'op': 'split', 'rows': rows, 'cols': cols, 'format': ext.lower(), 'quality': quality}
+
+    @staticmethod
+    def stitch_images(image_paths, output_path, mode='resize', output_format=None, quality=95, progress_callback=None, journal=None, writer=None, overlap=False, max_bytes=None, downscale=False, max_height=None, multipage=False, tiled=None):
         """
         Stitches multiple images vertically.
         mode: 'resize' (scale to max width), 'crop' (crop to min width), 'fill' (pad to max width)
+        overlap=True drops the rows each image repeats from the one above
+        it (and fixed header/footer bars), as in scrolling screenshots.
+        max_bytes caps the size of the output file: the quality search (and
+        with downscale the downscaling) runs on the composed image in
+        memory, so only the result that fits is written.
+        A stitch taller than the format allows (65535 rows for JPEG, 16383
+        for WebP) or than max_height is cut into segments written as
+        <name>_1.<ext>, <name>_2.<ext>, ..., preferably at image
+        boundaries. The layout is planned from the image headers and each
+        segment is composed, encoded and handed to writer on its own, so
+        only the images of one segment are decoded at a time (overlap
+        needs all of them decoded to find the repeated rows). Downscaled
+        segments all keep the width of the most reduced one; segments
+        written before it are composed and encoded again.
+        multipage=True writes the segments as pages of one TIFF instead,
+        BigTIFF if it may outgrow classic TIFF.
+        tiled='deflate', 'jpeg' or 'none' writes one tiled, pyramidal TIFF
+        with that compression instead, which viewers read region by region
+        and level by level. It is fed band by band from the compositor, so
+        it is never composed in full (see src/core/tiled_tiff.py).
+        Returns the output path, or the list of paths if there are several.
+        progress_callback(done, total) counts decoded images, composed images,
+        then the encode and write steps of each segment (2 *
+        len(image_paths) + 2 in total for a single output).
+        With a JobJournal, the stitch is skipped while its recorded output is
+        still up to date.
         """
+        if writer is None:
+            writer = default_writer()
+        pending = []
+        output_files = []
+        # Written here rather than through writer
+        direct_files = []
         try:
-            final_img = ImageProcessor._stitch_logic(image_paths, mode)
-            
-            # Save
             # If output_path doesn't have an extension, we need to add one.
             # We also need to know the extension to handle RGBA->RGB conversion for JPEG.
             
             # 1. Determine extension
             ext = os.path.splitext(output_path)[1][1:] # Get existing extension if any
             
+            if multipage or tiled:
+                # Pages and tiles only exist in TIFF
+                output_format = "tif"
             if output_format:
                 # User specified format overrides everything
                 target_ext = output_format
@@ -91,40 +370,183 @@ class ImageProcessor:
                 # If no extension or user forced a different format, append/replace it
                 base = os.path.splitext(output_path)[0]
                 output_path = f"{base}.{target_ext}"
+
+            params = {'op': 'stitch', 'mode': mode, 'format': target_ext.lower(), 'quality': quality}
+            if overlap:
+                params['overlap'] = True
+            if max_bytes:
+                params['max_bytes'] = max_bytes
+                params['downscale'] = downscale
+            if max_height:
+                params['max_height'] = max_height
+            if multipage:
+                params['multipage'] = True
+            if tiled:
+                params['tiled'] = tiled
+            if journal is not None:
+                cached = journal.lookup(os.path.abspath(output_path), image_paths, params)
+                if cached is not None:
+                    logger.debug(f"Skipping up-to-date stitch: {output_path}")
+                    return cached[0] if len(cached) == 1 else cached
+
+            step = [0, 0]
+
+            def advance():
+                step[0] += 1
+                if progress_callback:
+                    progress_callback(step[0], step[1])
+
+            # Decoding counts as soon as the layout is known
+            step[1] = 2 * len(image_paths) + 2
+            width, final_mode, spans, load = ImageProcessor._stitch_layout(image_paths, mode, advance, overlap)
+            if tiled:
+                limit = TILE_SIZE * BAND_TILES
+            else:
+                limit = segment_limit(target_ext, max_height, multipage)
+            plan = plan_segments(spans, limit)
+            if not plan:
+                raise ValueError("Nothing left to stitch")
+            composed = len({i for segment in plan for i, _, _ in segment})
+            # Each band is encoded and written at once when tiled, with
+            # the directories at the end
+            step[1] = len(image_paths) + composed + (len(plan) + 1 if tiled else 2 * len(plan))
+            segments = ImageProcessor._compose_segments(plan, load, width, final_mode, advance)
             
-            save_kwargs = {'quality': quality}
             # Use EXIF from first image if available
+            exif = None
             try:
                 with Image.open(image_paths[0]) as first_img:
                     exif = first_img.info.get('exif')
-                    if exif:
-                        save_kwargs['exif'] = exif
             except:
                 pass
 
-            if target_ext.lower() in ['jpg', 'jpeg'] and final_img.mode == 'RGBA':
-                final_img = final_img.convert('RGB')
-
-            final_img.save(output_path, **save_kwargs)
-            logger.info(f"Successfully stitched {len(image_paths)} images to {output_path}")
-            return output_path
+            if tiled:
+                height = sum(bottom - top for segment in plan for _, top, bottom in segment)
+                with TiledTiffWriter(output_path, (width, height), final_mode, compression=tiled, quality=quality) as tiff:
+                    for band in segments:
+                        tiff.write_rows(band)
+                        advance()
+                advance()
+                direct_files.append(output_path)
+                output_files.append(output_path)
+            elif multipage:
+                height = sum(bottom - top for segment in plan for _, top, bottom in segment)
+                big_tiff = width * height * len(final_mode) >= BIG_TIFF_BYTES
+                ImageProcessor._write_tiff_pages(output_path, segments, big_tiff, advance)
+                direct_files.append(output_path)
+                output_files.append(output_path)
+            else:
+                paths = segment_paths(output_path, len(plan))
+                # Segments share one width: when a segment only fits
+                # downscaled, the ones before it are encoded again at its
+                # scale
+                scale = 1.0
+                start = step[0]
+                # Writes of an earlier pass, already waited for
+                settled = 0
+                while len(output_files) < len(paths):
+                    output_files = []
+                    for path, segment in zip(paths, segments):
+                        scaled = max(1, round(width * scale))
+                        if scaled != width:
+                            with tracer.stage("downscale", file=path):
+                                segment = segment.resize((scaled, max(1, round(segment.size[1] * scale))), Image.Resampling.LANCZOS)
+                        data = ImageProcessor._encode_output(segment, target_ext, quality, exif, label=path,
+                                                            max_bytes=max_bytes, downscale=downscale)
+                        del segment
+                        if max_bytes and downscale:
+                            with Image.open(io.BytesIO(data)) as encoded:
+                                fitted = encoded.size[0]
+                            if fitted < scaled:
+                                scale = fitted / width
+                                if output_files:
+                                    pending[-1].result()
+                                    advance()
+                                    step[1] += step[0] - start
+                                    start = step[0]
+                                    settled = len(pending)
+                                    segments = ImageProcessor._compose_segments(plan, load, width, final_mode, advance)
+                                    break
+                        advance()
+                        output_files.append(path)
+                        pending.append(writer.submit(path, data))
+                        del data
+                        # At most one segment waits for the disk while the
+                        # next one is composed
+                        if len(pending) > settled + 1:
+                            pending[-2].result()
+                            advance()
+                pending[-1].result()
+                advance()
+            if journal is not None:
+                journal.record(os.path.abspath(output_path), image_paths, params, output_files)
+            logger.info(f"Successfully stitched {len(image_paths)} images to {output_path}"
+                        + (f" in {len(output_files)} parts" if len(output_files) > 1 else ""))
+            return output_files[0] if len(output_files) == 1 else output_files
 
+        except OperationCancelled:
+            ImageProcessor._discard_writes(pending, writer, direct_files)
+            logger.info(f"Stitch cancelled: {output_path}")
+            raise
         except Exception as e:
+            ImageProcessor._discard_writes(pending, writer, direct_files)
             logger.error(f"Error stitching images: {e}")
             raise
 
     @staticmethod
-    def generate_stitch_preview(image_paths, mode='resize', max_width=300):
+    def estimate_decoded_bytes(image_path):
+        """
+        Estimates the memory needed to hold the decoded image, reading only
+        the file header. Returns 0 if the header cannot be read.
+        """
+        try:
+            with Image.open(image_path) as img:
+                width, height = img.size
+                # Pillow stores 8-bit single band modes in 1 byte per pixel,
+                # 16-bit modes in 2 and everything else in 4
+                if img.mode in ('1', 'L', 'P'):
+                    pixel_size = 1
+                elif img.mode.startswith('I;16'):
+                    pixel_size = 2
+                else:
+                    pixel_size = 4
+                return width * height * pixel_size
+        except Exception as e:
+            logger.warning(f"Could not read header of {image_path}: {e}")
+            return 0
+
+    @staticmethod
+    def estimate_split_memory(image_path):
+        """
+        Peak memory of split_image: the decoded source plus one tile copy.
+        """
+        return ImageProcessor.estimate_decoded_bytes(image_path) * 5 // 4
+
+    @staticmethod
+    def estimate_stitch_memory(image_paths):
+        """
+        Peak memory of stitch_images: all decoded sources plus the canvas.
+        """
+        return sum(ImageProcessor.estimate_decoded_bytes(p) for p in image_paths) * 2
+
+    @staticmethod
+    def generate_stitch_preview(image_paths, mode='resize', max_width=300, overlap=False):
         """
         Generates a low-resolution preview of the stitched image.
+        With overlap, repeated rows are found on the full-size images,
+        since thumbnails blur them, and the cuts are scaled down.
+        Otherwise tiled TIFFs are read from a pyramid level near max_width.
         Returns a PIL Image object.
         """
         try:
             # Create a simplified list of images (downscaled)
             preview_images = []
+            signatures = []
             for p in image_paths:
                 try:
-                    img = Image.open(p)
+                    img = (None if overlap else open_overview(p, max_width)) or Image.open(p)
+                    if overlap:
+                        signatures.append((img.size, row_signature(img)))
                     # Downscale while preserving aspect ratio
                     img.thumbnail((max_width, max_width))
                     preview_images.append(img)
@@ -133,52 +555,257 @@ class ImageProcessor:
             
             if not preview_images:
                 return None
+
+            cuts = False
+            if overlap and len(signatures) == len(preview_images):
+                cuts = []
+                for (size_a, sig_a), (size_b, sig_b), thumb_a, thumb_b in zip(signatures, signatures[1:], preview_images, preview_images[1:]):
+                    cut_upper, cut_lower = match_signatures(sig_a, sig_b) if size_a[0] == size_b[0] else (0, 0)
+                    cuts.append((round(cut_upper * thumb_a.size[1] / size_a[1]), round(cut_lower * thumb_b.size[1] / size_b[1])))
                 
             # Use the same stitching logic but with in-memory images
-            return ImageProcessor._stitch_in_memory(preview_images, mode)
+            return ImageProcessor._stitch_in_memory(preview_images, mode, overlap=cuts)
         except Exception as e:
             logger.error(f"Error generating preview: {e}")
             return None
 
     @staticmethod
-    def _stitch_logic(image_paths, mode):
-        images = [Image.open(p) for p in image_paths]
+    def _encode(img, ext, **save_kwargs):
+        """
+        Encodes an image into memory, choosing the format from the extension.
+        """
+        fmt = Image.registered_extensions().get(f".{ext.lower()}")
+        if fmt is None:
+            raise ValueError(f"unknown file extension: .{ext}")
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, **save_kwargs)
+        return buf.getvalue()
+
+    @staticmethod
+    def _encode_output(img, ext, quality=95, exif=None, label=None, max_bytes=None, downscale=False):
+        """
+        Encodes a stitched image, dropping alpha for JPEG.
+        """
+        save_kwargs = {'quality': quality}
+        if exif:
+            save_kwargs['exif'] = exif
+        if ext.lower() in ['jpg', 'jpeg'] and img.mode == 'RGBA':
+            with tracer.stage("convert", file=label):
+                img = img.convert('RGB')
+        with tracer.stage("encode", file=label):
+            return ImageProcessor._encode_limited(img, ext, save_kwargs, max_bytes, downscale)
+
+    @staticmethod
+    def _encode_limited(img, ext, save_kwargs, max_bytes=None, downscale=False):
+        """
+        _encode, within max_bytes if given.
+        """
+        if not max_bytes:
+            return ImageProcessor._encode(img, ext, **save_kwargs)
+        kwargs = dict(save_kwargs)
+        quality = kwargs.pop('quality', 95)
+        return encode_within(img, ext, max_bytes, ImageProcessor._encode, quality, downscale, **kwargs)
+
+    @staticmethod
+    def _discard_writes(pending, writer, paths=(), archive=None):
+        """
+        Waits for writes already queued for an aborted job, then removes
+        whatever they produced: the files writer actually wrote, if it
+        writes files, and paths written by other means. Queued writes that
+        never ran leave existing files of the same name alone.
+        """
+        written = list(paths)
+        for future in pending:
+            if future.cancel():
+                continue
+            try:
+                path = future.result()
+            except Exception:
+                continue
+            if writer.writes_files:
+                written.append(path)
+        if archive is not None:
+            archive.close(discard=True)
+        ImageProcessor._remove_files(written)
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _open_source(source):
+        """
+        Returns a decoded PIL image for a path, encoded bytes, a binary
+        file-like object or an image that is already open.
+        """
+        if isinstance(source, Image.Image):
+            source.load()
+            return source
+        label = source if isinstance(source, str) else None
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            source = io.BytesIO(source)
+        with tracer.stage("open", file=label):
+            img = Image.open(source)
+        with tracer.stage("decode", file=label):
+            img.load()
+        return img
+
+    @staticmethod
+    def _open_sources(sources, on_step=None):
+        images = []
+        for source in sources:
+            images.append(ImageProcessor._open_source(source))
+            if on_step:
+                on_step()
         if not images:
             raise ValueError("No images provided for stitching")
-        return ImageProcessor._stitch_in_memory(images, mode)
+        return images
 
     @staticmethod
-    def _stitch_in_memory(images, mode):
-        widths, heights = zip(*(i.size for i in images))
-        
-        if mode == 'crop':
-            target_width = min(widths)
-        else: # resize or fill
-            target_width = max(widths)
+    def _stitch_layout(image_paths, mode, on_step=None, overlap=False):
+        """
+        Plans a stitch: returns (width, mode of the result, rows kept of
+        each fitted image as [(top, bottom), ...], load), where load(i)
+        returns image i fitted to width. Without overlap the layout comes
+        from the headers and load decodes the image (one on_step each);
+        with overlap all images are decoded here to find the cuts.
+        """
+        if overlap:
+            images = ImageProcessor._open_sources(image_paths, on_step)
+            width, processed = ImageProcessor._fit_images(images, mode)
+            spans = ImageProcessor._kept_spans(processed, images, overlap)
+            final_mode = 'RGBA' if any(img.mode == 'RGBA' for img in processed) else 'RGB'
+            return width, final_mode, spans, processed.__getitem__
+
+        if not image_paths:
+            raise ValueError("No images provided for stitching")
+        headers = []
+        for path in image_paths:
+            with Image.open(path) as img:
+                headers.append((img.size, img.mode))
+        width = stitch_width([size[0] for size, _ in headers], mode)
+        spans = [(0, fitted_height(size, width, mode)) for size, _ in headers]
+        final_mode = 'RGBA' if any(m == 'RGBA' for _, m in headers) else 'RGB'
+
+        def load(i):
+            img = ImageProcessor._open_source(image_paths[i])
+            if on_step:
+                on_step()
+            if img.size[0] != width:
+                with tracer.stage(mode):
+                    img = ImageProcessor._fit_width(img, width, mode)
+            return img
+
+        return width, final_mode, spans, load
 
+    @staticmethod
+    def _compose_segments(plan, load, width, final_mode, on_step=None):
+        """
+        Yields the image of each segment of a plan_segments plan, top to
+        bottom. An image is loaded once and dropped after its last rows
+        are pasted; on_step is called then.
+        """
+        last_segment = {i: k for k, segment in enumerate(plan) for i, _, _ in segment}
+        loaded = {}
+        for k, segment in enumerate(plan):
+            height = sum(bottom - top for _, top, bottom in segment)
+            with tracer.stage("compose", segment=k + 1, images=len(segment)):
+                canvas = Image.new(final_mode, (width, height))
+                y_offset = 0
+                for i, top, bottom in segment:
+                    if i not in loaded:
+                        loaded[i] = load(i)
+                    img = loaded[i]
+                    if (top, bottom) != (0, img.size[1]):
+                        img = img.crop((0, top, img.size[0], bottom))
+                    canvas.paste(img, (0, y_offset))
+                    y_offset += bottom - top
+                    if last_segment[i] == k:
+                        del loaded[i]
+                        if on_step:
+                            on_step()
+            yield canvas
+            canvas = None
+
+    @staticmethod
+    def _write_tiff_pages(output_path, pages, big_tiff=False, on_step=None):
+        """
+        Writes images as the pages of one TIFF, each page as soon as it
+        arrives, deflate-compressed. Pillow writes BigTIFF only without
+        compression, so big_tiff pages are stored raw. The file is renamed
+        into place once complete. on_step is called after each page is
+        encoded and after it is written.
+        """
+        directory, name = os.path.split(output_path)
+        tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+        save_kwargs = {'big_tiff': True, 'compression': 'raw'} if big_tiff else {'compression': 'tiff_deflate'}
+        try:
+            with open(tmp_path, 'w+b') as f:
+                with TiffImagePlugin.AppendingTiffWriter(f, new=True) as tiff:
+                    for k, page in enumerate(pages):
+                        with tracer.stage("encode", file=output_path, page=k + 1):
+                            page.save(tiff, format='TIFF', **save_kwargs)
+                        if on_step:
+                            on_step()
+                        with tracer.stage("write", file=output_path, page=k + 1):
+                            tiff.newFrame()
+                        if on_step:
+                            on_step()
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            ImageProcessor._remove_files([tmp_path])
+            raise
+
+    @staticmethod
+    def _fit_images(images, mode):
+        """
+        Returns the stitch width and the images fitted to it.
+        """
+        target_width = stitch_width([img.size[0] for img in images], mode)
         processed_images = []
         for img in images:
             if img.size[0] == target_width:
                 processed_images.append(img)
                 continue
 
-            if mode == 'resize':
-                # Calculate new height to maintain aspect ratio
-                aspect_ratio = img.size[1] / img.size[0]
-                new_height = int(target_width * aspect_ratio)
-                processed_images.append(img.resize((target_width, new_height), Image.Resampling.LANCZOS))
-            elif mode == 'crop':
-                # Center crop
-                left = (img.size[0] - target_width) // 2
-                processed_images.append(img.crop((left, 0, left + target_width, img.size[1])))
-            elif mode == 'fill':
-                # Pad with white (or transparent if RGBA)
-                new_img = Image.new(img.mode, (target_width, img.size[1]), (255, 255, 255, 0))
-                left = (target_width - img.size[0]) // 2
-                new_img.paste(img, (left, 0))
-                processed_images.append(new_img)
-
-        total_height = sum(img.size[1] for img in processed_images)
+            with tracer.stage(mode):
+                processed_images.append(ImageProcessor._fit_width(img, target_width, mode))
+        return target_width, processed_images
+
+    @staticmethod
+    def _kept_spans(processed_images, images, overlap=False):
+        """
+        Rows kept of each fitted image, [top, bottom], once the overlaps
+        are cut (see _stitch_in_memory).
+        """
+        spans = [[0, img.size[1]] for img in processed_images]
+        if overlap is True:
+            with tracer.stage("overlap", images=len(processed_images)):
+                cuts = find_overlaps(processed_images)
+        elif overlap:
+            cuts = [(round(upper * a.size[1] / b.size[1]), round(lower * c.size[1] / d.size[1]))
+                    for (upper, lower), a, b, c, d in zip(overlap, processed_images, images, processed_images[1:], images[1:])]
+        else:
+            cuts = []
+        for i, (cut_upper, cut_lower) in enumerate(cuts):
+            spans[i][1] -= cut_upper
+            spans[i + 1][0] = cut_lower
+        return spans
+
+    @staticmethod
+    def _stitch_in_memory(images, mode, on_step=None, overlap=False):
+        """
+        overlap=True detects the rows repeated between consecutive images
+        after they are fitted to a common width; a list of (cut_upper,
+        cut_lower) pairs, in rows of the given images, is used as is.
+        """
+        target_width, processed_images = ImageProcessor._fit_images(images, mode)
+        spans = ImageProcessor._kept_spans(processed_images, images, overlap)
+        total_height = sum(max(0, bottom - top) for top, bottom in spans)
         
         # Determine mode for final image
         final_mode = 'RGB'
@@ -188,8 +815,31 @@ class ImageProcessor:
         final_img = Image.new(final_mode, (target_width, total_height))
         
         y_offset = 0
-        for img in processed_images:
+        for img, (top, bottom) in zip(processed_images, spans):
+            if (top, bottom) != (0, img.size[1]):
+                img = img.crop((0, top, img.size[0], max(top, bottom)))
             final_img.paste(img, (0, y_offset))
             y_offset += img.size[1]
+            if on_step:
+                on_step()
             
         return final_img
+
+    @staticmethod
+    def _fit_width(img, target_width, mode):
+        if mode == 'resize':
+            # Calculate new height to maintain aspect ratio
+            aspect_ratio = img.size[1] / img.size[0]
+            new_height = int(target_width * aspect_ratio)
+            return img.resize((target_width, new_height), Image.Resampling.LANCZOS)
+        elif mode == 'crop':
+            # Center crop
+            left = (img.size[0] - target_width) // 2
+            return img.crop((left, 0, left + target_width, img.size[1]))
+        elif mode == 'fill':
+            # Pad with white (or transparent if RGBA)
+            new_img = Image.new(img.mode, (target_width, img.size[1]), (255, 255, 255, 0))
+            left = (target_width - img.size[0]) // 2
+            new_img.paste(img, (left, 0))
+            return new_img
+        return img
@@ -0,0 +1,48 @@
+import time
+
+
+class BatchProgress:
+    """
+    Aggregates fractional progress of the tasks in a batch and estimates the
+    remaining time from the observed throughput.
+    """
+    def __init__(self, total_tasks, clock=time.monotonic):
+        self.total_tasks = total_tasks
+        self.clock = clock
+        self.started_at = clock()
+        self.task_fractions = {}
+
+    def update(self, task_id, fraction):
+        self.task_fractions[task_id] = max(0.0, min(1.0, fraction))
+
+    def finish(self, task_id):
+        self.task_fractions[task_id] = 1.0
+
+    def fraction(self):
+        if not self.total_tasks:
+            return 1.0
+        return min(1.0, sum(self.task_fractions.values()) / self.total_tasks)
+
+    def eta_seconds(self, min_elapsed=1.0):
+        """
+        Returns the estimated seconds remaining, or None while there is not
+        enough progress to extrapolate from.
+        """
+        done = self.fraction()
+        elapsed = self.clock() - self.started_at
+        if done >= 1.0:
+            return 0.0
+        if done <= 0.0 or elapsed < min_elapsed:
+            return None
+        return elapsed * (1.0 - done) / done
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "剩余时间: 估算中..."
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"剩余时间: {seconds // 3600}小时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"剩余时间: {seconds // 60}分{seconds % 60}秒"
+    return f"剩余时间: {seconds}秒"
@@ -0,0 +1,258 @@
+import os
+import json
+import math
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src.core.processor import ImageProcessor, OperationCancelled
+from src.core.writer import default_writer, ArchiveWriter
+from src.utils.logger import get_logger
+from src.utils.tracing import tracer
+
+logger = get_logger("core.pyramid")
+
+LAYOUT_DZI = 'dzi'
+LAYOUT_XYZ = 'xyz'
+LAYOUTS = (LAYOUT_DZI, LAYOUT_XYZ)
+
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+
+
+def level_sizes(width, height, tile_size, layout=LAYOUT_DZI):
+    """
+    Sizes of the pyramid levels from full resolution down, each half of the
+    previous one rounded up. DZI goes down to 1x1 as viewers expect; XYZ
+    stops at the first level that fits in a single tile.
+    """
+    sizes = [(width, height)]
+    while True:
+        w, h = sizes[-1]
+        if w <= 1 and h <= 1:
+            break
+        if layout == LAYOUT_XYZ and w <= tile_size and h <= tile_size:
+            break
+        sizes.append(((w + 1) // 2, (h + 1) // 2))
+    return sizes
+
+
+def tile_grid(width, height, tile_size):
+    """
+    (cols, rows) of tiles covering a level.
+    """
+    return math.ceil(width / tile_size), math.ceil(height / tile_size)
+
+
+def tile_box(col, row, width, height, tile_size, overlap=0):
+    """
+    Crop box of a tile. Tiles extend by overlap pixels into each neighbour,
+    as in the DZI format.
+    """
+    left = col * tile_size - (overlap if col else 0)
+    top = row * tile_size - (overlap if row else 0)
+    right = min((col + 1) * tile_size + overlap, width)
+    bottom = min((row + 1) * tile_size + overlap, height)
+    return left, top, right, bottom
+
+
+def estimate_pyramid_memory(image_path):
+    """
+    Peak memory of generate_pyramid: the decoded source, a converted copy
+    and the next level being reduced.
+    """
+    return ImageProcessor.estimate_decoded_bytes(image_path) * 3 // 2
+
+
+def generate_pyramid(image_path, output_dir, tile_size=256, overlap=0, output_format=None, quality=90, layout=LAYOUT_DZI,
+                     progress_callback=None, writer=None, archive=None, max_workers=None):
+    """
+    Cuts an image into fixed-size tiles at every zoom level for web viewers.
+    dzi: output_dir/<name>.dzi plus <name>_files/<level>/<col>_<row>.<ext>,
+    level 0 being 1x1.
+    xyz: output_dir/<name>/<z>/<x>/<y>.<ext> plus <name>/manifest.json,
+    z 0 being the level that fits in one tile.
+    Each level is reduced from the one above it, not from the original.
+    Tiles are cropped one band (row of tiles) at a time and encoded on
+    max_workers threads while the next band or level is prepared; only a
+    bounded number of tiles is in flight at once.
+    progress_callback(done, total) counts written tiles and may raise
+    OperationCancelled; the tiles of a failed or cancelled export are
+    removed again. Writing and archive work as in split_image; tiles for a
+    shared ArchiveWriter are held in memory and added only after the last
+    progress call, so an aborted export leaves no entries in it.
+    Returns [manifest path], or [archive path].
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"unknown pyramid layout: {layout}")
+    if tile_size < 1 or overlap < 0 or overlap >= tile_size:
+        raise ValueError("tile size must be positive and larger than the overlap")
+    if writer is None:
+        writer = default_writer()
+    if max_workers is None:
+        max_workers = min(4, os.cpu_count() or 1)
+    max_in_flight = max_workers * 4
+
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    ext = ImageProcessor.split_extension(image_path, output_format)
+    own_archive = None
+    in_flight = collections.deque()
+    pending = []
+    created_dirs = []
+    staged = None
+    done = [0]
+
+    def make_dir(path):
+        if writer.writes_files and not os.path.isdir(path):
+            os.makedirs(path)
+            created_dirs.append(path)
+
+    def settle(limit):
+        # Hand finished encodes to the writer, oldest first
+        while len(in_flight) > limit:
+            path, future = in_flight.popleft()
+            if staged is not None:
+                staged.append((path, future.result()))
+            else:
+                pending.append(writer.submit(path, future.result()))
+            done[0] += 1
+            if progress_callback:
+                progress_callback(done[0], total)
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pyramid")
+    try:
+        img = ImageProcessor._open_source(image_path)
+        img = _prepare_mode(img, ext)
+        sizes = level_sizes(img.size[0], img.size[1], tile_size, layout)
+        total = sum(c * r for c, r in (tile_grid(w, h, tile_size) for w, h in sizes))
+        top_level = len(sizes) - 1
+        if archive:
+            own_archive = writer = ArchiveWriter(os.path.join(output_dir, f"{base_name}.{archive}"), root=output_dir)
+        # Entries of a shared archive cannot be taken back once added
+        if not writer.writes_files and own_archive is None:
+            staged = []
+        if layout == LAYOUT_DZI:
+            manifest_path = os.path.join(output_dir, f"{base_name}.dzi")
+            tiles_root = os.path.join(output_dir, f"{base_name}_files")
+        else:
+            tiles_root = os.path.join(output_dir, base_name)
+            manifest_path = os.path.join(tiles_root, "manifest.json")
+        make_dir(tiles_root)
+        if progress_callback:
+            progress_callback(0, total)
+
+        for index, (width, height) in enumerate(sizes):
+            level = top_level - index
+            if index:
+                with tracer.stage("reduce", file=image_path, level=level):
+                    img = _half(img, (width, height))
+            level_dir = os.path.join(tiles_root, str(level))
+            make_dir(level_dir)
+            cols, rows = tile_grid(width, height, tile_size)
+            if layout == LAYOUT_XYZ:
+                for col in range(cols):
+                    make_dir(os.path.join(level_dir, str(col)))
+            for row in range(rows):
+                with tracer.stage("crop", file=image_path, level=level, band=row):
+                    band = [(col, img.crop(tile_box(col, row, width, height, tile_size, overlap))) for col in range(cols)]
+                for col, tile in band:
+                    if layout == LAYOUT_DZI:
+                        path = os.path.join(level_dir, f"{col}_{row}.{ext}")
+                    else:
+                        path = os.path.join(level_dir, str(col), f"{row}.{ext}")
+                    in_flight.append((path, executor.submit(_encode_tile, tile, ext, quality, image_path)))
+                settle(max_in_flight)
+        img = None
+        settle(0)
+
+        manifest = _manifest(layout, sizes, tile_size, overlap, ext)
+        if staged is not None:
+            staged.append((manifest_path, manifest))
+            for path, data in staged:
+                pending.append(writer.submit(path, data))
+        else:
+            pending.append(writer.submit(manifest_path, manifest))
+        with tracer.stage("flush", file=image_path):
+            for future in pending:
+                future.result()
+        if own_archive is not None:
+            own_archive.close()
+            manifest_path = own_archive.archive_path
+        logger.info(f"Built {layout} pyramid of {image_path}: {len(sizes)} levels, {total} tiles")
+        return [manifest_path]
+
+    except OperationCancelled:
+        _discard(in_flight, pending, writer, own_archive, created_dirs)
+        logger.info(f"Pyramid cancelled: {image_path}")
+        raise
+    except Exception as e:
+        _discard(in_flight, pending, writer, own_archive, created_dirs)
+        logger.error(f"Error building pyramid of {image_path}: {e}")
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
+def _discard(in_flight, pending, writer, archive, created_dirs):
+    """
+    Removes everything an aborted export wrote to disk, including the
+    directories it created; files of the same names that it did not write
+    are left alone.
+    """
+    for _, future in in_flight:
+        future.cancel()
+    ImageProcessor._discard_writes(pending, writer, archive=archive)
+    for path in reversed(created_dirs):
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+
+
+def _prepare_mode(img, ext):
+    """
+    Converts to a mode that can be reduced and saved in the tile format.
+    """
+    jpeg = ext.lower() in ('jpg', 'jpeg')
+    if img.mode in ('L', 'RGB') or (img.mode in ('LA', 'RGBA') and not jpeg):
+        return img
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    return img.convert('RGBA' if has_alpha and not jpeg else 'RGB')
+
+
+def _half(img, size):
+    """
+    Next level down: a 2x2 box filter, rounding odd sizes up.
+    """
+    reduced = img.reduce(2)
+    if reduced.size != size:
+        reduced = img.resize(size, Image.Resampling.BOX)
+    return reduced
+
+
+def _encode_tile(tile, ext, quality, label):
+    with tracer.stage("encode", file=label):
+        return ImageProcessor._encode(tile, ext, quality=quality)
+
+
+def _manifest(layout, sizes, tile_size, overlap, ext):
+    width, height = sizes[0]
+    if layout == LAYOUT_DZI:
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<Image xmlns="{DZI_NAMESPACE}" Format="{ext}" Overlap="{overlap}" TileSize="{tile_size}">\n'
+            f'  <Size Width="{width}" Height="{height}"/>\n'
+            '</Image>\n'
+        ).encode('utf-8')
+    top = len(sizes) - 1
+    levels = [{'z': top - i, 'width': w, 'height': h, 'cols': tile_grid(w, h, tile_size)[0], 'rows': tile_grid(w, h, tile_size)[1]}
+              for i, (w, h) in enumerate(sizes)]
+    manifest = {
+        'width': width,
+        'height': height,
+        'tile_size': tile_size,
+        'overlap': overlap,
+        'format': ext,
+        'min_zoom': 0,
+        'max_zoom': top,
+        'levels': sorted(levels, key=lambda level: level['z']),
+    }
+    return json.dumps(manifest, indent=2).encode('utf-8')
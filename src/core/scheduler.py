@@ -0,0 +1,237 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PyQt6.QtCore import QObject, pyqtSignal
+from src.utils.logger import get_logger
+
+logger = get_logger("core.scheduler")
+
+MB = 1024 * 1024
+
+def total_physical_memory():
+    """
+    Returns the installed RAM in bytes, or None if it cannot be determined.
+    """
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [
+                    ('dwLength', ctypes.c_ulong),
+                    ('dwMemoryLoad', ctypes.c_ulong),
+                    ('ullTotalPhys', ctypes.c_ulonglong),
+                    ('ullAvailPhys', ctypes.c_ulonglong),
+                    ('ullTotalPageFile', ctypes.c_ulonglong),
+                    ('ullAvailPageFile', ctypes.c_ulonglong),
+                    ('ullTotalVirtual', ctypes.c_ulonglong),
+                    ('ullAvailVirtual', ctypes.c_ulonglong),
+                    ('sullAvailExtendedVirtual', ctypes.c_ulonglong),
+                ]
+
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullTotalPhys
+            return None
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def default_memory_budget(fraction=0.5, fallback=2048 * MB):
+    total = total_physical_memory()
+    if not total:
+        return fallback
+    return int(total * fraction)
+
+
+class _Pending:
+    __slots__ = ('job', 'cost', 'bypassed')
+
+    def __init__(self, job, cost):
+        self.job = job
+        self.cost = cost
+        self.bypassed = 0
+
+
+class AdmissionQueue:
+    """
+    Thread-safe FIFO that admits jobs while the number of running jobs stays
+    under max_concurrency and their estimated memory stays under
+    memory_budget.
+
+    A job that does not fit lets smaller jobs behind it run so cores stay
+    busy, but only max_bypass times; after that nothing new is admitted
+    until it fits, so large jobs cannot starve. A job larger than the whole
+    budget runs alone.
+    """
+    def __init__(self, max_concurrency, memory_budget, max_bypass=8):
+        self.max_concurrency = max(1, max_concurrency)
+        self.memory_budget = memory_budget
+        self.max_bypass = max_bypass
+        self._lock = threading.Lock()
+        self._pending = []
+        self._running = {}
+        self.in_flight_bytes = 0
+        self.peak_in_flight_bytes = 0
+
+    def push(self, job, cost):
+        with self._lock:
+            self._pending.append(_Pending(job, max(0, int(cost))))
+
+    def remove(self, job):
+        """
+        Drops a job that has not been admitted yet. Returns True if found.
+        """
+        with self._lock:
+            for i, p in enumerate(self._pending):
+                if p.job is job:
+                    del self._pending[i]
+                    return True
+        return False
+
+    def clear(self):
+        """
+        Drops all pending jobs and returns them.
+        """
+        with self._lock:
+            jobs = [p.job for p in self._pending]
+            self._pending = []
+        return jobs
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def running_count(self):
+        with self._lock:
+            return len(self._running)
+
+    def _fits(self, cost):
+        return not self._running or self.in_flight_bytes + cost <= self.memory_budget
+
+    def _admit(self, index):
+        p = self._pending.pop(index)
+        self._running[p.job] = p.cost
+        self.in_flight_bytes += p.cost
+        self.peak_in_flight_bytes = max(self.peak_in_flight_bytes, self.in_flight_bytes)
+        return p.job
+
+    def pop_ready(self):
+        """
+        Admits as many pending jobs as the limits allow and returns them in
+        the order they should be started.
+        """
+        ready = []
+        with self._lock:
+            while self._pending and len(self._running) < self.max_concurrency:
+                head = self._pending[0]
+                if self._fits(head.cost):
+                    ready.append(self._admit(0))
+                    continue
+                if head.bypassed >= self.max_bypass:
+                    break
+                # Let a smaller job behind the head use the idle core
+                index = next((i for i in range(1, len(self._pending)) if self._fits(self._pending[i].cost)), None)
+                if index is None:
+                    break
+                head.bypassed += 1
+                ready.append(self._admit(index))
+        return ready
+
+    def release(self, job):
+        with self._lock:
+            cost = self._running.pop(job, None)
+            if cost is not None:
+                self.in_flight_bytes -= cost
+
+
+class JobScheduler(QObject):
+    """
+    Front end of a QThreadPool that starts Worker runnables only when the
+    AdmissionQueue admits them. Jobs are released when their worker emits
+    finished, which triggers the next dispatch.
+
+    A job's cost may be given as a callable (a memory estimate that reads
+    file headers); it is evaluated on a helper thread, in submission
+    order, and the job joins the queue once its cost is known.
+    """
+    idle = pyqtSignal()
+    _estimated = pyqtSignal(object, object)
+
+    def __init__(self, threadpool, memory_budget=None, parent=None):
+        super().__init__(parent)
+        self.threadpool = threadpool
+        self.queue = AdmissionQueue(
+            threadpool.maxThreadCount(),
+            memory_budget if memory_budget is not None else default_memory_budget()
+        )
+        # Workers whose cost is being estimated, with the estimate they wait for
+        self._estimating = {}
+        self._estimator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="estimate")
+        self._estimated.connect(self._on_estimated)
+
+    @property
+    def memory_budget(self):
+        return self.queue.memory_budget
+
+    def set_memory_budget(self, memory_budget):
+        self.queue.memory_budget = memory_budget
+        self.dispatch()
+
+    def submit(self, worker, cost=0):
+        self.track(worker)
+        self.requeue(worker, cost)
+
+    def track(self, worker):
+        """
+        Releases the worker's admission when it finishes. submit() does this
+        itself; call it directly only for workers queued later via requeue().
+        """
+        worker.signals.finished.connect(lambda w=worker: self._on_finished(w))
+
+    def requeue(self, worker, cost=0):
+        """
+        Queues a worker again after cancel_pending() took it out.
+        """
+        if callable(cost):
+            token = object()
+            self._estimating[worker] = token
+            self._estimator.submit(self._estimate, worker, token, cost)
+            return
+        self.queue.push(worker, cost)
+        self.dispatch()
+
+    def cancel_pending(self, worker):
+        if self._estimating.pop(worker, None) is not None:
+            return True
+        return self.queue.remove(worker)
+
+    def _estimate(self, worker, token, cost):
+        try:
+            value = cost()
+        except Exception as e:
+            logger.warning(f"Cost estimate failed, queuing without one: {e}")
+            value = 0
+        self._estimated.emit(worker, (token, value))
+
+    def _on_estimated(self, worker, estimate):
+        token, cost = estimate
+        # Dropped (or queued again) while the estimate was running
+        if self._estimating.get(worker) is not token:
+            return
+        del self._estimating[worker]
+        self.queue.push(worker, cost)
+        self.dispatch()
+
+    def dispatch(self):
+        for worker in self.queue.pop_ready():
+            self.threadpool.start(worker)
+
+    def _on_finished(self, worker):
+        self.queue.release(worker)
+        self.dispatch()
+        if not self.queue.running_count() and not self.queue.pending_count() and not self._estimating:
+            logger.info(f"Scheduler idle, peak in-flight estimate {self.queue.peak_in_flight_bytes / MB:.0f} MB")
+            self.idle.emit()
@@ -0,0 +1,81 @@
+import os
+
+# Largest height each format can store; stitches beyond it are cut into
+# segments
+FORMAT_MAX_HEIGHT = {'jpg': 65535, 'jpeg': 65535, 'webp': 16383}
+# Page height of multi-page TIFF output unless one is given, so each page
+# stays within what common viewers open
+TIFF_PAGE_HEIGHT = 65535
+# Uncompressed size from which multi-page TIFF output is written as
+# BigTIFF; classic TIFF offsets end at 4 GiB
+BIG_TIFF_BYTES = 3 * 1024 ** 3
+
+
+def segment_limit(ext, max_height=None, multipage=False):
+    """
+    Height of the segments a stitch is cut into for a format, or None if
+    it need not be cut. A given max_height applies on top of the format's
+    own limit.
+    """
+    limits = [h for h in (FORMAT_MAX_HEIGHT.get(ext.lower()), max_height) if h]
+    if multipage and not limits:
+        limits.append(TIFF_PAGE_HEIGHT)
+    return min(limits) if limits else None
+
+
+def stitch_width(widths, mode):
+    """
+    Output width of a stitch: the narrowest input for 'crop', otherwise the
+    widest.
+    """
+    return min(widths) if mode == 'crop' else max(widths)
+
+
+def fitted_height(size, target_width, mode):
+    """
+    Height of an image once fitted to target_width, as _fit_width makes it.
+    """
+    width, height = size
+    if mode == 'resize' and width != target_width:
+        aspect_ratio = height / width
+        return int(target_width * aspect_ratio)
+    return height
+
+
+def plan_segments(spans, limit):
+    """
+    Cuts the rows kept of each image, spans = [(top, bottom), ...], into
+    segments of at most limit rows. Segments end at image boundaries; only
+    an image taller than limit is itself cut. Returns a list of segments,
+    each a list of (index, top, bottom).
+    """
+    segments = []
+    current = []
+    used = 0
+    for i, (top, bottom) in enumerate(spans):
+        height = bottom - top
+        if height <= 0:
+            continue
+        if limit and used and used + height > limit:
+            segments.append(current)
+            current, used = [], 0
+        while limit and height > limit:
+            segments.append([(i, top, top + limit)])
+            top += limit
+            height -= limit
+        current.append((i, top, bottom))
+        used += height
+    if current:
+        segments.append(current)
+    return segments
+
+
+def segment_paths(output_path, count):
+    """
+    The file of each segment: output_path itself for a single one,
+    otherwise <name>_1.<ext>, <name>_2.<ext>, ...
+    """
+    if count == 1:
+        return [output_path]
+    base, ext = os.path.splitext(output_path)
+    return [f"{base}_{k}{ext}" for k in range(1, count + 1)]
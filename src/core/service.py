@@ -0,0 +1,519 @@
+import io
+import os
+import json
+import time
+import uuid
+import queue
+import zipfile
+import threading
+import collections
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, UnidentifiedImageError
+from src.core.processor import ImageProcessor, OperationCancelled
+from src.utils.logger import get_logger
+
+logger = get_logger("core.service")
+
+MAX_UPLOAD_BYTES = 512 * 1024 * 1024
+# Encoded results buffered between a running job and its response; a slow
+# client therefore holds back its own job instead of filling memory
+STREAM_BUFFER = 4
+# Window over which /metrics reports throughput (seconds)
+THROUGHPUT_WINDOW = 60.0
+
+
+class ServiceBusy(Exception):
+    """
+    Raised when a job cannot be admitted because all workers are busy and
+    the request queue is full.
+    """
+    pass
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Job:
+    """
+    One request's work. The job runs on the service pool and hands its
+    encoded results to the request thread through a small bounded queue.
+    """
+    def __init__(self, op):
+        self.id = uuid.uuid4().hex[:16]
+        self.op = op
+        self.state = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = 0
+        self.total = 0
+        self.bytes_out = 0
+        self.error = None
+        self.cancelled = threading.Event()
+        self.results = queue.Queue(maxsize=STREAM_BUFFER)
+
+    def progress(self, done, total):
+        if self.cancelled.is_set():
+            raise OperationCancelled()
+        self.done = done
+        self.total = total
+
+    def emit(self, item):
+        while True:
+            try:
+                self.results.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self.cancelled.is_set():
+                    raise OperationCancelled()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def next_result(self):
+        """
+        The next result for the request thread. A job that is cancelled or
+        ends without producing one (e.g. dropped from the pool before it
+        ran) yields ('cancelled',) instead of leaving the caller waiting.
+        """
+        while True:
+            try:
+                return self.results.get(timeout=0.5)
+            except queue.Empty:
+                if self.cancelled.is_set() or self.finished is not None:
+                    try:
+                        return self.results.get_nowait()
+                    except queue.Empty:
+                        return ('cancelled',)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'op': self.op,
+            'state': self.state,
+            'done': self.done,
+            'total': self.total,
+            'bytes_out': self.bytes_out,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'error': self.error,
+        }
+
+
+class _ChunkedWriter:
+    """
+    Write-only file object sending HTTP/1.1 chunks. Deliberately not
+    seekable, so zipfile streams entries with data descriptors.
+    """
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.aborted = False
+
+    def write(self, data):
+        if self.aborted or not data:
+            return len(data)
+        try:
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + bytes(data) + b"\r\n")
+        except OSError:
+            # The client is gone; drop whatever zipfile still writes
+            self.aborted = True
+            raise
+        return len(data)
+
+    def flush(self):
+        if not self.aborted:
+            self.wfile.flush()
+
+    def close(self):
+        if not self.aborted:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+
+class ImageService:
+    """
+    Local HTTP front end for ImageProcessor.
+
+        POST /split?rows=&cols=&format=&quality=&name=
+            body: image bytes, or JSON {"path": ...}
+            -> zip stream of the tiles
+        POST /stitch?mode=&format=&quality=&overlap=1
+            body: zip of images (stitched in name order), or JSON {"paths": [...]}
+            -> stitched image
+        GET /jobs/<id>   job status
+        GET /metrics     queue, throughput and latency
+
+    Jobs run on a pool of max_workers threads; at most max_queued more are
+    accepted and further requests get 503 with Retry-After. Nothing is
+    written to disk. Server-side paths are only accepted with
+    allow_paths, since they let any client read files of this machine.
+    """
+    def __init__(self, host='127.0.0.1', port=8765, max_workers=None, max_queued=8,
+                 allow_paths=False, max_upload=MAX_UPLOAD_BYTES, history=1000):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queued = max_queued
+        self.allow_paths = allow_paths
+        self.max_upload = max_upload
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="ImageService")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._jobs = collections.OrderedDict()
+        self._counts = collections.Counter()
+        self._latencies = collections.deque(maxlen=1000)
+        self._completions = collections.deque()
+        self._started = time.monotonic()
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.service = self
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="ImageServiceHTTP", daemon=True)
+        self._thread.start()
+        logger.info(f"Serving on {self.url} with {self.max_workers} workers")
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self._cancel_jobs()
+        self._executor.shutdown(wait=True)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def serve_forever(self):
+        logger.info(f"Serving on {self.url} with {self.max_workers} workers")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+            self._cancel_jobs()
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _cancel_jobs(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+
+    def submit(self, op, fn, *args):
+        """
+        Admits a job and schedules fn(job, *args) on the pool, or raises
+        ServiceBusy.
+        """
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queued:
+                self._counts['rejected'] += 1
+                raise ServiceBusy()
+            self._admitted += 1
+            job = Job(op)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def job(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args):
+        job.state = 'running'
+        job.started = time.time()
+        try:
+            if job.cancelled.is_set():
+                raise OperationCancelled()
+            fn(job, *args)
+            job.state = 'done'
+        except OperationCancelled:
+            job.state = 'cancelled'
+        except Exception as e:
+            job.state = 'failed'
+            job.error = str(e)
+            logger.error(f"Job {job.id} ({job.op}) failed: {e}")
+            try:
+                job.emit(('error', e))
+            except OperationCancelled:
+                pass
+        finally:
+            job.finished = time.time()
+            now = time.monotonic()
+            with self._lock:
+                self._admitted -= 1
+                self._counts[job.state] += 1
+                if job.state == 'done':
+                    self._latencies.append(job.finished - job.created)
+                    self._completions.append(now)
+
+    def metrics(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._completions and now - self._completions[0] > THROUGHPUT_WINDOW:
+                self._completions.popleft()
+            running = sum(1 for j in self._jobs.values() if j.state == 'running')
+            ordered = sorted(self._latencies)
+            window = min(THROUGHPUT_WINDOW, max(now - self._started, 1e-9))
+
+            def pct(p):
+                if not ordered:
+                    return None
+                return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+            return {
+                'workers': self.max_workers,
+                'max_queued': self.max_queued,
+                'running': running,
+                'queued': self._admitted - running,
+                'completed': self._counts['done'],
+                'failed': self._counts['failed'],
+                'cancelled': self._counts['cancelled'],
+                'rejected': self._counts['rejected'],
+                'jobs_per_minute': len(self._completions) * 60.0 / window,
+                'latency_p50': pct(50),
+                'latency_p95': pct(95),
+                'uptime': now - self._started,
+            }
+
+
+def _split_job(job, source, label, ext, quality, rows, cols):
+    for name, data in ImageProcessor.split_to_buffers(source, ext, quality, rows, cols, name=label, progress_callback=job.progress):
+        job.emit(('file', name, data))
+    job.emit(('end',))
+
+
+def _stitch_job(job, sources, label, mode, ext, quality, overlap=False):
+    data = ImageProcessor.stitch_to_bytes(sources, mode, ext, quality, progress_callback=job.progress, overlap=overlap)
+    job.emit(('file', f"{label}.{ext}", data))
+    job.emit(('end',))
+
+
+def _format_of(img_or_name, fallback="png"):
+    if isinstance(img_or_name, str):
+        ext = os.path.splitext(img_or_name)[1][1:]
+        return ext.lower() if ext else fallback
+    return ImageProcessor.image_extension(img_or_name, fallback)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "ImageProcessorService"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _params(self):
+        return {k: v[-1] for k, v in parse_qs(urlsplit(self.path).query).items()}
+
+    def _int_param(self, params, key, default, low=1, high=10000):
+        try:
+            value = int(params.get(key, default))
+        except ValueError:
+            raise RequestError(400, f"{key} must be an integer")
+        if not low <= value <= high:
+            raise RequestError(400, f"{key} must be between {low} and {high}")
+        return value
+
+    def _read_body(self):
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise RequestError(411, "Content-Length required")
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body cannot be framed, so the connection cannot be reused
+            self.close_connection = True
+            raise RequestError(400, "bad Content-Length")
+        if length > self.service.max_upload:
+            # Don't leave the unread upload on a kept-alive connection
+            self.close_connection = True
+            raise RequestError(413, "upload too large")
+        return self.rfile.read(length)
+
+    def _json_body(self, body):
+        try:
+            return json.loads(body.decode('utf-8'))
+        except ValueError:
+            raise RequestError(400, "invalid JSON body")
+
+    def _check_path(self, path):
+        if not self.service.allow_paths:
+            raise RequestError(403, "server-side paths are disabled")
+        if not isinstance(path, str) or not os.path.isfile(path):
+            raise RequestError(404, f"no such file: {path}")
+        return path
+
+    def do_GET(self):
+        route = urlsplit(self.path).path.rstrip("/")
+        if route == "/metrics":
+            self._send_json(200, self.service.metrics())
+        elif route.startswith("/jobs/"):
+            job = self.service.job(route[len("/jobs/"):])
+            if job is None:
+                self._send_json(404, {'error': "unknown job"})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {'error': "not found"})
+
+    def do_POST(self):
+        route = urlsplit(self.path).path.rstrip("/")
+        try:
+            if route == "/split":
+                job, archive_name = self._start_split()
+                self._stream(job, archive=archive_name)
+            elif route == "/stitch":
+                job = self._start_stitch()
+                self._stream(job)
+            else:
+                self._send_json(404, {'error': "not found"})
+        except RequestError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except ServiceBusy:
+            self._send_json(503, {'error': "service busy"}, {"Retry-After": "1"})
+
+    def _start_split(self):
+        params = self._params()
+        rows = self._int_param(params, 'rows', 2)
+        cols = self._int_param(params, 'cols', 2)
+        quality = self._int_param(params, 'quality', 95, 1, 100)
+        body = self._read_body()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            path = self._check_path(self._json_body(body).get('path'))
+            source = path
+            label = os.path.splitext(os.path.basename(path))[0]
+            ext = params.get('format') or _format_of(path, "jpg")
+        else:
+            source = io.BytesIO(body)
+            label = os.path.splitext(os.path.basename(params.get('name', "upload")))[0] or "upload"
+            ext = params.get('format')
+            if not ext:
+                try:
+                    ext = _format_of(Image.open(source))
+                except (UnidentifiedImageError, OSError):
+                    raise RequestError(400, "body is not a supported image")
+                source.seek(0)
+        if f".{ext.lower()}" not in Image.registered_extensions():
+            raise RequestError(400, f"unknown format: {ext}")
+        job = self.service.submit('split', _split_job, source, label, ext, quality, rows, cols)
+        return job, f"{label}_tiles.zip"
+
+    def _start_stitch(self):
+        params = self._params()
+        quality = self._int_param(params, 'quality', 95, 1, 100)
+        mode = params.get('mode', 'resize')
+        if mode not in ('resize', 'crop', 'fill'):
+            raise RequestError(400, f"unknown mode: {mode}")
+        overlap = params.get('overlap', '0') not in ('', '0', 'false')
+        body = self._read_body()
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            paths = self._json_body(body).get('paths')
+            if not isinstance(paths, list) or not paths:
+                raise RequestError(400, "paths must be a non-empty list")
+            sources = [self._check_path(p) for p in paths]
+            default_ext = _format_of(paths[0], "jpg")
+        else:
+            try:
+                with zipfile.ZipFile(io.BytesIO(body)) as zf:
+                    names = sorted(n for n in zf.namelist() if not n.endswith("/"))
+                    sources = [io.BytesIO(zf.read(n)) for n in names]
+            except zipfile.BadZipFile:
+                raise RequestError(400, "body must be a zip of images or JSON")
+            if not sources:
+                raise RequestError(400, "archive contains no images")
+            default_ext = _format_of(names[0], "jpg")
+        ext = params.get('format') or default_ext
+        if f".{ext.lower()}" not in Image.registered_extensions():
+            raise RequestError(400, f"unknown format: {ext}")
+        return self.service.submit('stitch', _stitch_job, sources, "stitched", mode, ext, quality, overlap)
+
+    def _stream(self, job, archive=None):
+        """
+        Sends a job's results as they are produced: a chunked zip stream
+        for archives, otherwise the single result file. Errors before the
+        first result become JSON errors; later ones abort the connection.
+        """
+        item = job.next_result()
+        if item[0] == 'error':
+            e = item[1]
+            status = 400 if isinstance(e, (UnidentifiedImageError, ValueError, OSError)) else 500
+            self._send_json(status, {'error': str(e), 'job': job.id})
+            return
+        if item[0] == 'cancelled':
+            self._send_json(503, {'error': "job cancelled", 'job': job.id})
+            return
+        try:
+            if archive is None:
+                _, name, data = item
+                self.send_response(200)
+                fmt = Image.registered_extensions()[os.path.splitext(name)[1].lower()]
+                self.send_header("Content-Type", Image.MIME.get(fmt, "application/octet-stream"))
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Content-Disposition", f'attachment; filename="{name}"')
+                self.send_header("X-Job-Id", job.id)
+                self.end_headers()
+                self.wfile.write(data)
+                job.bytes_out += len(data)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Content-Disposition", f'attachment; filename="{archive}"')
+            self.send_header("X-Job-Id", job.id)
+            self.end_headers()
+            out = _ChunkedWriter(self.wfile)
+            zf = zipfile.ZipFile(out, 'w', zipfile.ZIP_STORED)
+            while item[0] == 'file':
+                _, name, data = item
+                zf.writestr(name, data)
+                out.flush()
+                job.bytes_out += len(data)
+                item = job.next_result()
+            if item[0] != 'end':
+                # Headers are gone; an unterminated chunked body tells the
+                # client the archive is incomplete
+                out.aborted = True
+                self.close_connection = True
+                return
+            zf.close()
+            out.close()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info(f"Client went away, cancelling job {job.id}")
+            job.cancel()
+            self.close_connection = True
+
+
+def serve(host='127.0.0.1', port=8765, max_workers=None, max_queued=8, allow_paths=False):
+    """
+    Runs the service in the foreground until interrupted.
+    """
+    ImageService(host, port, max_workers, max_queued, allow_paths).serve_forever()
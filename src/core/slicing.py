@@ -0,0 +1,116 @@
+from PIL import Image, ImageChops, ImageFilter
+from src.utils.logger import get_logger
+
+logger = get_logger("core.slicing")
+
+# Rows scanned at a time
+BAND_HEIGHT = 1024
+# Columns a band is reduced to before measuring
+SCAN_WIDTH = 256
+# Cells a row is summarised in; a row's content is its busiest cell
+CELLS = 16
+# Pixels further than this from their row's mean are ink (0-255); closer
+# ones are background or noise
+INK_THRESHOLD = 32
+# JPEGs at least this many times taller than a page are scanned from a
+# reduced decode
+DRAFT_SCALE = 8
+# Pages may end this share of the page height before or after the target
+TOLERANCE = 0.2
+# Rows of clearance a cut keeps from content, at scan resolution
+CLEARANCE = 2
+
+
+def row_profile(img, band_height=BAND_HEIGHT):
+    """
+    Content of each row of an image: the share of ink in the row's busiest
+    cell, 0 for a uniform row up to 255. Rows are scanned band by band, so
+    the working memory is a few reduced bands whatever the height.
+    """
+    width, height = img.size
+    factor = max(1, width // SCAN_WIDTH)
+    profile = bytearray()
+    for top in range(0, height, band_height):
+        bottom = min(height, top + band_height)
+        band = img.crop((0, top, width, bottom))
+        if band.mode != 'L':
+            band = band.convert('L')
+        band = band.reduce((factor, 1)) if factor > 1 else band
+        w, h = band.size
+        row_means = band.resize((1, h), Image.Resampling.BOX).resize((w, h), Image.Resampling.NEAREST)
+        ink = ImageChops.difference(band, row_means).point(lambda v: 255 if v > INK_THRESHOLD else 0)
+        cells = min(CELLS, w)
+        data = ink.resize((cells, h), Image.Resampling.BOX).tobytes()
+        profile.extend(max(data[i:i + cells]) for i in range(0, len(data), cells))
+    return profile
+
+
+def page_cuts(profile, page_height, tolerance=TOLERANCE, clearance=CLEARANCE):
+    """
+    Rows at which to cut a profile into pages of about page_height rows.
+    Each cut is the emptiest row, counting clearance rows on either side,
+    within tolerance of the target, the one nearest the target on ties.
+    Runs in time linear in the number of rows.
+    """
+    height = len(profile)
+    if page_height < 1:
+        raise ValueError("page height must be at least 1")
+    score = _with_clearance(profile, clearance)
+    slack = int(page_height * tolerance)
+    cuts = []
+    top = 0
+    while height - top > page_height + slack:
+        target = top + page_height
+        cut = _best_row(score, max(top + 1, target - slack), min(height - 1, target + slack), target)
+        cuts.append(cut)
+        top = cut
+    return cuts
+
+
+def _with_clearance(profile, clearance):
+    """
+    Each row's content raised to the busiest row within clearance rows.
+    """
+    if not clearance:
+        return bytes(profile)
+    column = Image.frombytes('L', (1, len(profile)), bytes(profile))
+    return column.filter(ImageFilter.MaxFilter(2 * clearance + 1)).tobytes()
+
+
+def _best_row(score, low, high, target):
+    return min(range(low, high + 1), key=lambda row: (score[row], abs(row - target)))
+
+
+def scan_page_cuts(img, page_height):
+    """
+    Cut rows for an image, in full-resolution rows. A JPEG several pages
+    tall is first scanned from a grayscale draft decoded at 1/8 scale
+    through a second handle; each cut found there is then refined on a
+    strip of img around it.
+    """
+    width, height = img.size
+    if img.format != 'JPEG' or not getattr(img, 'filename', None) or height < page_height * DRAFT_SCALE:
+        return page_cuts(row_profile(img), page_height)
+
+    with Image.open(img.filename) as scan:
+        scan.draft('L', (width // DRAFT_SCALE, height // DRAFT_SCALE))
+        scale = height / scan.size[1]
+        coarse = page_cuts(row_profile(scan), max(1, round(page_height / scale)), clearance=0)
+    cuts = []
+    reach = int(scale * 2)
+    for cut in coarse:
+        centre = round(cut * scale)
+        top, bottom = max(1, centre - reach), min(height - 1, centre + reach)
+        score = _with_clearance(row_profile(img.crop((0, top, width, bottom + 1))), CLEARANCE)
+        cuts.append(top + _best_row(score, 0, bottom - top, centre - top))
+    return cuts
+
+
+def page_regions(img, page_height):
+    """
+    Crop boxes of the pages of a long image, top to bottom.
+    """
+    width, height = img.size
+    edges = [0] + scan_page_cuts(img, page_height) + [height]
+    logger.debug(f"Page cuts of {getattr(img, 'filename', 'image')}: {edges[1:-1]}")
+    return [(0, top, width, bottom) for top, bottom in zip(edges, edges[1:])]
@@ -0,0 +1,183 @@
+import os
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src.utils.logger import get_logger
+from src.utils.tracing import tracer
+
+logger = get_logger("core.target_size")
+
+# Formats whose size follows the quality setting
+LOSSY_FORMATS = ('jpg', 'jpeg', 'webp')
+# Lowest quality tried before giving up or downscaling
+MIN_QUALITY = 20
+# Trial encodes run side by side in each search round
+TRIALS = 4
+# Downscaling steps tried with allow_downscale
+MAX_DOWNSCALES = 4
+# Typical log size of an encode relative to quality 100, at qualities 10,
+# 20, ..., 100 (averaged over photos, text, gradients and noise); places
+# the first round of trials
+SIZE_CURVES = {
+    'jpeg': (-2.62, -2.23, -1.97, -1.8, -1.68, -1.56, -1.4, -1.2, -0.87, 0.0),
+    'webp': (-1.55, -1.35, -1.2, -1.09, -0.99, -0.91, -0.84, -0.67, -0.39, 0.0),
+}
+# A fitting encode that uses this share of the limit ends the search
+GOOD_FIT = 0.9
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class OutputTooLarge(ValueError):
+    """
+    Raised when an image cannot be encoded within the byte limit.
+    """
+    pass
+
+
+def _trial_pool():
+    """
+    Thread pool shared by all trial encodes, so concurrent jobs do not
+    multiply the encoder threads.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=min(TRIALS, os.cpu_count() or 1), thread_name_prefix="trial-encode")
+        return _pool
+
+
+def encode_within(img, ext, max_bytes, encode, quality=95, allow_downscale=False, **save_kwargs):
+    """
+    Encodes img in memory so the result has at most max_bytes bytes and
+    returns it. The plain encode at quality is tried first; if it is too
+    large, lossy formats search the quality down to MIN_QUALITY with
+    TRIALS parallel encodes per round, seeded from the size of that first
+    encode, keeping the highest quality that fits or one that comes within
+    GOOD_FIT of the limit. Lossless formats are re-encoded with optimize.
+    allow_downscale then shrinks the image, guided by the smallest size
+    reached, and searches again. Raises OutputTooLarge if nothing fits.
+    encode(img, ext, **save_kwargs) returns the encoded bytes.
+    """
+    data = encode(img, ext, quality=quality, **save_kwargs)
+    if len(data) <= max_bytes:
+        return data
+    lossy = ext.lower() in LOSSY_FORMATS
+    lowest = min(MIN_QUALITY, quality)
+    smallest = len(data)
+    # A (quality, size) known or estimated for the current image
+    anchor = (quality, len(data))
+    current = img
+    top = quality - 1
+    for step in range(MAX_DOWNSCALES + 1):
+        if step:
+            factor = max(0.5, min(0.9, (max_bytes / smallest) ** 0.5))
+            size = (max(1, int(current.size[0] * factor)), max(1, int(current.size[1] * factor)))
+            with tracer.stage("downscale", size=f"{size[0]}x{size[1]}"):
+                current = img.resize(size, Image.Resampling.LANCZOS)
+            top = quality
+            anchor = (anchor[0], anchor[1] * factor * factor)
+        if lossy:
+            found, seen = _search_quality(current, ext, max_bytes, lowest, top, encode, save_kwargs, anchor)
+            if seen is not None:
+                anchor = seen
+                seen = seen[1]
+        else:
+            data = encode(current, ext, optimize=True, **save_kwargs)
+            found, seen = (data, None) if len(data) <= max_bytes else (None, len(data))
+        if seen is not None:
+            smallest = seen
+        if found is not None:
+            data, chosen = found if lossy else (found, None)
+            logger.debug(f"Fitted {img.size[0]}x{img.size[1]} {ext} into {len(data)}/{max_bytes} bytes "
+                         f"(quality {chosen}, size {current.size[0]}x{current.size[1]})")
+            return data
+        if not allow_downscale or min(current.size) <= 1:
+            break
+    raise OutputTooLarge(f"cannot encode {img.size[0]}x{img.size[1]} {ext} within {max_bytes} bytes")
+
+
+def _search_quality(img, ext, max_bytes, low, high, encode, save_kwargs, anchor):
+    """
+    A quality in [low, high] whose encode fits, as ((data, quality),
+    smallest encode seen as (quality, size)), or (None, smallest encode
+    seen) if none fits. Ends at the highest quality that fits once the one
+    above it was tried too, or at a fit within GOOD_FIT of the limit.
+    anchor is a (quality, size) known or estimated for img, from which the
+    first round is placed (see _next_trials).
+    """
+    pool = _trial_pool()
+    best = None
+    smallest = None
+    sizes = {anchor[0]: anchor[1]}
+    while low <= high:
+        count = min(TRIALS, high - low + 1)
+        if count == high - low + 1:
+            qualities = list(range(low, high + 1))
+        else:
+            qualities = _next_trials(ext, max_bytes, low, high, count, sizes, anchor)
+        with tracer.stage("trial-encode", qualities=",".join(map(str, qualities))):
+            futures = [pool.submit(encode, img, ext, quality=q, **save_kwargs) for q in qualities]
+            results = [f.result() for f in futures]
+        for q, data in zip(qualities, results):
+            sizes[q] = len(data)
+            if smallest is None or len(data) < smallest[1]:
+                smallest = (q, len(data))
+        fitting = [(q, data) for q, data in zip(qualities, results) if len(data) <= max_bytes]
+        if not fitting:
+            if qualities[0] == low:
+                # Even the lowest quality is too large
+                break
+            high = qualities[0] - 1
+            continue
+        q, data = fitting[-1]
+        best = (data, q)
+        above = [x for x in qualities if x > q]
+        low, high = q + 1, (above[0] - 1 if above else high)
+        if len(data) >= max_bytes * GOOD_FIT:
+            break
+    return best, smallest
+
+
+def _next_trials(ext, max_bytes, low, high, count, sizes, anchor):
+    """
+    The count qualities in [low, high] to try next, given the sizes
+    measured so far. Once sizes on both sides of the limit are known,
+    SIZE_CURVES is scaled to pass through both and the qualities around
+    where it meets the limit are tried. Otherwise the trials aim at 1.1 to
+    0.8 times the limit on SIZE_CURVES, drawn through the size measured
+    just above the range or through anchor.
+    """
+    below, above = low - 1, high + 1
+    if (below in sizes and above in sizes and sizes[above] > sizes[below]
+            and _curve(ext, above) > _curve(ext, below)):
+        # The curve scaled to pass through both measured sizes
+        scale = math.log(sizes[above] / sizes[below]) / (_curve(ext, above) - _curve(ext, below))
+        target = _curve(ext, below) + math.log(max_bytes / sizes[below]) / scale
+        guess = max([q for q in range(low, high + 1) if _curve(ext, q) <= target], default=low)
+        start = min(max(low, guess - 1), high - count + 1)
+        return list(range(start, start + count))
+    ref_quality, ref_size = (above, sizes[above]) if above in sizes else anchor
+    base = math.log(ref_size) - _curve(ext, ref_quality)
+    qualities = set()
+    for i in range(count):
+        target = math.log(max_bytes * (1.1 - 0.3 * i / max(1, count - 1)))
+        fitting = [q for q in range(low, high + 1) if base + _curve(ext, q) <= target]
+        qualities.add(fitting[-1] if fitting else low)
+    # Aims that land on the same quality leave room for its neighbours
+    extra = (q for q in sorted(range(low, high + 1), key=lambda q: abs(q - max(qualities))) if q not in qualities)
+    while len(qualities) < count:
+        qualities.add(next(extra))
+    return sorted(qualities)
+
+
+def _curve(ext, quality):
+    """
+    SIZE_CURVES of the format at quality, interpolated.
+    """
+    points = SIZE_CURVES['webp' if ext.lower() == 'webp' else 'jpeg']
+    x = min(100, max(10, quality)) / 10 - 1
+    i = min(int(x), len(points) - 2)
+    return points[i] + (points[i + 1] - points[i]) * (x - i)
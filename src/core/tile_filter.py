@@ -0,0 +1,141 @@
+import os
+import hashlib
+import threading
+from PIL import Image
+from src.utils.logger import get_logger
+
+logger = get_logger("core.tile_filter")
+
+ACTION_SKIP = 'skip'
+ACTION_REFERENCE = 'reference'
+ACTIONS = (ACTION_SKIP, ACTION_REFERENCE)
+
+# Longest side of the reduced view a tile is classified on
+VIEW_SIZE = 32
+
+
+class TileFilter:
+    """
+    Recognises blank and repeated tiles before they are encoded.
+
+    A tile is blank when every band of a reduced view of it (VIEW_SIZE
+    pixels on the longest side) spans at most tolerance levels, so dust
+    and scanner noise average away while a line of text does not. A tile
+    is a duplicate when its pixels hash like those of a tile kept earlier
+    by the same filter, from the same input or from another input of the
+    batch whose split has completed, so a tile is never replaced by one
+    that may still be removed again.
+
+    action 'skip' leaves such tiles out; 'reference' also lists them in a
+    <name>_refs.json next to the tiles, naming the colour of a blank tile
+    or the kept tile a duplicate repeats. One filter is shared by all
+    split jobs of a batch and is safe to use from several threads.
+    """
+    def __init__(self, action=ACTION_SKIP, tolerance=8, duplicates=True):
+        if action not in ACTIONS:
+            raise ValueError(f"unknown tile filter action: {action}")
+        self.action = action
+        self.tolerance = tolerance
+        self.duplicates = duplicates
+        self._lock = threading.Lock()
+        # Kept tiles of completed splits, and of each running one by owner
+        self._seen = {}
+        self._pending = {}
+        self.counts = {'kept': 0, 'blank': 0, 'duplicate': 0}
+
+    def params(self):
+        """
+        Settings that change the output, for JobJournal parameters.
+        """
+        return {'action': self.action, 'tolerance': self.tolerance, 'duplicates': self.duplicates}
+
+    def check(self, tile, path, owner=None, across_inputs=True):
+        """
+        Returns None if the tile at path should be written, otherwise the
+        reference that replaces it: {'blank': colour} or {'same_as': path}.
+        owner names the split the tile belongs to (its input); without
+        across_inputs only tiles of the same owner are referred to.
+        """
+        colour = self.blank_colour(tile)
+        if colour is not None:
+            self._count('blank')
+            return {'blank': colour}
+        if self.duplicates:
+            key = (tile.mode, tile.size, hashlib.blake2b(tile.tobytes(), digest_size=16).digest())
+            with self._lock:
+                first = self._seen.get(key) if across_inputs else None
+                if first is None:
+                    first = self._pending.setdefault(owner, {}).setdefault(key, path)
+            if first != path:
+                self._count('duplicate')
+                return {'same_as': first}
+        self._count('kept')
+        return None
+
+    def blank_colour(self, tile):
+        """
+        The mean colour of a uniform tile, one value per band, or None.
+        """
+        width, height = tile.size
+        factor = max(1, max(width, height) // VIEW_SIZE)
+        view = tile
+        if factor > 1:
+            try:
+                view = tile.reduce(factor)
+            except ValueError:
+                # Palette and bilevel images cannot be reduced; their
+                # extrema are still exact
+                pass
+        extrema = view.getextrema()
+        if not isinstance(extrema[0], tuple):
+            extrema = (extrema,)
+        if any(high - low > self.tolerance for low, high in extrema):
+            return None
+        if view.mode in ('P', '1', 'I;16'):
+            colour = view.getpixel((0, 0))
+        else:
+            colour = view.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+        return list(colour) if isinstance(colour, tuple) else [colour]
+
+    def commit(self, owner, across_inputs=True):
+        """
+        Called once the split of owner has written all its tiles; with
+        across_inputs tiles of other inputs may be referred to them from
+        now on.
+        """
+        with self._lock:
+            kept = self._pending.pop(owner, {})
+            if across_inputs:
+                for key, path in kept.items():
+                    self._seen.setdefault(key, path)
+
+    def forget(self, owner):
+        """
+        Drops the tiles of a split that was aborted, so no tile is
+        referred to them.
+        """
+        with self._lock:
+            self._pending.pop(owner, None)
+
+    def summary(self):
+        counts = dict(self.counts)
+        return f"{counts['kept']} kept, {counts['blank']} blank, {counts['duplicate']} duplicate"
+
+    def _count(self, outcome):
+        with self._lock:
+            self.counts[outcome] += 1
+
+
+def reference_name(base_name):
+    return f"{base_name}_refs.json"
+
+
+def relative_reference(reference, output_dir):
+    """
+    A reference with the repeated tile's path relative to output_dir, using
+    forward slashes like archive entries.
+    """
+    if 'same_as' not in reference:
+        return reference
+    rel = os.path.relpath(reference['same_as'], output_dir)
+    return {'same_as': rel.replace(os.sep, '/')}
@@ -0,0 +1,469 @@
+import io
+import os
+import math
+import zlib
+import struct
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from src.core.segments import BIG_TIFF_BYTES
+from src.utils.logger import get_logger
+from src.utils.tracing import tracer
+
+logger = get_logger("core.tiled_tiff")
+
+COMPRESSION_DEFLATE = 'deflate'
+COMPRESSION_JPEG = 'jpeg'
+COMPRESSION_NONE = 'none'
+COMPRESSIONS = (COMPRESSION_DEFLATE, COMPRESSION_JPEG, COMPRESSION_NONE)
+
+# Edge of the square tiles; TIFF wants a multiple of 16
+TILE_SIZE = 256
+# Tile rows a stitch composes at a time when it is written tiled
+BAND_TILES = 16
+
+_COMPRESSION_CODES = {COMPRESSION_NONE: 1, COMPRESSION_JPEG: 7, COMPRESSION_DEFLATE: 8}
+_CODE_COMPRESSIONS = {code: name for name, code in _COMPRESSION_CODES.items()}
+# Deflate as tagged by older writers
+_OLD_DEFLATE = 32946
+
+# TIFF tags written and read here
+NEW_SUBFILE_TYPE = 254
+IMAGE_WIDTH = 256
+IMAGE_LENGTH = 257
+BITS_PER_SAMPLE = 258
+COMPRESSION = 259
+PHOTOMETRIC = 262
+SAMPLES_PER_PIXEL = 277
+PLANAR_CONFIGURATION = 284
+TILE_WIDTH = 322
+TILE_LENGTH = 323
+TILE_OFFSETS = 324
+TILE_BYTE_COUNTS = 325
+EXTRA_SAMPLES = 338
+JPEG_TABLES = 347
+YCBCR_SUBSAMPLING = 530
+
+SHORT, LONG, LONG8 = 3, 4, 16
+_TYPE_FORMATS = {1: 'B', 2: 'B', 3: 'H', 4: 'I', 7: 'B', 16: 'Q'}
+
+
+class TiledTiffWriter:
+    """
+    Writes a tiled, pyramidal TIFF from rows that arrive top to bottom.
+
+    write_rows() takes full-width bands of any height. Each completed row
+    of tiles is compressed (on max_workers threads) and written at once,
+    then reduced by half into the next level, down to the first level
+    that fits in one tile, so only about one tile row per level is held
+    in memory. The reduced levels follow the full image as further IFDs
+    marked as reduced-resolution images, which is how libvips, OpenSlide
+    and QuPath expect a pyramid. The directories are written by close().
+
+    compression is 'deflate', 'jpeg' (alpha is dropped) or 'none'.
+    big_tiff=None picks BigTIFF when the uncompressed image could come
+    near the 4 GiB limit of classic TIFF. A path target is written to a
+    temporary file that close() renames into place and abort() removes.
+    """
+    def __init__(self, target, size, mode='RGB', tile_size=TILE_SIZE, compression=COMPRESSION_DEFLATE, quality=90,
+                 big_tiff=None, max_workers=None):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"unknown TIFF compression: {compression}")
+        if tile_size <= 0 or tile_size % 16:
+            raise ValueError("tile size must be a positive multiple of 16")
+        if mode not in ('L', 'RGB', 'RGBA'):
+            mode = 'RGBA' if 'A' in mode else 'RGB'
+        if compression == COMPRESSION_JPEG and mode == 'RGBA':
+            mode = 'RGB'
+        self.mode = mode
+        self.size = size
+        self.tile_size = tile_size
+        self.compression = compression
+        self.quality = quality
+        width, height = size
+        if big_tiff is None:
+            big_tiff = width * height * len(mode) * 4 // 3 >= BIG_TIFF_BYTES
+        self.big_tiff = big_tiff
+
+        self.path = None
+        self._tmp_path = None
+        if isinstance(target, (str, os.PathLike)):
+            self.path = os.fspath(target)
+            directory, name = os.path.split(self.path)
+            self._tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            self._file = open(self._tmp_path, 'w+b')
+        else:
+            self._file = target
+        self._start = self._file.tell()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1), thread_name_prefix="tiff-tile")
+
+        self._levels = []
+        while True:
+            self._levels.append(_Level(width, height))
+            if width <= tile_size and height <= tile_size:
+                break
+            width, height = (width + 1) // 2, (height + 1) // 2
+        # The first directory's offset is patched in by close()
+        self._write(b'II+\x00' + struct.pack('<HHQ', 8, 0, 0) if big_tiff else b'II*\x00' + struct.pack('<I', 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def levels(self):
+        return [(level.width, level.height) for level in self._levels]
+
+    def write_rows(self, band):
+        """
+        Adds the next rows of the full-size image.
+        """
+        if band.size[0] != self.size[0]:
+            raise ValueError(f"band is {band.size[0]} pixels wide, expected {self.size[0]}")
+        if band.mode != self.mode:
+            band = band.convert(self.mode)
+        self._feed(0, band)
+
+    def close(self):
+        """
+        Writes the last partial tile rows and the directories.
+        """
+        try:
+            for k, level in enumerate(self._levels):
+                rest = level.take_rest()
+                if rest is not None:
+                    self._write_tile_row(k, rest)
+                    if k + 1 < len(self._levels):
+                        self._feed(k + 1, rest.reduce(2))
+                if level.rows_written != level.height:
+                    raise ValueError(f"level {k} got {level.rows_written} of {level.height} rows")
+            self._write_directories()
+        except BaseException:
+            self.abort()
+            raise
+        self._pool.shutdown()
+        if self.path is not None:
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+        logger.debug(f"Wrote tiled TIFF {self.path or 'stream'}: {self.size[0]}x{self.size[1]}, "
+                     f"{len(self._levels)} levels, {self.compression}")
+
+    def abort(self):
+        """
+        Stops writing; a path target is removed again.
+        """
+        self._pool.shutdown(cancel_futures=True)
+        if self.path is not None and not self._file.closed:
+            self._file.close()
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+
+    def _feed(self, k, band):
+        level = self._levels[k]
+        for row in level.add(band, self.tile_size):
+            self._write_tile_row(k, row)
+            if k + 1 < len(self._levels):
+                self._feed(k + 1, row.reduce(2))
+
+    def _write_tile_row(self, k, rows):
+        level = self._levels[k]
+        size = self.tile_size
+        tiles = [rows.crop((x, 0, x + size, size)) for x in range(0, level.width, size)]
+        with tracer.stage("encode", level=k, row=level.rows_written // size):
+            for data in self._pool.map(self._compress, tiles):
+                level.offsets.append(self._write(data, align=True))
+                level.counts.append(len(data))
+        level.rows_written += rows.size[1]
+
+    def _compress(self, tile):
+        if self.compression == COMPRESSION_JPEG:
+            buf = io.BytesIO()
+            tile.save(buf, format='JPEG', quality=self.quality)
+            return buf.getvalue()
+        data = tile.tobytes()
+        return zlib.compress(data, 6) if self.compression == COMPRESSION_DEFLATE else data
+
+    def _write(self, data, align=False):
+        """
+        Appends data and returns its offset from the start of the TIFF.
+        """
+        f = self._file
+        f.seek(0, io.SEEK_END)
+        if align and (f.tell() - self._start) % 2:
+            f.write(b'\x00')
+        offset = f.tell() - self._start
+        f.write(data)
+        return offset
+
+    def _write_directories(self):
+        # Where the header points to the first directory
+        previous = 8 if self.big_tiff else 4
+        offset_type = LONG8 if self.big_tiff else LONG
+        for k, level in enumerate(self._levels):
+            bands = len(self.mode)
+            photometric = 1 if self.mode == 'L' else (6 if self.compression == COMPRESSION_JPEG else 2)
+            entries = [
+                (NEW_SUBFILE_TYPE, LONG, [1 if k else 0]),
+                (IMAGE_WIDTH, LONG, [level.width]),
+                (IMAGE_LENGTH, LONG, [level.height]),
+                (BITS_PER_SAMPLE, SHORT, [8] * bands),
+                (COMPRESSION, SHORT, [_COMPRESSION_CODES[self.compression]]),
+                (PHOTOMETRIC, SHORT, [photometric]),
+                (SAMPLES_PER_PIXEL, SHORT, [bands]),
+                (PLANAR_CONFIGURATION, SHORT, [1]),
+                (TILE_WIDTH, LONG, [self.tile_size]),
+                (TILE_LENGTH, LONG, [self.tile_size]),
+                (TILE_OFFSETS, offset_type, level.offsets),
+                (TILE_BYTE_COUNTS, offset_type, level.counts),
+            ]
+            if self.mode == 'RGBA':
+                # Unassociated alpha
+                entries.append((EXTRA_SAMPLES, SHORT, [2]))
+            if photometric == 6:
+                entries.append((YCBCR_SUBSAMPLING, SHORT, [2, 2]))
+            position = self._write_directory(entries)
+            self._patch(previous, position)
+            previous = position + (8 + 20 * len(entries) if self.big_tiff else 2 + 12 * len(entries))
+
+    def _write_directory(self, entries):
+        """
+        Writes the values that do not fit in their entries, then the
+        directory itself; returns its offset.
+        """
+        inline = 8 if self.big_tiff else 4
+        packed = []
+        for tag, kind, values in entries:
+            data = array(_TYPE_FORMATS[kind], values).tobytes()
+            if len(data) > inline:
+                data = struct.pack('<Q' if self.big_tiff else '<I', self._write(data, align=True))
+            packed.append((tag, kind, len(values), data.ljust(inline, b'\x00')))
+        if self.big_tiff:
+            ifd = struct.pack('<Q', len(packed)) + b''.join(struct.pack('<HHQ', *e[:3]) + e[3] for e in packed)
+            ifd += struct.pack('<Q', 0)
+        else:
+            ifd = struct.pack('<H', len(packed)) + b''.join(struct.pack('<HHI', *e[:3]) + e[3] for e in packed)
+            ifd += struct.pack('<I', 0)
+        return self._write(ifd, align=True)
+
+    def _patch(self, position, value):
+        f = self._file
+        f.seek(self._start + position)
+        f.write(struct.pack('<Q' if self.big_tiff else '<I', value))
+
+
+class _Level:
+    """
+    Rows of one pyramid level waiting to fill a row of tiles.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self.offsets = []
+        self.counts = []
+        self._pending = None
+
+    def add(self, band, tile_size):
+        """
+        Adds rows and returns the complete tile rows now available.
+        """
+        if self._pending is not None:
+            joined = Image.new(band.mode, (self.width, self._pending.size[1] + band.size[1]))
+            joined.paste(self._pending, (0, 0))
+            joined.paste(band, (0, self._pending.size[1]))
+            band = joined
+        height = band.size[1]
+        complete = height - height % tile_size
+        rows = [band.crop((0, top, self.width, top + tile_size)) for top in range(0, complete, tile_size)]
+        self._pending = band.crop((0, complete, self.width, height)) if complete < height else None
+        return rows
+
+    def take_rest(self):
+        rest, self._pending = self._pending, None
+        return rest
+
+
+class TiledTiff:
+    """
+    Reads regions of a tiled TIFF, such as those of TiledTiffWriter,
+    decoding only the tiles they touch. levels lists the size of the full
+    image and of each reduced-resolution image after it.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._levels = self._read_directories()
+        except BaseException:
+            self._file.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def levels(self):
+        return [(level['width'], level['height']) for level in self._levels]
+
+    def best_level(self, max_size):
+        """
+        The smallest level whose longest side is still at least max_size,
+        or the full image if none is.
+        """
+        for k in range(len(self._levels) - 1, -1, -1):
+            width, height = self.levels[k]
+            if max(width, height) >= max_size:
+                return k
+        return 0
+
+    def read_region(self, box, level=0):
+        """
+        The pixels of box = (left, top, right, bottom) of a level.
+        """
+        info = self._levels[level]
+        left, top, right, bottom = box
+        tile_w, tile_h = info['tile']
+        region = Image.new(info['mode'], (right - left, bottom - top))
+        cols = math.ceil(info['width'] / tile_w)
+        for row in range(max(0, top // tile_h), min(math.ceil(info['height'] / tile_h), math.ceil(bottom / tile_h))):
+            for col in range(max(0, left // tile_w), min(cols, math.ceil(right / tile_w))):
+                tile = self._read_tile(info, row * cols + col)
+                region.paste(tile, (col * tile_w - left, row * tile_h - top))
+        return region
+
+    def read_level(self, level):
+        width, height = self.levels[level]
+        return self.read_region((0, 0, width, height), level)
+
+    def overview(self, max_size):
+        """
+        The image fitted into max_size x max_size, read from the smallest
+        level that is large enough.
+        """
+        img = self.read_level(self.best_level(max_size))
+        img.thumbnail((max_size, max_size))
+        return img
+
+    def _read_tile(self, info, index):
+        self._file.seek(info['offsets'][index])
+        data = self._file.read(info['counts'][index])
+        size = info['tile']
+        if info['compression'] == COMPRESSION_JPEG:
+            tables = info.get('tables')
+            if tables:
+                # Abbreviated stream: splice in the shared tables
+                data = tables[:-2] + data[2:]
+            tile = Image.open(io.BytesIO(data))
+            return tile if tile.mode == info['mode'] else tile.convert(info['mode'])
+        if info['compression'] == COMPRESSION_DEFLATE:
+            data = zlib.decompress(data)
+        return Image.frombytes(info['mode'], size, data)
+
+    def _read_directories(self):
+        f = self._file
+        header = f.read(16)
+        if header[:2] != b'II':
+            raise ValueError(f"{self.path}: only little-endian TIFF is supported")
+        big = struct.unpack('<H', header[2:4])[0] == 43
+        position = struct.unpack('<Q', header[8:16])[0] if big else struct.unpack('<I', header[4:8])[0]
+        levels = []
+        seen = set()
+        while position and position not in seen:
+            seen.add(position)
+            f.seek(position)
+            if big:
+                count = struct.unpack('<Q', f.read(8))[0]
+                raw = f.read(20 * count + 8)
+                entries = [struct.unpack_from('<HHQ8s', raw, 20 * i) for i in range(count)]
+                position = struct.unpack_from('<Q', raw, 20 * count)[0]
+            else:
+                count = struct.unpack('<H', f.read(2))[0]
+                raw = f.read(12 * count + 4)
+                entries = [struct.unpack_from('<HHI4s', raw, 12 * i) for i in range(count)]
+                position = struct.unpack_from('<I', raw, 12 * count)[0]
+            tags = {tag: self._values(kind, n, data, big) for tag, kind, n, data in entries if kind in _TYPE_FORMATS}
+            levels.append(self._level_info(tags))
+        if not levels:
+            raise ValueError(f"{self.path}: no images")
+        return levels
+
+    def _values(self, kind, count, data, big):
+        fmt = _TYPE_FORMATS[kind]
+        size = struct.calcsize(fmt) * count
+        if size > len(data):
+            offset = struct.unpack('<Q' if big else '<I', data)[0]
+            position = self._file.tell()
+            self._file.seek(offset)
+            data = self._file.read(size)
+            self._file.seek(position)
+        if kind in (2, 7):
+            return data[:size]
+        return list(array(fmt, data[:size]))
+
+    def _level_info(self, tags):
+        if TILE_WIDTH not in tags or TILE_OFFSETS not in tags:
+            raise ValueError(f"{self.path}: not a tiled TIFF")
+        code = tags.get(COMPRESSION, [1])[0]
+        compression = COMPRESSION_DEFLATE if code == _OLD_DEFLATE else _CODE_COMPRESSIONS.get(code)
+        bits = tags.get(BITS_PER_SAMPLE, [8])
+        if compression is None or any(b != 8 for b in bits) or tags.get(PLANAR_CONFIGURATION, [1])[0] != 1:
+            raise ValueError(f"{self.path}: unsupported TIFF layout")
+        bands = tags.get(SAMPLES_PER_PIXEL, [1])[0]
+        return {
+            'width': tags[IMAGE_WIDTH][0],
+            'height': tags[IMAGE_LENGTH][0],
+            'tile': (tags[TILE_WIDTH][0], tags[TILE_LENGTH][0]),
+            'mode': {1: 'L', 3: 'RGB', 4: 'RGBA'}[bands],
+            'compression': compression,
+            'offsets': tags[TILE_OFFSETS],
+            'counts': tags[TILE_BYTE_COUNTS],
+            'tables': tags.get(JPEG_TABLES),
+        }
+
+
+def encode_tiled_tiff(img, compression=COMPRESSION_DEFLATE, quality=90, tile_size=TILE_SIZE):
+    """
+    Encodes a decoded image as a tiled, pyramidal TIFF in memory.
+    """
+    buf = io.BytesIO()
+    writer = TiledTiffWriter(buf, img.size, img.mode, tile_size, compression, quality, max_workers=1)
+    for top in range(0, img.size[1], tile_size * BAND_TILES):
+        writer.write_rows(img.crop((0, top, img.size[0], min(img.size[1], top + tile_size * BAND_TILES))))
+    writer.close()
+    return buf.getvalue()
+
+
+def is_tiled_tiff(path):
+    try:
+        with TiledTiff(path):
+            return True
+    except (OSError, ValueError, KeyError, struct.error):
+        return False
+
+
+def open_overview(path, max_size):
+    """
+    An image of a tiled TIFF fitted into max_size x max_size, read from its
+    pyramid, or None if path is not a tiled TIFF. Used for previews.
+    """
+    if os.path.splitext(path)[1].lower() not in ('.tif', '.tiff'):
+        return None
+    try:
+        with TiledTiff(path) as tiff:
+            return tiff.overview(max_size)
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
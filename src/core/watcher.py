@@ -0,0 +1,405 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+import functools
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from src.core.processor import ImageProcessor
+from src.core.journal import JobJournal
+from src.core.dedup import IMAGE_EXTENSIONS
+from src.utils.logger import get_logger
+
+logger = get_logger("core.watcher")
+
+# Window over which WatchStats reports throughput (seconds)
+THROUGHPUT_WINDOW = 60.0
+
+
+class InotifySource:
+    """
+    Change notifications for one directory via Linux inotify (ctypes).
+    wait() returns the names that were closed after writing or moved in,
+    or None when the kernel queue overflowed and the directory must be
+    rescanned.
+    """
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_Q_OVERFLOW = 0x00004000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), self.IN_CLOSE_WRITE | self.IN_MOVED_TO)
+        if wd < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, os.strerror(err), directory)
+
+    @staticmethod
+    def available():
+        return sys.platform.startswith("linux")
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        names = []
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingSource:
+    """
+    Portable fallback: rescans the directory every interval and reports the
+    names whose size or mtime changed since the previous scan.
+    """
+    def __init__(self, directory, stop_event=None):
+        self.directory = directory
+        self._stop = stop_event or threading.Event()
+        self._seen = {}
+        # Files present at start are the caller's initial scan
+        self._scan()
+
+    def wait(self, timeout):
+        if self._stop.wait(timeout):
+            return []
+        return self._scan()
+
+    def _scan(self):
+        changed = []
+        seen = {}
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    sig = (st.st_size, st.st_mtime_ns)
+                    seen[entry.name] = sig
+                    if self._seen.get(entry.name) != sig:
+                        changed.append(entry.name)
+        except OSError as e:
+            logger.warning(f"Could not scan {self.directory}: {e}")
+            return []
+        self._seen = seen
+        return changed
+
+    def close(self):
+        pass
+
+
+class StabilityTracker:
+    """
+    Holds candidate files until they are completely written: a file is
+    ready once its size and mtime have not changed for `settle` seconds.
+    """
+    def __init__(self, settle=1.0, clock=time.monotonic):
+        self.settle = settle
+        self.clock = clock
+        self._pending = {}
+
+    def touch(self, path):
+        now = self.clock()
+        entry = self._pending.get(path)
+        if entry is None:
+            self._pending[path] = {'sig': None, 'since': now, 'first_seen': now}
+        else:
+            # Written to again; restart the settle period
+            entry['sig'] = None
+            entry['since'] = now
+
+    def __len__(self):
+        return len(self._pending)
+
+    def ready(self, limit=None):
+        """
+        Returns up to limit (path, first_seen) pairs of settled files and
+        stops tracking them. Files that disappeared are dropped.
+        """
+        now = self.clock()
+        ready = []
+        for path, entry in list(self._pending.items()):
+            if limit is not None and len(ready) >= limit:
+                break
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            sig = (st.st_size, st.st_mtime_ns)
+            if sig != entry['sig']:
+                entry['sig'] = sig
+                entry['since'] = now
+            elif st.st_size > 0 and now - entry['since'] >= self.settle:
+                ready.append((path, entry['first_seen']))
+                del self._pending[path]
+        return ready
+
+
+class WatchStats:
+    """
+    Sustained throughput and detection-to-output latency of a watcher.
+    """
+    def __init__(self, clock=time.monotonic, max_samples=1000):
+        self.clock = clock
+        self.started = clock()
+        self.processed = 0
+        self.skipped = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=max_samples)
+        self._completions = collections.deque()
+
+    def record(self, outcome, latency=None):
+        now = self.clock()
+        with self._lock:
+            if outcome == 'processed':
+                self.processed += 1
+                self._latencies.append(latency)
+                self._completions.append(now)
+            elif outcome == 'skipped':
+                self.skipped += 1
+            else:
+                self.failed += 1
+
+    def _percentile(self, ordered, pct):
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+    def snapshot(self):
+        now = self.clock()
+        with self._lock:
+            while self._completions and now - self._completions[0] > THROUGHPUT_WINDOW:
+                self._completions.popleft()
+            window = min(THROUGHPUT_WINDOW, max(now - self.started, 1e-9))
+            ordered = sorted(self._latencies)
+            return {
+                'processed': self.processed,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'per_minute': len(self._completions) * 60.0 / window,
+                'latency_p50': self._percentile(ordered, 50),
+                'latency_p95': self._percentile(ordered, 95),
+                'uptime': now - self.started,
+            }
+
+    def format(self):
+        s = self.snapshot()
+        latency = "n/a" if s['latency_p50'] is None else f"p50 {s['latency_p50']:.2f}s, p95 {s['latency_p95']:.2f}s"
+        return (f"processed {s['processed']}, skipped {s['skipped']}, failed {s['failed']}, "
+                f"{s['per_minute']:.1f} files/min, latency {latency}")
+
+
+class HotFolderWatcher:
+    """
+    Splits every image that lands in input_dir.
+
+    New or rewritten files are detected with inotify where available (or
+    by polling), held until fully written, then split on a bounded pool of
+    max_workers threads; at most max_pending files are queued at a time.
+    With run_job the pool is not created: run_job(path, job) is called
+    from the watcher thread for each settled file and must arrange for
+    job() to run, e.g. through the application's JobScheduler, so watch
+    splits share its threads and memory budget.
+    Each output directory keeps a JobJournal, so after a restart files that
+    were already split are skipped instead of reprocessed. on_result and
+    on_error are called from the threads that run the splits.
+    Only the top level of input_dir is watched; hidden files are ignored.
+    """
+    def __init__(self, input_dir, output_dir, rows=2, cols=2, output_format=None, quality=95,
+                 subfolder=False, max_workers=2, max_pending=None, settle=1.0, poll_interval=1.0,
+                 use_inotify=None, on_result=None, on_error=None, run_job=None, clock=time.monotonic):
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        if os.path.normcase(self.input_dir) == os.path.normcase(self.output_dir) and not subfolder:
+            raise ValueError("output directory must differ from the watched directory")
+        self.split_kwargs = {'output_format': output_format, 'quality': quality, 'rows': rows, 'cols': cols}
+        self.subfolder = subfolder
+        self.max_workers = max_workers
+        self.max_pending = max_pending or 2 * max_workers
+        self.poll_interval = poll_interval
+        self.use_inotify = InotifySource.available() if use_inotify is None else use_inotify
+        self.on_result = on_result
+        self.on_error = on_error
+        self.run_job = run_job
+        self.clock = clock
+        self.tracker = StabilityTracker(settle, clock)
+        self.stats = WatchStats(clock)
+        self._stop = None
+        self._thread = None
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+    def output_dir_for(self, path):
+        if not self.subfolder:
+            return self.output_dir
+        out_dir = os.path.join(self.output_dir, os.path.splitext(os.path.basename(path))[0])
+        os.makedirs(out_dir, exist_ok=True)
+        return out_dir
+
+    def _wanted(self, name):
+        return not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+
+    def _open_source(self, stop):
+        if self.use_inotify:
+            try:
+                return InotifySource(self.input_dir)
+            except (OSError, AttributeError) as e:
+                logger.warning(f"inotify unavailable, falling back to polling: {e}")
+        return PollingSource(self.input_dir, stop)
+
+    def _rescan(self):
+        for name in os.listdir(self.input_dir):
+            if self._wanted(name):
+                self.tracker.touch(os.path.join(self.input_dir, name))
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        # A fresh event per run, so a loop still winding down after
+        # stop(wait=False) cannot be revived by a quick restart
+        self._stop = threading.Event()
+        if self.run_job is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="HotFolder")
+        self._thread = threading.Thread(target=self._run, args=(self._stop, self._executor), name="HotFolderWatcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.input_dir} -> {self.output_dir}")
+
+    def stop(self, wait=True):
+        """
+        Stops watching. Files already handed to the pool are finished (and
+        waited for when wait is True; jobs given to run_job are not waited
+        for); files still settling are picked up again on the next start.
+        """
+        if self._stop is not None:
+            self._stop.set()
+        if self._thread is not None:
+            if wait:
+                self._thread.join()
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        logger.info(f"Stopped watching {self.input_dir}: {self.stats.format()}")
+
+    def is_running(self):
+        return self._thread is not None
+
+    def run_forever(self, report_interval=60.0):
+        """
+        Blocking headless loop; logs stats every report_interval seconds
+        until interrupted.
+        """
+        self.start()
+        stop = self._stop
+        try:
+            while not stop.wait(report_interval):
+                logger.info(f"Watch stats: {self.stats.format()}")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def _run(self, stop, executor):
+        source = self._open_source(stop)
+        try:
+            # Files that arrived while we were not running
+            self._rescan()
+            while not stop.is_set():
+                # Poll quickly while files are settling, idle otherwise
+                timeout = min(self.poll_interval, self.tracker.settle / 2) if len(self.tracker) else self.poll_interval
+                names = source.wait(timeout)
+                if names is None:
+                    self._rescan()
+                else:
+                    for name in names:
+                        if self._wanted(name):
+                            self.tracker.touch(os.path.join(self.input_dir, name))
+                self._dispatch(stop, executor)
+        except Exception as e:
+            logger.error(f"Watcher stopped on error: {e}")
+        finally:
+            source.close()
+
+    def _dispatch(self, stop, executor):
+        if stop.is_set():
+            return
+        with self._lock:
+            slots = self.max_pending - self._in_flight
+        if slots <= 0 or not len(self.tracker):
+            # When saturated, settled files stay tracked until a slot frees
+            return
+        for path, first_seen in self.tracker.ready(limit=slots):
+            with self._lock:
+                self._in_flight += 1
+            if executor is None:
+                self.run_job(path, functools.partial(self._process, path, first_seen))
+                continue
+            try:
+                executor.submit(self._process, path, first_seen)
+            except RuntimeError:
+                # The pool was shut down by stop(wait=False) meanwhile
+                with self._lock:
+                    self._in_flight -= 1
+                return
+
+    def pending_count(self):
+        """
+        Files detected but not finished yet (settling, queued or running).
+        """
+        with self._lock:
+            return len(self.tracker) + self._in_flight
+
+    def _process(self, path, first_seen):
+        try:
+            out_dir = self.output_dir_for(path)
+            journal = JobJournal.for_directory(out_dir)
+            params = ImageProcessor.split_params(path, **self.split_kwargs)
+            outputs = journal.lookup(os.path.abspath(path), [path], params)
+            if outputs is not None:
+                self.stats.record('skipped')
+            else:
+                outputs = ImageProcessor.split_image(path, out_dir, journal=journal, **self.split_kwargs)
+                self.stats.record('processed', self.clock() - first_seen)
+            if self.on_result:
+                self.on_result(path, outputs)
+        except Exception as e:
+            self.stats.record('failed')
+            logger.error(f"Watch split failed for {path}: {e}")
+            if self.on_error:
+                self.on_error(path, e)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
@@ -1,7 +1,14 @@
 from PyQt6.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
 import traceback
+import inspect
+import time
 import sys
 
+from src.core.processor import OperationCancelled
+
+# Minimum time between two progress emissions of the same worker (seconds)
+PROGRESS_INTERVAL = 0.1
+
 class WorkerSignals(QObject):
     """
     Defines the signals available from a running worker thread.
@@ -10,6 +17,7 @@ class WorkerSignals(QObject):
     error = pyqtSignal(tuple)
     result = pyqtSignal(object)
     progress = pyqtSignal(int)
+    cancelled = pyqtSignal()
 
 class Worker(QRunnable):
     """
@@ -23,6 +31,49 @@ class Worker(QRunnable):
         self.args = args
         self.kwargs = kwargs
         self.signals = WorkerSignals()
+        self.is_cancelled = False
+        # Set by BatchRun.submit; lets the batch pause us at checkpoints
+        self.batch = None
+        self._last_percent = -1
+        self._last_emit = 0.0
+
+        # Hand our progress hook to functions that accept one
+        if self._accepts_progress(fn):
+            self.kwargs.setdefault('progress_callback', self.report_progress)
+
+    @staticmethod
+    def _accepts_progress(fn):
+        try:
+            return 'progress_callback' in inspect.signature(fn).parameters
+        except (TypeError, ValueError):
+            return False
+
+    def cancel(self):
+        """
+        Requests the running function to stop at its next progress report.
+        """
+        self.is_cancelled = True
+
+    def report_progress(self, done, total):
+        """
+        Progress callback passed to the processing function. Converts
+        (done, total) to a percentage and emits it at most every
+        PROGRESS_INTERVAL seconds, always emitting completion.
+        Doubles as the pause/cancel checkpoint between tiles or images.
+        """
+        if self.batch is not None:
+            self.batch.checkpoint()
+        if self.is_cancelled:
+            raise OperationCancelled()
+        percent = int(done * 100 / total) if total else 100
+        if percent == self._last_percent:
+            return
+        now = time.monotonic()
+        if percent < 100 and now - self._last_emit < PROGRESS_INTERVAL:
+            return
+        self._last_percent = percent
+        self._last_emit = now
+        self.signals.progress.emit(percent)
 
     @pyqtSlot()
     def run(self):
@@ -31,6 +82,8 @@ class Worker(QRunnable):
         """
         try:
             result = self.fn(*self.args, **self.kwargs)
+        except OperationCancelled:
+            self.signals.cancelled.emit()
         except:
             traceback.print_exc()
             exctype, value = sys.exc_info()[:2]
@@ -0,0 +1,190 @@
+import os
+import io
+import time
+import queue
+import atexit
+import tarfile
+import zipfile
+import threading
+from concurrent.futures import Future
+from src.utils.tracing import tracer
+
+_STOP = object()
+
+
+def write_file(output_path, data, atomic=True):
+    """
+    Writes bytes to output_path. With atomic=True the data goes to a
+    temporary file next to the target that is renamed into place, so
+    readers never see a partially written output.
+    """
+    if not atomic:
+        with open(output_path, 'wb') as f:
+            f.write(data)
+        return
+    directory, name = os.path.split(output_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class AsyncWriter:
+    """
+    Writer stage for encoded outputs.
+
+    submit() puts (path, bytes) on a bounded queue and returns a Future;
+    dedicated I/O threads drain the queue, one write each at a time. When
+    the queue is full submit() blocks, which keeps encoders from running
+    arbitrarily far ahead of slow storage.
+    """
+    # Outputs end up as files at the submitted paths
+    writes_files = True
+
+    def __init__(self, io_threads=4, max_pending=64, atomic=True):
+        self.atomic = atomic
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._threads = []
+        for i in range(io_threads):
+            t = threading.Thread(target=self._run, name=f"AsyncWriter-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, output_path, data):
+        if self._closed:
+            raise RuntimeError("AsyncWriter is closed")
+        future = Future()
+        self._queue.put((output_path, data, future))
+        return future
+
+    def write(self, output_path, data):
+        """
+        Submits a write and waits for it to complete.
+        """
+        return self.submit(output_path, data).result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            output_path, data, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                with tracer.stage("write", file=output_path):
+                    self._write(output_path, data)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(output_path)
+
+    def _write(self, output_path, data):
+        write_file(output_path, data, self.atomic)
+
+    def close(self, wait=True):
+        if self._closed:
+            return
+        self._closed = True
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        if wait:
+            for t in self._threads:
+                t.join()
+
+
+ARCHIVE_KINDS = ('zip', 'tar')
+
+
+class ArchiveWriter(AsyncWriter):
+    """
+    Writer that streams outputs into one uncompressed zip or tar archive
+    instead of creating a file per output.
+
+    Submitted paths name the entries: they are stored relative to root
+    (the archive's directory by default), so tiles keep their usual names.
+    A single I/O thread appends entries in submission order. The archive is
+    written to a hidden partial file and renamed into place by close(), or
+    removed by close(discard=True).
+    """
+    writes_files = False
+
+    def __init__(self, archive_path, root=None, kind=None, max_pending=64):
+        self.archive_path = archive_path
+        self.root = os.path.abspath(root if root is not None else os.path.dirname(archive_path))
+        self.kind = kind or os.path.splitext(archive_path)[1][1:].lower()
+        if self.kind not in ARCHIVE_KINDS:
+            raise ValueError(f"unsupported archive type: {self.kind}")
+        directory, name = os.path.split(archive_path)
+        self._part_path = os.path.join(directory, f".{name}.part")
+        self._file = open(self._part_path, 'wb')
+        if self.kind == 'zip':
+            self._archive = zipfile.ZipFile(self._file, 'w', zipfile.ZIP_STORED)
+        else:
+            # Stream mode: never seeks back into the file
+            self._archive = tarfile.open(fileobj=self._file, mode='w|')
+        self.entries = 0
+        super().__init__(io_threads=1, max_pending=max_pending, atomic=False)
+
+    def entry_name(self, output_path):
+        name = os.path.relpath(os.path.abspath(output_path), self.root)
+        if name.startswith(os.pardir):
+            name = os.path.basename(output_path)
+        return name.replace(os.sep, '/')
+
+    def _write(self, output_path, data):
+        name = self.entry_name(output_path)
+        if self.kind == 'zip':
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._archive.addfile(info, io.BytesIO(data))
+        self.entries += 1
+
+    def close(self, wait=True, discard=False):
+        """
+        Writes pending entries, finishes the archive and moves it into
+        place; with discard=True the partial archive is deleted instead.
+        """
+        if self._closed:
+            return
+        super().close(wait=True)
+        try:
+            self._archive.close()
+        finally:
+            self._file.close()
+        if discard:
+            try:
+                os.remove(self._part_path)
+            except OSError:
+                pass
+        else:
+            os.replace(self._part_path, self.archive_path)
+
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+
+def default_writer():
+    """
+    Returns the process-wide writer shared by all processing jobs.
+    """
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None:
+            _default_writer = AsyncWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
@@ -1,12 +1,63 @@
 import sys
 import os
+import argparse
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont
 from src.ui.main_window import MainWindow
+from src.core.watcher import HotFolderWatcher
+from src.core.service import serve
 from src.utils.logger import logger
 
-def main():
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="图像处理专家")
+    parser.add_argument("--watch", metavar="DIR", help="Run headless and split every image dropped into DIR")
+    parser.add_argument("--output", metavar="DIR", help="Output directory for --watch")
+    parser.add_argument("--rows", type=int, default=2)
+    parser.add_argument("--cols", type=int, default=2)
+    parser.add_argument("--format", dest="output_format", help="Output format, e.g. jpg or png (default: keep)")
+    parser.add_argument("--quality", type=int, default=95)
+    parser.add_argument("--subfolder", action="store_true", help="Create one output folder per input")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds a file must stay unchanged before it is processed")
+    parser.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="Run the local HTTP processing service")
+    parser.add_argument("--max-queued", type=int, default=8, help="Requests accepted beyond --workers before answering 503")
+    parser.add_argument("--allow-paths", action="store_true", help="Accept server-side paths in service requests")
+    # Leave Qt's own options (e.g. -platform) to QApplication
+    args, _ = parser.parse_known_args(argv)
+    if args.watch and not args.output:
+        parser.error("--watch requires --output")
+    return args
+
+def run_watch(args):
+    watcher = HotFolderWatcher(
+        args.watch,
+        args.output,
+        rows=args.rows,
+        cols=args.cols,
+        output_format=args.output_format,
+        quality=args.quality,
+        subfolder=args.subfolder,
+        max_workers=args.workers,
+        settle=args.settle,
+        use_inotify=False if args.poll else None
+    )
+    watcher.run_forever()
+
+def run_service(args):
+    host, _, port = args.serve.rpartition(":")
+    serve(host or "127.0.0.1", int(port), args.workers, args.max_queued, args.allow_paths)
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.watch:
+        run_watch(args)
+        return
+    if args.serve:
+        run_service(args)
+        return
+
     try:
         # Enable High DPI scaling
         os.environ["QT_ENABLE_HIGHDPI_SCALING"] = "1"
@@ -1,48 +1,73 @@
 import os
+import re
 import sys
+from collections import OrderedDict
+from datetime import datetime
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QTabWidget,
     QFileDialog, QLabel, QComboBox, QGroupBox, QListWidget,
     QAbstractItemView, QMessageBox, QSplitter, QCheckBox, QDialog, QProgressBar,
-    QSpinBox, QFrame, QSizePolicy
+    QSpinBox, QFrame, QSizePolicy, QLineEdit
 )
-from PyQt6.QtCore import Qt, QThreadPool, QSize, QUrl, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QThreadPool, QSize, QUrl, QThread, QObject, QTimer, pyqtSignal
 from PyQt6.QtGui import QIcon, QPixmap, QDesktopServices, QImage
-from PIL import Image, ImageQt
+from PIL import Image
 
-from src.ui.widgets import DropZone, ImageListWidget, PreviewWidget, InteractivePreviewWidget, ModernButton, ModernCard, ElidedLabel
+from src.ui.widgets import DropZone, ImageListWidget, PreviewWidget, InteractivePreviewWidget, ModernButton, ModernCard, ElidedLabel, TaskTable
 from src.core.processor import ImageProcessor
 from src.core.worker import Worker
-from src.utils.logger import logger
+from src.core.progress import BatchProgress, format_eta
+from src.core.scheduler import JobScheduler, total_physical_memory, MB
+from src.core.batch import BatchRun
+from src.core.journal import JobJournal
+from src.core.writer import ArchiveWriter
+from src.core.tile_filter import TileFilter, ACTION_SKIP, ACTION_REFERENCE
+from src.core.dedup import DuplicateIndex, scan_imports, split_with_duplicates
+from src.core.watcher import HotFolderWatcher
+from src.core.pyramid import generate_pyramid, estimate_pyramid_memory, LAYOUT_DZI, LAYOUT_XYZ
+from src.core.preview import StitchPreviewRenderer, DRAFT_WIDTH, grid_overlay, load_split_preview
+from src.core.tiled_tiff import COMPRESSION_DEFLATE, COMPRESSION_JPEG, COMPRESSION_NONE
+from src.core.grouping import plan_groups, unique_file_names, GROUP_BY_FOLDER, GROUP_BY_PATTERN, GROUP_EVERY_N
+from src.utils.logger import get_logger, flush_summaries
+from src.utils.tracing import tracer
 from src.ui.theme import get_stylesheet
+from src.ui.qt_image import pil_to_qimage
+
+logger = get_logger("ui.main_window")
+
+# combo_preview_quality entry that renders to fit the view and zoom
+PREVIEW_ADAPTIVE = 3
+# Split previews (downsampled files) kept for switching back and forth
+SPLIT_PREVIEW_CACHE = 16
+
+def load_split_preview_image(file_path):
+    """
+    load_split_preview for the split tab, converted for Qt off the UI thread.
+    """
+    img, source_size = load_split_preview(file_path)
+    return file_path, pil_to_qimage(img), source_size
 
 class StitchPreviewWorker(QThread):
     result_ready = pyqtSignal(object) # QImage or None
     
-    def __init__(self, images, mode, max_width=300):
+    def __init__(self, images, mode, max_width=300, overlap=False):
         super().__init__()
         self.images = images
         self.mode = mode
         self.max_width = max_width
+        self.overlap = overlap
         self._is_cancelled = False
         
     def run(self):
         try:
             if self._is_cancelled: return
             # Call processor static method
-            pil_img = ImageProcessor.generate_stitch_preview(self.images, self.mode, self.max_width)
+            pil_img = ImageProcessor.generate_stitch_preview(self.images, self.mode, self.max_width, self.overlap)
             
             if self._is_cancelled: return
             
             if pil_img:
-                # Convert to QImage (Thread Safe)
-                if pil_img.mode != "RGBA":
-                    pil_img = pil_img.convert("RGBA")
-                    
-                qim = ImageQt.ImageQt(pil_img)
-                qimage = qim.copy()
-                
-                self.result_ready.emit(qimage)
+                self.result_ready.emit(pil_to_qimage(pil_img))
             else:
                 self.result_ready.emit(None)
         except Exception as e:
@@ -52,6 +77,69 @@ class StitchPreviewWorker(QThread):
     def cancel(self):
         self._is_cancelled = True
 
+class AdaptivePreviewWorker(QThread):
+    """
+    Lays out the stitch, then renders it twice: a DRAFT_WIDTH strip right
+    away and then one that fits view_size (device pixels). The renderer
+    stays available for detail renderings.
+    """
+    result_ready = pyqtSignal(object, object, bool) # QImage or None, stitch size, refined
+
+    def __init__(self, images, mode, overlap=False, view_size=(300, 300)):
+        super().__init__()
+        self.images = images
+        self.mode = mode
+        self.overlap = overlap
+        self.view_size = view_size
+        self.renderer = None
+        self._is_cancelled = False
+
+    def run(self):
+        try:
+            renderer = StitchPreviewRenderer(self.images, self.mode, self.overlap)
+            if self._is_cancelled: return
+            self.renderer = renderer
+            draft_scale = min(1.0, DRAFT_WIDTH / renderer.width)
+            self.result_ready.emit(pil_to_qimage(renderer.render(draft_scale)), renderer.size, False)
+
+            scale = min(1.0, renderer.fit_scale(*self.view_size))
+            if self._is_cancelled or scale <= draft_scale: return
+            self.result_ready.emit(pil_to_qimage(renderer.render(scale)), renderer.size, True)
+        except Exception as e:
+            logger.error(f"Preview worker error: {e}")
+            self.result_ready.emit(None, None, False)
+
+    def cancel(self):
+        self._is_cancelled = True
+
+class PreviewDetailWorker(QThread):
+    """
+    Renders the part box of a stitch at scale, for the part in view.
+    """
+    result_ready = pyqtSignal(object, object) # QImage or None, box
+
+    def __init__(self, renderer, box, scale):
+        super().__init__()
+        self.renderer = renderer
+        self.box = box
+        self.scale = scale
+
+    def run(self):
+        try:
+            self.result_ready.emit(pil_to_qimage(self.renderer.render(self.scale, self.box)), self.box)
+        except Exception as e:
+            logger.error(f"Preview detail error: {e}")
+            self.result_ready.emit(None, self.box)
+
+class WatchSignals(QObject):
+    """
+    Carries settled hot-folder files from the watcher thread, and their
+    results from the pool threads, to the UI.
+    """
+    ready = pyqtSignal(str, object) # input path, split job
+    done = pyqtSignal(str, object) # input path, output paths
+    failed = pyqtSignal(str, str) # input path, error message
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -62,6 +150,31 @@ class MainWindow(QMainWindow):
         
         self.threadpool = QThreadPool()
         logger.info(f"Multithreading with maximum {self.threadpool.maxThreadCount()} threads")
+        # Admit jobs only while their estimated decoded size fits the budget
+        self.scheduler = JobScheduler(self.threadpool)
+        logger.info(f"Memory budget for processing: {self.scheduler.memory_budget // MB} MB")
+        # Imports are scanned and hashed off the UI thread, one drop at a time
+        self.import_pool = QThreadPool()
+        self.import_pool.setMaxThreadCount(1)
+        # Split previews are decoded here, latest selection last
+        self.preview_pool = QThreadPool()
+        self.preview_pool.setMaxThreadCount(1)
+        self.split_previews = OrderedDict()
+        self.split_dedup = DuplicateIndex()
+        self.stitch_dedup = DuplicateIndex()
+        # Shared archive of the running split batch, if any
+        self.batch_archive = None
+        # Blank/duplicate tile filter of the running split batch, if any
+        self.tile_filter = None
+        # Hot-folder watch mode
+        self.watcher = None
+        self.watch_signals = WatchSignals()
+        self.watch_signals.ready.connect(self.on_watch_ready)
+        self.watch_signals.done.connect(self.on_watch_done)
+        self.watch_signals.failed.connect(self.on_watch_failed)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setInterval(2000)
+        self.watch_timer.timeout.connect(self.refresh_watch_status)
 
         self.init_ui()
         self.apply_theme() # Apply initial theme
@@ -126,7 +239,12 @@ class MainWindow(QMainWindow):
         
         # Output Format
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["保持原格式", "JPG", "PNG", "BMP"])
+        self.format_combo.addItems(["保持原格式", "JPG", "PNG", "BMP", "分块金字塔 TIFF"])
+        self.format_combo.setItemData(4, "分块存储并附带多级缩略层，看图软件可只读取所需区域和缩放级别", Qt.ItemDataRole.ToolTipRole)
+        self.tiff_compression_combo = QComboBox()
+        self.tiff_compression_combo.addItems(["压缩: Deflate (无损)", "压缩: JPEG", "压缩: 无"])
+        self.tiff_compression_combo.setVisible(False)
+        self.format_combo.currentIndexChanged.connect(lambda i: self.tiff_compression_combo.setVisible(i == 4))
         
         # Stitch Mode
         self.stitch_mode_label = QLabel("拼接模式:")
@@ -134,27 +252,147 @@ class MainWindow(QMainWindow):
         self.stitch_mode_combo = QComboBox()
         self.stitch_mode_combo.addItems(["等宽缩放", "中心裁剪", "填充背景"])
         self.stitch_mode_combo.currentTextChanged.connect(self.update_stitch_preview)
+        self.chk_stitch_overlap = QCheckBox("去除重叠 (滚动截图)")
+        self.chk_stitch_overlap.setToolTip("自动找出相邻图片重复的部分并只保留一份，固定的顶部/底部栏也只保留一次")
+        self.chk_stitch_overlap.toggled.connect(self.update_stitch_preview)
+        # Oversize stitches are cut into segments
+        self.spin_segment_height = QSpinBox()
+        self.spin_segment_height.setRange(0, 1000000)
+        self.spin_segment_height.setSingleStep(1000)
+        self.spin_segment_height.setPrefix("分段高度: ")
+        self.spin_segment_height.setSuffix(" px")
+        self.spin_segment_height.setSpecialValueText("分段高度: 按格式上限")
+        self.spin_segment_height.setToolTip("超过此高度 (JPG 最高 65535 px，WebP 最高 16383 px) 时在图片交界处分段，依次输出 名称_1、名称_2 ...")
+        self.chk_stitch_multipage = QCheckBox("分段合并为多页 TIFF")
+        self.chk_stitch_multipage.setToolTip("各段作为同一个 TIFF 文件的页面写出，过大时自动使用 BigTIFF")
+        
+        # Batch stitch: one independent stitch per group
+        self.stitch_group_label = QLabel("分组方式:")
+        self.stitch_group_label.setObjectName("Caption")
+        self.stitch_group_combo = QComboBox()
+        self.stitch_group_combo.addItems(["不分组 (整体拼接)", "按子文件夹", "按文件名模式", "每 N 张一组"])
+        self.stitch_group_combo.setToolTip("分组后每组单独拼接为一张图，各组并行处理")
+        self.stitch_group_combo.currentIndexChanged.connect(self.update_group_controls)
+        self.edit_group_pattern = QLineEdit(r"^(.+?)[_\- ]*\d+$")
+        self.edit_group_pattern.setPlaceholderText("正则表达式，第一个括号内的部分相同即为一组")
+        self.edit_group_pattern.setToolTip("按文件名(不含扩展名)匹配，第一个捕获组作为组名")
+        self.spin_group_size = QSpinBox()
+        self.spin_group_size.setRange(1, 10000)
+        self.spin_group_size.setValue(10)
+        self.spin_group_size.setPrefix("每组 ")
+        self.spin_group_size.setSuffix(" 张")
         
         # New Options
         self.chk_create_subfolder = QCheckBox("为每张图创建独立文件夹")
         self.chk_create_subfolder.setChecked(False)
         self.chk_create_subfolder.setToolTip("在输出目录下以原文件名创建子文件夹存放分割后的图片")
         
+        # Split output: loose files or streamed archives
+        self.split_output_label = QLabel("分割输出:")
+        self.split_output_label.setObjectName("Caption")
+        self.split_output_combo = QComboBox()
+        self.split_output_combo.addItems(["单独文件", "每张图一个 ZIP", "每张图一个 TAR", "整批一个 ZIP", "整批一个 TAR"])
+        self.split_output_combo.setToolTip("写入不压缩的归档，避免在网络共享上逐个创建大量小文件")
+        self.tile_filter_label = QLabel("空白/重复块:")
+        self.tile_filter_label.setObjectName("Caption")
+        self.tile_filter_combo = QComboBox()
+        self.tile_filter_combo.addItems(["全部保留", "跳过", "跳过并写入引用清单"])
+        self.tile_filter_combo.setToolTip("编码前识别纯色空白块和与本批已输出块完全相同的块，不再重复写出")
+        
+        # Size cap per output file
+        max_size_label = QLabel("单文件上限:")
+        max_size_label.setObjectName("Caption")
+        self.spin_max_size = QSpinBox()
+        self.spin_max_size.setRange(0, 1024 * 1024)
+        self.spin_max_size.setSingleStep(100)
+        self.spin_max_size.setSuffix(" KB")
+        self.spin_max_size.setSpecialValueText("不限")
+        self.spin_max_size.setToolTip("超出时自动降低 JPG 质量后再写出，无需重新拼接或分割")
+        self.chk_allow_downscale = QCheckBox("仍超出时缩小尺寸")
+        self.chk_allow_downscale.setToolTip("最低质量仍超出上限时按比例缩小图片")
+        
         self.chk_auto_open = QCheckBox("处理完成后打开文件夹")
         self.chk_auto_open.setChecked(False)
         
+        self.chk_incremental = QCheckBox("增量处理 (跳过未变化的文件)")
+        self.chk_incremental.setChecked(True)
+        self.chk_incremental.setToolTip("在输出目录中记录处理日志，源文件与参数未变且输出完好时跳过该文件")
+        
+        # Memory budget for concurrently running jobs
+        memory_label = QLabel("内存上限:")
+        memory_label.setObjectName("Caption")
+        total_mb = (total_physical_memory() or 0) // MB
+        self.spin_memory_budget = QSpinBox()
+        self.spin_memory_budget.setRange(256, max(total_mb, 65536))
+        self.spin_memory_budget.setSingleStep(256)
+        self.spin_memory_budget.setSuffix(" MB")
+        self.spin_memory_budget.setValue(self.scheduler.memory_budget // MB)
+        self.spin_memory_budget.setToolTip("同时处理的图片按解码后大小估算，总量不超过此上限")
+        self.spin_memory_budget.valueChanged.connect(lambda v: self.scheduler.set_memory_budget(v * MB))
+        
         format_label = QLabel("输出格式:")
         format_label.setObjectName("Caption")
         settings_layout.addWidget(format_label)
         settings_layout.addWidget(self.format_combo)
+        settings_layout.addWidget(self.tiff_compression_combo)
         settings_layout.addWidget(self.stitch_mode_label)
         settings_layout.addWidget(self.stitch_mode_combo)
+        settings_layout.addWidget(self.chk_stitch_overlap)
+        settings_layout.addWidget(self.spin_segment_height)
+        settings_layout.addWidget(self.chk_stitch_multipage)
+        settings_layout.addWidget(self.stitch_group_label)
+        settings_layout.addWidget(self.stitch_group_combo)
+        settings_layout.addWidget(self.edit_group_pattern)
+        settings_layout.addWidget(self.spin_group_size)
         settings_layout.addWidget(self.output_dir_label)
         settings_layout.addWidget(self.btn_select_output)
         settings_layout.addWidget(self.chk_create_subfolder)
+        settings_layout.addWidget(self.split_output_label)
+        settings_layout.addWidget(self.split_output_combo)
+        settings_layout.addWidget(self.tile_filter_label)
+        settings_layout.addWidget(self.tile_filter_combo)
+        settings_layout.addWidget(max_size_label)
+        settings_layout.addWidget(self.spin_max_size)
+        settings_layout.addWidget(self.chk_allow_downscale)
         settings_layout.addWidget(self.chk_auto_open)
+        settings_layout.addWidget(self.chk_incremental)
+        settings_layout.addWidget(memory_label)
+        settings_layout.addWidget(self.spin_memory_budget)
         settings_layout.addStretch()
         
+        # Overall batch progress
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setRange(0, 100)
+        self.batch_progress_bar.setValue(0)
+        self.batch_progress_bar.setTextVisible(False)
+        self.lbl_eta = QLabel("")
+        self.lbl_eta.setObjectName("Caption")
+        settings_layout.addWidget(self.batch_progress_bar)
+        settings_layout.addWidget(self.lbl_eta)
+        
+        # Batch run controls
+        batch_controls = QHBoxLayout()
+        batch_controls.setSpacing(8)
+        self.btn_pause = ModernButton("暂停")
+        self.btn_pause.clicked.connect(self.toggle_pause)
+        self.btn_cancel = ModernButton("取消")
+        self.btn_cancel.clicked.connect(self.cancel_batch)
+        self.btn_pause.setEnabled(False)
+        self.btn_cancel.setEnabled(False)
+        batch_controls.addWidget(self.btn_pause)
+        batch_controls.addWidget(self.btn_cancel)
+        settings_layout.addLayout(batch_controls)
+        
+        # Hot folder: split every image dropped into a watched folder
+        self.btn_watch = ModernButton("监控文件夹...")
+        self.btn_watch.setToolTip("持续监控所选文件夹，自动按当前行列设置分割新放入的图片")
+        self.btn_watch.clicked.connect(self.toggle_watch)
+        self.lbl_watch_status = QLabel("")
+        self.lbl_watch_status.setObjectName("Caption")
+        self.lbl_watch_status.setWordWrap(True)
+        settings_layout.addWidget(self.btn_watch)
+        settings_layout.addWidget(self.lbl_watch_status)
+        
         self.btn_process = ModernButton("开始处理")
         self.btn_process.setObjectName("PrimaryButton")
         self.btn_process.clicked.connect(self.start_processing)
@@ -196,17 +434,50 @@ class MainWindow(QMainWindow):
         self.spin_rows.setValue(2)
         self.spin_rows.setSuffix(" 行")
         self.spin_rows.valueChanged.connect(self.validate_split_params)
+        self.spin_rows.valueChanged.connect(self.update_split_grid)
         
         self.spin_cols = QSpinBox()
         self.spin_cols.setRange(1, 10)
         self.spin_cols.setValue(2)
         self.spin_cols.setSuffix(" 列")
         self.spin_cols.valueChanged.connect(self.validate_split_params)
-        
-        param_layout.addWidget(QLabel("横向:"))
+        self.spin_cols.valueChanged.connect(self.update_split_grid)
+        
+        # Split mode: equal grid, or fixed-size tiles at every zoom level
+        self.split_mode_combo = QComboBox()
+        self.split_mode_combo.addItems(["等分网格", "瓦片金字塔 (DZI)", "瓦片金字塔 (XYZ)", "长图分页"])
+        self.split_mode_combo.setToolTip("瓦片金字塔：按固定尺寸切出各缩放级别的瓦片，供网页查看器使用\n长图分页：在目标页高附近的空白行处切开，避免切断文字和画格")
+        self.split_mode_combo.currentIndexChanged.connect(self.update_split_mode_controls)
+        self.split_mode_combo.currentIndexChanged.connect(self.update_split_grid)
+
+        self.spin_tile_size = QSpinBox()
+        self.spin_tile_size.setRange(64, 4096)
+        self.spin_tile_size.setSingleStep(64)
+        self.spin_tile_size.setValue(256)
+        self.spin_tile_size.setSuffix(" px")
+        self.spin_tile_size.setToolTip("瓦片边长")
+        self.lbl_tile_size = QLabel("瓦片:")
+
+        self.spin_page_height = QSpinBox()
+        self.spin_page_height.setRange(200, 20000)
+        self.spin_page_height.setSingleStep(100)
+        self.spin_page_height.setValue(2000)
+        self.spin_page_height.setSuffix(" px")
+        self.spin_page_height.setToolTip("目标页高，实际切点在其上下 20% 内选择")
+        self.lbl_page_height = QLabel("页高:")
+
+        param_layout.addWidget(self.split_mode_combo)
+        self.lbl_split_cols = QLabel("横向:")
+        self.lbl_split_rows = QLabel("纵向:")
+        param_layout.addWidget(self.lbl_split_cols)
         param_layout.addWidget(self.spin_cols)
-        param_layout.addWidget(QLabel("纵向:"))
+        param_layout.addWidget(self.lbl_split_rows)
         param_layout.addWidget(self.spin_rows)
+        param_layout.addWidget(self.lbl_tile_size)
+        param_layout.addWidget(self.spin_tile_size)
+        param_layout.addWidget(self.lbl_page_height)
+        param_layout.addWidget(self.spin_page_height)
+        self.update_split_mode_controls()
         
         self.btn_select_all = ModernButton("全选")
         self.btn_select_all.clicked.connect(lambda: self.split_list.set_all_check_state(Qt.CheckState.Checked))
@@ -271,13 +542,14 @@ class MainWindow(QMainWindow):
         self.btn_import_folder_stitch.clicked.connect(self.import_stitch_folder)
         
         self.btn_clear_stitch = ModernButton("清空列表")
-        self.btn_clear_stitch.clicked.connect(lambda: [self.stitch_list.clear(), self.update_stitch_preview()])
+        self.btn_clear_stitch.clicked.connect(self.clear_stitch_list)
         
         self.btn_preview_stitch = ModernButton("刷新预览")
         self.btn_preview_stitch.clicked.connect(self.update_stitch_preview)
         
         self.combo_preview_quality = QComboBox()
-        self.combo_preview_quality.addItems(["预览: 低 (快)", "预览: 中", "预览: 高 (慢)"])
+        self.combo_preview_quality.addItems(["预览: 低 (快)", "预览: 中", "预览: 高 (慢)", "预览: 自适应"])
+        self.combo_preview_quality.setCurrentIndex(PREVIEW_ADAPTIVE)
         self.combo_preview_quality.currentIndexChanged.connect(self.update_stitch_preview)
         
         stitch_toolbar.addWidget(self.btn_import_stitch)
@@ -311,6 +583,7 @@ class MainWindow(QMainWindow):
         
         # Right Column: Preview
         self.stitch_preview = InteractivePreviewWidget()
+        self.stitch_preview.view_changed.connect(self.on_stitch_view_changed)
         
         # Add to Splitter
         self.stitch_splitter = QSplitter(Qt.Orientation.Horizontal)
@@ -326,6 +599,14 @@ class MainWindow(QMainWindow):
         
         content_layout.addWidget(self.tabs)
 
+        # Task queue with per-task progress
+        task_title = QLabel("任务队列")
+        task_title.setObjectName("Caption")
+        self.task_table = TaskTable()
+        self.task_table.setMaximumHeight(180)
+        content_layout.addWidget(task_title)
+        content_layout.addWidget(self.task_table)
+
         self.main_splitter = QSplitter(Qt.Orientation.Horizontal)
         self.main_splitter.addWidget(settings_panel)
         self.main_splitter.addWidget(content_panel)
@@ -342,6 +623,10 @@ class MainWindow(QMainWindow):
         self.active_tasks_count = 0
         self.last_output_dir = None
         self.preview_worker = None
+        self.detail_worker = None
+        self.pending_detail = None
+        self.batch_progress = None
+        self.current_batch = None
 
     def toggle_theme(self):
         self.is_dark_mode = self.btn_theme_toggle.isChecked()
@@ -365,10 +650,45 @@ class MainWindow(QMainWindow):
         # 0 is Split Tab
         is_split = (index == 0)
         self.chk_create_subfolder.setVisible(is_split)
+        self.split_output_label.setVisible(is_split)
+        self.split_output_combo.setVisible(is_split)
+        self.tile_filter_label.setVisible(is_split)
+        self.tile_filter_combo.setVisible(is_split)
         
         # Update stitch mode visibility
         self.stitch_mode_combo.setVisible(not is_split)
+        self.chk_stitch_overlap.setVisible(not is_split)
+        self.spin_segment_height.setVisible(not is_split)
+        self.chk_stitch_multipage.setVisible(not is_split)
         self.stitch_mode_label.setVisible(not is_split)
+        self.stitch_group_label.setVisible(not is_split)
+        self.stitch_group_combo.setVisible(not is_split)
+        self.update_group_controls()
+
+    def update_group_controls(self):
+        is_stitch = self.tabs.currentIndex() == 1
+        group_idx = self.stitch_group_combo.currentIndex()
+        self.edit_group_pattern.setVisible(is_stitch and group_idx == 2)
+        self.spin_group_size.setVisible(is_stitch and group_idx == 3)
+
+    def current_pyramid_layout(self):
+        """
+        Pyramid layout chosen in the split mode combo, None for the grid.
+        """
+        return {1: LAYOUT_DZI, 2: LAYOUT_XYZ}.get(self.split_mode_combo.currentIndex())
+
+    def is_page_slicing(self):
+        return self.split_mode_combo.currentIndex() == 3
+
+    def update_split_mode_controls(self):
+        is_pyramid = self.current_pyramid_layout() is not None
+        is_pages = self.is_page_slicing()
+        for widget in (self.lbl_split_cols, self.spin_cols, self.lbl_split_rows, self.spin_rows):
+            widget.setVisible(not is_pyramid and not is_pages)
+        self.lbl_tile_size.setVisible(is_pyramid)
+        self.spin_tile_size.setVisible(is_pyramid)
+        self.lbl_page_height.setVisible(is_pages)
+        self.spin_page_height.setVisible(is_pages)
 
     def validate_split_params(self):
         # QSpinBox prevents invalid numbers, but we can double check
@@ -394,11 +714,11 @@ class MainWindow(QMainWindow):
         items = self.split_list.get_checked_items()
         for item in items:
             row = self.split_list.row(item)
+            self.split_dedup.remove(item.data(Qt.ItemDataRole.UserRole))
             self.split_list.takeItem(row)
         # Also clear preview if current item removed
         if self.split_list.count() == 0:
-            self.preview_widget.label.setText("预览区域")
-            self.preview_widget.label.setPixmap(QPixmap())
+            self.preview_widget.clear()
 
     def import_split_files(self):
         files, _ = QFileDialog.getOpenFileNames(
@@ -417,29 +737,69 @@ class MainWindow(QMainWindow):
             self.output_dir_label.setText(f"输出目录:\n{d}")
 
     def add_split_files(self, files):
-        for f in files:
-            if os.path.isfile(f):
-                if not f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                    continue
-                self.split_list.add_image(f)
-            elif os.path.isdir(f):
-                for root, _, filenames in os.walk(f):
-                    for name in filenames:
-                        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                            full_path = os.path.join(root, name)
-                            self.split_list.add_image(full_path)
+        # Walk folders and collapse duplicate content in the background
+        worker = Worker(scan_imports, list(files), self.split_dedup)
+        worker.signals.result.connect(self.on_split_files_scanned)
+        self.import_pool.start(worker)
+
+    def on_split_files_scanned(self, result):
+        unique, duplicates = result
+        for f in unique:
+            self.split_list.add_image(f)
+        if duplicates:
+            logger.info(f"{len(duplicates)} duplicate files will reuse the split of their original")
     
     def on_split_item_changed(self, current, previous):
         if not current:
             return
         
         file_path = current.data(Qt.ItemDataRole.UserRole)
-        if file_path and os.path.exists(file_path):
-            try:
-                pixmap = QPixmap(file_path)
-                self.preview_widget.set_image(pixmap)
-            except Exception as e:
-                logger.error(f"Failed to load preview for {file_path}: {e}")
+        if file_path in self.split_previews:
+            self.show_split_preview(file_path)
+        elif file_path and os.path.exists(file_path):
+            # Decoded once off the UI thread, at preview size
+            self.preview_widget.clear("正在加载预览...")
+            worker = Worker(load_split_preview_image, file_path)
+            worker.signals.result.connect(self.on_split_preview_loaded)
+            worker.signals.error.connect(lambda error, path=file_path: self.on_split_preview_failed(path, error))
+            self.preview_pool.start(worker)
+
+    def on_split_preview_loaded(self, result):
+        file_path, qimage, source_size = result
+        self.split_previews[file_path] = (QPixmap.fromImage(qimage), source_size)
+        while len(self.split_previews) > SPLIT_PREVIEW_CACHE:
+            self.split_previews.popitem(last=False)
+        current = self.split_list.currentItem()
+        if current and current.data(Qt.ItemDataRole.UserRole) == file_path:
+            self.show_split_preview(file_path)
+
+    def on_split_preview_failed(self, file_path, error):
+        logger.error(f"Failed to load preview for {file_path}: {error[1]}")
+        current = self.split_list.currentItem()
+        if current and current.data(Qt.ItemDataRole.UserRole) == file_path:
+            self.preview_widget.clear("预览失败")
+
+    def show_split_preview(self, file_path):
+        self.split_previews.move_to_end(file_path)
+        self.preview_widget.set_image(self.split_previews[file_path][0])
+        self.update_split_grid()
+
+    def update_split_grid(self):
+        """
+        Redraws the grid of the split over the cached preview of the
+        current file, as the grid settings change.
+        """
+        current = self.split_list.currentItem()
+        cached = self.split_previews.get(current.data(Qt.ItemDataRole.UserRole)) if current else None
+        if cached is None or self.preview_widget.label.pixmap is None:
+            return
+        pixmap, source_size = cached
+        if self.current_pyramid_layout() is not None or self.is_page_slicing():
+            # Pyramid tiles and page cuts depend on the full-size image
+            self.preview_widget.set_grid(None)
+            return
+        self.preview_widget.set_grid(grid_overlay(source_size, (pixmap.width(), pixmap.height()),
+                                                  self.spin_rows.value(), self.spin_cols.value()))
 
     def import_stitch_files(self):
         files, _ = QFileDialog.getOpenFileNames(
@@ -457,18 +817,17 @@ class MainWindow(QMainWindow):
             self.add_stitch_files([folder])
 
     def add_stitch_files(self, files):
-        added = False
-        for f in files:
-            if os.path.isfile(f) and f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                self.stitch_list.add_image(f)
-                added = True
-            elif os.path.isdir(f):
-                 for root, _, filenames in os.walk(f):
-                    for name in filenames:
-                        if name.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.gif')):
-                            self.stitch_list.add_image(os.path.join(root, name))
-                            added = True
-        if added:
+        worker = Worker(scan_imports, list(files), self.stitch_dedup)
+        worker.signals.result.connect(self.on_stitch_files_scanned)
+        self.import_pool.start(worker)
+
+    def on_stitch_files_scanned(self, result):
+        unique, duplicates = result
+        for f in unique:
+            self.stitch_list.add_image(f)
+        if duplicates:
+            logger.info(f"Skipped {len(duplicates)} duplicate files in stitch list")
+        if unique:
             self.update_stitch_preview()
 
     def update_stitch_preview(self):
@@ -495,13 +854,21 @@ class MainWindow(QMainWindow):
         
         # Determine quality/size
         quality_idx = self.combo_preview_quality.currentIndex()
+        self.pending_detail = None
+        if quality_idx == PREVIEW_ADAPTIVE:
+            self.preview_worker = AdaptivePreviewWorker(images, mode, self.chk_stitch_overlap.isChecked(),
+                                                        self.stitch_preview.viewport_pixels())
+            self.preview_worker.result_ready.connect(self.on_adaptive_preview_ready)
+            self.preview_worker.start()
+            return
+
         max_width = 300
         if quality_idx == 1: max_width = 600
         elif quality_idx == 2: max_width = 1000
         
         self.stitch_preview.image_label.setText("正在生成预览...")
         
-        self.preview_worker = StitchPreviewWorker(images, mode, max_width)
+        self.preview_worker = StitchPreviewWorker(images, mode, max_width, self.chk_stitch_overlap.isChecked())
         self.preview_worker.result_ready.connect(self.on_preview_ready)
         self.preview_worker.start()
         
@@ -513,6 +880,45 @@ class MainWindow(QMainWindow):
         else:
             self.stitch_preview.image_label.setText("预览失败")
 
+    def on_adaptive_preview_ready(self, qimage, size, refined):
+        if self.sender() is not self.preview_worker:
+            return
+        if qimage:
+            self.stitch_preview.set_image(QPixmap.fromImage(qimage), size, keep_view=refined)
+        else:
+            self.stitch_preview.image_label.setText("预览失败")
+
+    def on_stitch_view_changed(self, box, scale):
+        """
+        Renders the part in view again once zooming has made it sharper
+        than the adaptive preview in place.
+        """
+        renderer = getattr(self.preview_worker, 'renderer', None)
+        scale = min(1.0, scale)
+        if renderer is None or self.stitch_preview.covers(box, scale):
+            return
+        # A margin around the view, so small scrolls stay covered
+        margin_x, margin_y = (box[2] - box[0]) // 4, (box[3] - box[1]) // 4
+        box = (max(0, box[0] - margin_x), max(0, box[1] - margin_y),
+               min(renderer.width, box[2] + margin_x), min(renderer.height, box[3] + margin_y))
+        self.pending_detail = (renderer, box, scale)
+        self.start_preview_detail()
+
+    def start_preview_detail(self):
+        # One rendering at a time; only the latest view is kept waiting
+        if self.pending_detail is None or (self.detail_worker and self.detail_worker.isRunning()):
+            return
+        renderer, box, scale = self.pending_detail
+        self.pending_detail = None
+        self.detail_worker = PreviewDetailWorker(renderer, box, scale)
+        self.detail_worker.result_ready.connect(self.on_preview_detail_ready)
+        self.detail_worker.finished.connect(self.start_preview_detail)
+        self.detail_worker.start()
+
+    def on_preview_detail_ready(self, qimage, box):
+        if qimage and self.sender().renderer is getattr(self.preview_worker, 'renderer', None):
+            self.stitch_preview.set_detail(QPixmap.fromImage(qimage), box)
+
     def start_processing(self):
         # Validation: Check output directory
         if not self.output_dir:
@@ -530,17 +936,27 @@ class MainWindow(QMainWindow):
 
         current_idx = self.tabs.currentIndex()
         
-        out_fmt = self.format_combo.currentText()
-        if out_fmt == "保持原格式":
-            out_fmt = None
-        else:
-            out_fmt = out_fmt.lower()
+        out_fmt = self.current_output_format()
 
         if current_idx == 0: # Split
             self.process_split_tasks(out_fmt)
         else: # Stitch
             self.process_stitch_task(out_fmt)
 
+    def current_output_format(self):
+        if self.current_tiled():
+            return "tif"
+        out_fmt = self.format_combo.currentText()
+        return None if out_fmt == "保持原格式" else out_fmt.lower()
+
+    def current_tiled(self):
+        """
+        Compression of tiled pyramidal TIFF output, or None.
+        """
+        if self.format_combo.currentIndex() != 4:
+            return None
+        return [COMPRESSION_DEFLATE, COMPRESSION_JPEG, COMPRESSION_NONE][self.tiff_compression_combo.currentIndex()]
+
     def process_split_tasks(self, out_fmt):
         checked_items = self.split_list.get_checked_items()
         
@@ -555,11 +971,32 @@ class MainWindow(QMainWindow):
             QMessageBox.information(self, "提示", "没有待处理的任务")
             return
 
+        output_mode = self.split_output_combo.currentIndex()
+        archive = {1: 'zip', 2: 'tar'}.get(output_mode)
+        batch_kind = {3: 'zip', 4: 'tar'}.get(output_mode)
+        if batch_kind:
+            first = items_to_process[0].data(Qt.ItemDataRole.UserRole)
+            archive_root = self.output_dir if self.output_dir else os.path.dirname(first)
+            archive_path = os.path.join(archive_root, datetime.now().strftime(f"tiles_%Y%m%d_%H%M%S.{batch_kind}"))
+            try:
+                self.batch_archive = ArchiveWriter(archive_path, root=archive_root)
+            except OSError as e:
+                logger.error(f"Cannot create archive {archive_path}: {e}")
+                QMessageBox.critical(self, "错误", f"无法创建归档: {e}")
+                return
+
         self.active_tasks_count = len(items_to_process)
         self.last_output_dir = None # Reset
+        self.start_batch_progress(len(items_to_process))
+        batch = self.begin_batch()
         
         rows = self.spin_rows.value()
         cols = self.spin_cols.value()
+        pyramid_layout = self.current_pyramid_layout()
+        tile_size = self.spin_tile_size.value()
+        page_height = self.spin_page_height.value() if self.is_page_slicing() else None
+        filter_action = {1: ACTION_SKIP, 2: ACTION_REFERENCE}.get(self.tile_filter_combo.currentIndex())
+        self.tile_filter = TileFilter(filter_action) if filter_action and not pyramid_layout else None
 
         for item in items_to_process:
             filepath = item.data(Qt.ItemDataRole.UserRole)
@@ -567,69 +1004,296 @@ class MainWindow(QMainWindow):
             # Update status (visual indication)
             item.setText(f"{os.path.basename(filepath)} (处理中...)")
             item.setForeground(Qt.GlobalColor.blue)
+            task_row = self.task_table.add_task(os.path.basename(filepath), "分割")
             
-            # Determine output directory
-            base_out = self.output_dir if self.output_dir else os.path.dirname(filepath)
-            
-            # Handle independent subfolder
-            if self.chk_create_subfolder.isChecked():
-                folder_name = os.path.splitext(os.path.basename(filepath))[0]
-                final_out_dir = os.path.join(base_out, folder_name)
-                if not os.path.exists(final_out_dir):
-                    try:
-                        os.makedirs(final_out_dir)
-                    except OSError as e:
-                        logger.error(f"Failed to create directory {final_out_dir}: {e}")
-                        self.on_split_error(e, item)
-                        continue
-            else:
-                final_out_dir = base_out
+            try:
+                # Archive entries need no directories; a per-input archive
+                # already groups its tiles, so it goes to the output root
+                create_dirs = output_mode == 0
+                final_out_dir = self.split_output_dir(filepath, create_dirs, subfolder=not archive)
+                # Byte-identical copies collapsed on import get the same tiles
+                duplicate_targets = [(dup, self.split_output_dir(dup, create_dirs, subfolder=not archive)) for dup in self.split_dedup.duplicates_of(filepath)]
+            except OSError as e:
+                self.on_split_error(e, item, task_row)
+                continue
             
             # Track last output dir for auto-open
             self.last_output_dir = final_out_dir
             
-            worker = Worker(
-                ImageProcessor.split_image, 
-                filepath, 
-                final_out_dir, 
-                output_format=out_fmt,
-                rows=rows,
-                cols=cols
-            )
+            # Costs read the file header, so the scheduler evaluates them
+            # off the UI thread
+            if pyramid_layout:
+                worker = Worker(
+                    split_with_duplicates,
+                    filepath,
+                    final_out_dir,
+                    duplicate_targets=duplicate_targets,
+                    split_fn=generate_pyramid,
+                    tile_size=tile_size,
+                    output_format=out_fmt,
+                    layout=pyramid_layout,
+                    writer=self.batch_archive,
+                    archive=archive
+                )
+                cost = lambda p=filepath: estimate_pyramid_memory(p)
+            else:
+                worker = Worker(
+                    split_with_duplicates, 
+                    filepath, 
+                    final_out_dir, 
+                    duplicate_targets=duplicate_targets,
+                    output_format=out_fmt,
+                    rows=rows,
+                    cols=cols,
+                    journal=self.journal_for(final_out_dir),
+                    writer=self.batch_archive,
+                    archive=archive,
+                    page_height=page_height,
+                    tile_filter=self.tile_filter,
+                    tiled=self.current_tiled(),
+                    **self.size_limit()
+                )
+                cost = lambda p=filepath: ImageProcessor.estimate_split_memory(p)
             # Pass item to callback
-            worker.signals.result.connect(lambda res, i=item: self.on_split_finished(res, i))
-            worker.signals.error.connect(lambda err, i=item: self.on_split_error(err, i))
+            worker.signals.result.connect(lambda res, i=item, r=task_row: self.on_split_finished(res, i, r))
+            worker.signals.error.connect(lambda err, i=item, r=task_row: self.on_split_error(err, i, r))
+            worker.signals.progress.connect(lambda value, r=task_row: self.on_task_progress(r, value))
+            worker.signals.cancelled.connect(lambda i=item, r=task_row: self.on_split_cancelled(i, r))
             
-            self.threadpool.start(worker)
+            batch.submit(worker, cost)
+
+    def split_output_dir(self, filepath, create=True, subfolder=True):
+        """
+        Returns (and creates if needed) the output directory for a split input.
+        """
+        base_out = self.output_dir if self.output_dir else os.path.dirname(filepath)
+        
+        # Handle independent subfolder
+        if not (subfolder and self.chk_create_subfolder.isChecked()):
+            return base_out
+        folder_name = os.path.splitext(os.path.basename(filepath))[0]
+        final_out_dir = os.path.join(base_out, folder_name)
+        if create and not os.path.exists(final_out_dir):
+            try:
+                os.makedirs(final_out_dir)
+            except OSError as e:
+                logger.error(f"Failed to create directory {final_out_dir}: {e}")
+                raise
+        return final_out_dir
 
-    def on_split_finished(self, result, item):
+    def on_split_finished(self, result, item, task_row=None):
         try:
             filepath = item.data(Qt.ItemDataRole.UserRole)
             logger.info(f"Split finished for {filepath}")
             item.setText(f"{os.path.basename(filepath)} (完成)")
             item.setForeground(Qt.GlobalColor.green)
+            self.finish_task(task_row, "完成", "green")
             self.check_all_finished()
         except Exception as e:
             logger.error(f"Error in on_split_finished: {e}")
 
-    def on_split_error(self, err, item):
+    def on_split_error(self, err, item, task_row=None):
         try:
             filepath = item.data(Qt.ItemDataRole.UserRole)
             item.setText(f"{os.path.basename(filepath)} (失败)")
             item.setForeground(Qt.GlobalColor.red)
             logger.error(f"Split failed: {err}")
+            self.finish_task(task_row, "失败", "red")
             self.check_all_finished()
         except Exception as e:
              logger.error(f"Error in on_split_error: {e}")
 
+    def on_split_cancelled(self, item, task_row=None):
+        try:
+            filepath = item.data(Qt.ItemDataRole.UserRole)
+            item.setText(f"{os.path.basename(filepath)} (已取消)")
+            item.setForeground(Qt.GlobalColor.gray)
+            self.finish_task(task_row, "已取消", "gray", progress=None)
+            self.check_all_finished()
+        except Exception as e:
+            logger.error(f"Error in on_split_cancelled: {e}")
+
+    def toggle_watch(self):
+        if self.watcher is not None:
+            self.stop_watch()
+            return
+        if not self.output_dir:
+            QMessageBox.warning(self, "提示", "请先选择输出目录！")
+            self.select_output_dir()
+            if not self.output_dir:
+                return
+        folder = QFileDialog.getExistingDirectory(self, "选择监控文件夹")
+        if not folder:
+            return
+        try:
+            self.watcher = HotFolderWatcher(
+                folder,
+                self.output_dir,
+                rows=self.spin_rows.value(),
+                cols=self.spin_cols.value(),
+                output_format=self.current_output_format(),
+                subfolder=self.chk_create_subfolder.isChecked(),
+                max_pending=2 * self.threadpool.maxThreadCount(),
+                poll_interval=0.5,
+                on_result=lambda path, outputs: self.watch_signals.done.emit(path, outputs),
+                on_error=lambda path, e: self.watch_signals.failed.emit(path, str(e)),
+                run_job=lambda path, job: self.watch_signals.ready.emit(path, job)
+            )
+            self.watcher.start()
+        except (OSError, ValueError) as e:
+            self.watcher = None
+            QMessageBox.warning(self, "提示", f"无法监控该文件夹: {e}")
+            return
+        self.btn_watch.setText("停止监控")
+        self.lbl_watch_status.setText(f"监控中: {folder}")
+        self.watch_timer.start()
+
+    def stop_watch(self):
+        if self.watcher is None:
+            return
+        # Don't block the UI on running splits; they finish in the background
+        self.watcher.stop(wait=False)
+        self.watcher = None
+        self.watch_timer.stop()
+        self.btn_watch.setText("监控文件夹...")
+        self.lbl_watch_status.setText("")
+
+    def refresh_watch_status(self):
+        if self.watcher is None:
+            return
+        s = self.watcher.stats.snapshot()
+        latency = "" if s['latency_p50'] is None else f", 延迟 p50 {s['latency_p50']:.1f}秒"
+        self.lbl_watch_status.setText(
+            f"监控中: 已处理 {s['processed']}, 跳过 {s['skipped']}, 失败 {s['failed']}, "
+            f"等待 {self.watcher.pending_count()}, {s['per_minute']:.1f} 张/分钟{latency}"
+        )
+
+    def on_watch_ready(self, path, job):
+        # Watch splits share the batch pool and its memory budget
+        self.scheduler.submit(Worker(job), lambda p=path: ImageProcessor.estimate_split_memory(p))
+
+    def on_watch_done(self, path, outputs):
+        row = self.task_table.add_task(os.path.basename(path), "监控分割")
+        self.task_table.update_status(row, "完成", "green")
+        self.task_table.update_progress(row, 100)
+
+    def on_watch_failed(self, path, message):
+        row = self.task_table.add_task(os.path.basename(path), "监控分割")
+        self.task_table.update_status(row, "失败", "red")
+        logger.error(f"Watch split failed for {path}: {message}")
+
+    def closeEvent(self, event):
+        self.stop_watch()
+        super().closeEvent(event)
+
+    def journal_for(self, output_dir):
+        if not self.chk_incremental.isChecked():
+            return None
+        # The journal file itself is read by the first job that uses it
+        return JobJournal.for_directory(output_dir)
+
+    def begin_batch(self):
+        batch = BatchRun(self.scheduler, self)
+        batch.state_changed.connect(lambda state, b=batch: self.on_batch_state_changed(b, state))
+        self.current_batch = batch
+        self.btn_pause.setText("暂停")
+        self.btn_pause.setEnabled(True)
+        self.btn_cancel.setEnabled(True)
+        return batch
+
+    def toggle_pause(self):
+        batch = self.current_batch
+        if not batch:
+            return
+        if batch.state == BatchRun.RUNNING:
+            batch.pause()
+        elif batch.state == BatchRun.PAUSED:
+            batch.resume()
+
+    def cancel_batch(self):
+        if self.current_batch:
+            self.current_batch.cancel()
+
+    def on_batch_state_changed(self, batch, state):
+        if batch is not self.current_batch:
+            return
+        if state == BatchRun.PAUSED:
+            self.btn_pause.setText("继续")
+            self.lbl_eta.setText("已暂停")
+        elif state == BatchRun.RUNNING:
+            self.btn_pause.setText("暂停")
+            if self.batch_progress:
+                self.refresh_batch_progress()
+        else:
+            self.btn_pause.setText("暂停")
+            self.btn_pause.setEnabled(False)
+            self.btn_cancel.setEnabled(False)
+            if state == BatchRun.CANCELLED:
+                self.lbl_eta.setText("已取消")
+
+    def start_batch_progress(self, total_tasks):
+        self.task_table.setRowCount(0)
+        self.batch_progress = BatchProgress(total_tasks)
+        self.batch_progress_bar.setValue(0)
+        self.lbl_eta.setText(format_eta(None))
+
+    def on_task_progress(self, task_row, value):
+        self.task_table.update_progress(task_row, value)
+        self.task_table.update_status(task_row, "处理中", "blue")
+        if self.batch_progress:
+            self.batch_progress.update(task_row, value / 100.0)
+            self.refresh_batch_progress()
+
+    def finish_task(self, task_row, status, color, progress=100):
+        if task_row is None:
+            return
+        self.task_table.update_status(task_row, status, color)
+        if progress is not None:
+            self.task_table.update_progress(task_row, progress)
+        if self.batch_progress:
+            self.batch_progress.finish(task_row)
+            self.refresh_batch_progress()
+
+    def refresh_batch_progress(self):
+        self.batch_progress_bar.setValue(int(self.batch_progress.fraction() * 100))
+        if self.current_batch and self.current_batch.state != BatchRun.RUNNING:
+            return
+        self.lbl_eta.setText(format_eta(self.batch_progress.eta_seconds()))
+
     def check_all_finished(self):
         self.active_tasks_count -= 1
         if self.active_tasks_count <= 0:
             logger.info("All tasks finished.")
+            if tracer.enabled:
+                logger.info(f"Stage timings:\n{tracer.format_summary()}")
+            self.close_batch_archive()
+            self.report_tile_filter()
+            flush_summaries()
             if self.chk_auto_open.isChecked() and self.last_output_dir:
                 self.open_file_browser(self.last_output_dir)
             self.active_tasks_count = 0
 
+    def report_tile_filter(self):
+        if self.tile_filter is None:
+            return
+        tile_filter, self.tile_filter = self.tile_filter, None
+        counts = tile_filter.counts
+        logger.info(f"Tile filter: {tile_filter.summary()}")
+        if counts['blank'] or counts['duplicate']:
+            self.lbl_eta.setText(f"已跳过 {counts['blank']} 个空白块、{counts['duplicate']} 个重复块")
+
+    def close_batch_archive(self):
+        if self.batch_archive is None:
+            return
+        archive, self.batch_archive = self.batch_archive, None
+        try:
+            archive.close(discard=archive.entries == 0)
+            if archive.entries:
+                logger.info(f"Wrote {archive.entries} tiles to {archive.archive_path}")
+        except OSError as e:
+            logger.error(f"Failed to finish archive {archive.archive_path}: {e}")
+            QMessageBox.critical(self, "错误", f"归档写入失败: {e}")
+
     def open_file_browser(self, path):
         try:
             logger.info(f"Opening folder: {path}")
@@ -647,6 +1311,10 @@ class MainWindow(QMainWindow):
             return
 
         images = [self.stitch_list.item(i).data(Qt.ItemDataRole.UserRole) for i in range(count)]
+        mode = self.current_stitch_mode()
+        if self.stitch_group_combo.currentIndex() > 0:
+            self.process_stitch_groups(images, mode, out_fmt)
+            return
         
         # Determine output filename
         first_img = images[0]
@@ -654,32 +1322,141 @@ class MainWindow(QMainWindow):
         filename = f"stitched_{os.path.splitext(os.path.basename(first_img))[0]}"
         output_path = os.path.join(base_dir, filename) # Extension will be added by processor if missing
 
-        mode_map = {
-            "等宽缩放": "resize",
-            "中心裁剪": "crop",
-            "填充背景": "fill"
-        }
-        mode = mode_map.get(self.stitch_mode_combo.currentText(), "resize")
-
         self.btn_process.setEnabled(False)
         self.btn_process.setText("拼接中...")
+        self.start_batch_progress(1)
+        batch = self.begin_batch()
+        task_row = self.task_table.add_task(os.path.basename(output_path), "拼接")
 
         worker = Worker(
             ImageProcessor.stitch_images,
             images,
             output_path,
             mode=mode,
-            output_format=out_fmt
+            output_format=out_fmt,
+            journal=self.journal_for(base_dir),
+            overlap=self.chk_stitch_overlap.isChecked(),
+            tiled=self.current_tiled(),
+            **self.stitch_segmenting(),
+            **self.size_limit()
         )
-        worker.signals.result.connect(self.on_stitch_finished)
-        worker.signals.error.connect(self.on_stitch_error)
+        worker.signals.progress.connect(lambda value, r=task_row: self.on_stitch_progress(r, value))
+        worker.signals.result.connect(lambda res, r=task_row: [self.finish_task(r, "完成", "green"), self.on_stitch_finished(res)])
+        worker.signals.error.connect(lambda err, r=task_row: [self.finish_task(r, "失败", "red"), self.on_stitch_error(err)])
+        worker.signals.cancelled.connect(lambda r=task_row: self.finish_task(r, "已取消", "gray", progress=None))
         worker.signals.finished.connect(lambda: [self.btn_process.setEnabled(True), self.btn_process.setText("开始处理")])
         
-        self.threadpool.start(worker)
+        # Reads every header, so the scheduler estimates it off the UI thread
+        batch.submit(worker, lambda: ImageProcessor.estimate_stitch_memory(images))
+
+    def size_limit(self):
+        """
+        max_bytes/downscale arguments for split and stitch jobs.
+        """
+        kb = self.spin_max_size.value()
+        if not kb:
+            return {}
+        return {'max_bytes': kb * 1024, 'downscale': self.chk_allow_downscale.isChecked()}
+
+    def stitch_segmenting(self):
+        """
+        max_height/multipage arguments for stitch jobs.
+        """
+        return {'max_height': self.spin_segment_height.value() or None, 'multipage': self.chk_stitch_multipage.isChecked()}
+
+    def current_stitch_mode(self):
+        mode_map = {
+            "等宽缩放": "resize",
+            "中心裁剪": "crop",
+            "填充背景": "fill"
+        }
+        return mode_map.get(self.stitch_mode_combo.currentText(), "resize")
+
+    def process_stitch_groups(self, images, mode, out_fmt):
+        """
+        Batch stitch: every group becomes its own stitch job. Jobs share the
+        batch run, so they run in parallel under the memory budget and can
+        be paused or cancelled together.
+        """
+        by = [None, GROUP_BY_FOLDER, GROUP_BY_PATTERN, GROUP_EVERY_N][self.stitch_group_combo.currentIndex()]
+        try:
+            groups = plan_groups(images, by, pattern=self.edit_group_pattern.text(), n=self.spin_group_size.value())
+        except re.error as e:
+            QMessageBox.warning(self, "提示", f"分组模式无效: {e}")
+            return
+        if not groups:
+            QMessageBox.warning(self, "提示", "没有文件符合分组条件")
+            return
+
+        self.active_tasks_count = len(groups)
+        self.last_output_dir = None
+        self.group_results = {'done': 0, 'failed': 0, 'cancelled': 0}
+        self.btn_process.setEnabled(False)
+        self.btn_process.setText(f"批量拼接中 (0/{len(groups)})...")
+        self.start_batch_progress(len(groups))
+        batch = self.begin_batch()
+
+        for (name, paths), file_name in zip(groups, unique_file_names(name for name, _ in groups)):
+            base_dir = self.output_dir if self.output_dir else os.path.dirname(paths[0])
+            output_path = os.path.join(base_dir, f"stitched_{file_name}")
+            task_row = self.task_table.add_task(f"{name} ({len(paths)}张)", "拼接组")
+            worker = Worker(
+                ImageProcessor.stitch_images,
+                paths,
+                output_path,
+                mode=mode,
+                output_format=out_fmt,
+                journal=self.journal_for(base_dir),
+                overlap=self.chk_stitch_overlap.isChecked(),
+                tiled=self.current_tiled(),
+                **self.stitch_segmenting(),
+                **self.size_limit()
+            )
+            worker.signals.progress.connect(lambda value, r=task_row: self.on_task_progress(r, value))
+            worker.signals.result.connect(lambda res, r=task_row: self.on_stitch_group_done(r, 'done', res))
+            worker.signals.error.connect(lambda err, r=task_row, n=name: self.on_stitch_group_done(r, 'failed', err, n))
+            worker.signals.cancelled.connect(lambda r=task_row: self.on_stitch_group_done(r, 'cancelled'))
+            batch.submit(worker, lambda p=paths: ImageProcessor.estimate_stitch_memory(p))
+
+    def on_stitch_group_done(self, task_row, outcome, result=None, name=None):
+        if outcome == 'done':
+            self.finish_task(task_row, "完成", "green")
+            self.last_output_dir = os.path.dirname(result if isinstance(result, str) else result[0])
+        elif outcome == 'failed':
+            self.finish_task(task_row, "失败", "red")
+            logger.error(f"Stitch group {name} failed: {result[1]}")
+        else:
+            self.finish_task(task_row, "已取消", "gray", progress=None)
+        self.group_results[outcome] += 1
+        finished = sum(self.group_results.values())
+        total = finished + self.active_tasks_count - 1
+        self.btn_process.setText(f"批量拼接中 ({finished}/{total})...")
+        self.check_all_finished()
+        if self.active_tasks_count == 0:
+            self.btn_process.setEnabled(True)
+            self.btn_process.setText("开始处理")
+            r = self.group_results
+            logger.info(f"Batch stitch finished: {r['done']} done, {r['failed']} failed, {r['cancelled']} cancelled")
+            self.lbl_eta.setText(f"批量拼接: 成功 {r['done']} 组, 失败 {r['failed']} 组, 取消 {r['cancelled']} 组")
+
+    def on_stitch_progress(self, task_row, value):
+        self.on_task_progress(task_row, value)
+        self.btn_process.setText(f"拼接中 {value}%")
 
     def on_stitch_finished(self, output_path):
-        QMessageBox.information(self, "成功", f"拼接完成!\n保存至: {output_path}")
+        if isinstance(output_path, list):
+            names = "\n".join(os.path.basename(p) for p in output_path)
+            QMessageBox.information(self, "成功", f"拼接完成! 已分为 {len(output_path)} 段\n保存至: {os.path.dirname(output_path[0])}\n{names}")
+        else:
+            QMessageBox.information(self, "成功", f"拼接完成!\n保存至: {output_path}")
+        self.clear_stitch_list()
+
+    def clear_stitch_list(self):
+        # The index must forget the files too, or importing them again is
+        # refused as duplicates
         self.stitch_list.clear()
+        self.stitch_dedup.clear()
+        self.update_stitch_preview()
 
     def on_stitch_error(self, err):
         QMessageBox.critical(self, "错误", f"拼接失败: {str(err[1])}")
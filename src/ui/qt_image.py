@@ -0,0 +1,56 @@
+from PyQt6.QtGui import QImage
+
+# PIL modes that map onto a QImage format without any conversion
+_NATIVE_FORMATS = {
+    'L': (QImage.Format.Format_Grayscale8, 1),
+    'RGB': (QImage.Format.Format_RGB888, 3),
+    'RGBX': (QImage.Format.Format_RGBX8888, 4),
+    'RGBA': (QImage.Format.Format_RGBA8888, 4),
+}
+
+
+def _native_mode(img):
+    """
+    Picks the cheapest native mode that keeps the image's information;
+    alpha is only kept when the image actually carries transparency.
+    """
+    mode = img.mode
+    if mode in _NATIVE_FORMATS:
+        return mode
+    if mode == 'P':
+        return 'RGBA' if 'transparency' in img.info else 'RGB'
+    if mode in ('LA', 'PA', 'La', 'RGBa'):
+        return 'RGBA'
+    if mode in ('1', 'I', 'I;16', 'I;16B', 'I;16L', 'F'):
+        return 'L'
+    return 'RGB'
+
+
+def pil_to_qimage(img):
+    """
+    Converts a PIL image to a QImage with a single copy of the pixels.
+
+    The pixels are exported once into a bytes buffer and the QImage is built
+    directly over it in a matching native format. The buffer is owned by the
+    returned QImage wrapper, so it may be created in a worker thread and
+    handed to the UI thread as long as the wrapper itself travels (use
+    pyqtSignal(object), not pyqtSignal(QImage), which would keep only a
+    shallow C++ copy). QPixmap.fromImage or QImage.copy() detach from it.
+    """
+    mode = _native_mode(img)
+    if mode != img.mode:
+        if img.mode == 'I' or img.mode.startswith('I;16'):
+            # Wide grayscale: map the value range onto 8 bits
+            img = img.convert('I')
+            lo, hi = img.getextrema()
+            scale = 255.0 / (hi - lo) if hi > lo else 1.0
+            img = img.point(lambda v: v * scale - lo * scale).convert('L')
+        else:
+            img = img.convert(mode)
+    fmt, bytes_per_pixel = _NATIVE_FORMATS[mode]
+    width, height = img.size
+    data = img.tobytes('raw', mode)
+    qimage = QImage(data, width, height, width * bytes_per_pixel, fmt)
+    # QImage does not own foreign memory; tie the buffer to the wrapper
+    qimage._buffer = data
+    return qimage
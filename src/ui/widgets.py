@@ -1,12 +1,31 @@
+import math
 from PyQt6.QtWidgets import (
     QLabel, QFrame, QVBoxLayout, QTableWidget, QTableWidgetItem, 
     QHeaderView, QProgressBar, QWidget, QHBoxLayout, QPushButton,
-    QListWidget, QListWidgetItem, QScrollArea, QGraphicsOpacityEffect
+    QListWidget, QListWidgetItem, QScrollArea, QGraphicsOpacityEffect,
+    QStyledItemDelegate, QStyleOptionProgressBar, QStyle, QApplication
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QMimeData, QThread, QSize, QUrl, QPropertyAnimation, QEasingCurve
-from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QColor, QPixmap, QIcon, QImage, QFontMetrics, QPainter
-from src.utils.logger import logger
-from PIL import Image, ImageQt
+from PyQt6.QtCore import Qt, pyqtSignal, QMimeData, QThread, QSize, QUrl, QPropertyAnimation, QEasingCurve, QTimer, QRectF, QRect
+from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QColor, QPixmap, QIcon, QImage, QFontMetrics, QPainter, QPen
+from src.utils.logger import get_logger
+from PIL import Image
+from src.ui.qt_image import pil_to_qimage
+from src.core.tiled_tiff import open_overview
+
+logger = get_logger("ui.widgets")
+
+# Quiet time after zooming or scrolling before the view is reported (ms)
+VIEW_SETTLE_MS = 150
+# Detail renderings kept over a preview
+MAX_DETAILS = 4
+# Largest preview canvas Qt accepts, in widget pixels
+MAX_CANVAS_SIZE = 16_000_000
+# Split grid lines over the preview
+GRID_COLOR = "#FF4D4F"
+# Grid cells smaller than this (widget pixels) are not numbered
+GRID_LABEL_MIN = 24
+# Size of the tile thumbnails under the split preview
+TILE_THUMB_SIZE = 72
 
 class ElidedLabel(QLabel):
     def __init__(self, text="", parent=None):
@@ -20,7 +39,7 @@ class ElidedLabel(QLabel):
         painter.drawText(self.rect(), self.alignment(), elided)
 
 class ThumbnailLoader(QThread):
-    thumbnail_ready = pyqtSignal(str, QImage) # file_path, qimage
+    thumbnail_ready = pyqtSignal(str, object) # file_path, qimage (see pil_to_qimage)
 
     def __init__(self):
         super().__init__()
@@ -38,8 +57,9 @@ class ThumbnailLoader(QThread):
         while self.running and self.queue:
             file_path = self.queue.pop(0)
             try:
-                # Create thumbnail using Pillow for high quality
-                img = Image.open(file_path)
+                # Create thumbnail using Pillow for high quality; tiled
+                # TIFFs are read from a small pyramid level
+                img = open_overview(file_path, 480) or Image.open(file_path)
                 
                 # Center crop to square
                 width, height = img.size
@@ -52,15 +72,7 @@ class ThumbnailLoader(QThread):
                 img = img.crop((left, top, right, bottom))
                 img.thumbnail((120, 120), Image.Resampling.LANCZOS)
                 
-                # Convert to QImage (Thread Safe)
-                if img.mode != "RGBA":
-                    img = img.convert("RGBA")
-                
-                # Create QImage from PIL image data
-                # Using ImageQt directly can be buggy with garbage collection, 
-                # safer to create a copy
-                qim = ImageQt.ImageQt(img)
-                qimage = qim.copy()
+                qimage = pil_to_qimage(img)
                 
                 self.cache[file_path] = qimage
                 self.thumbnail_ready.emit(file_path, qimage)
@@ -197,6 +209,26 @@ class DropZone(QLabel):
         if files:
             self.files_dropped.emit(files)
 
+class ProgressDelegate(QStyledItemDelegate):
+    """
+    Paints a progress bar from the item's UserRole value. Unlike one
+    QProgressBar cell widget per row, this stays cheap for thousands of tasks.
+    """
+    def paint(self, painter, option, index):
+        value = index.data(Qt.ItemDataRole.UserRole)
+        if value is None:
+            super().paint(painter, option, index)
+            return
+        bar = QStyleOptionProgressBar()
+        bar.rect = option.rect.adjusted(6, 8, -6, -8)
+        bar.minimum = 0
+        bar.maximum = 100
+        bar.progress = int(value)
+        bar.textVisible = False
+        bar.state = option.state
+        style = option.widget.style() if option.widget else QApplication.style()
+        style.drawControl(QStyle.ControlElement.CE_ProgressBar, bar, painter, option.widget)
+
 class TaskTable(QTableWidget):
     def __init__(self):
         super().__init__()
@@ -214,6 +246,7 @@ class TaskTable(QTableWidget):
         self.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
         # Allow checking the checkbox but no text editing
         self.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.setItemDelegateForColumn(4, ProgressDelegate(self))
 
     def add_task(self, filename, task_type):
         row = self.rowCount()
@@ -229,11 +262,9 @@ class TaskTable(QTableWidget):
         self.setItem(row, 2, QTableWidgetItem(task_type))
         self.setItem(row, 3, QTableWidgetItem("等待中"))
         
-        progress_bar = QProgressBar()
-        progress_bar.setRange(0, 100)
-        progress_bar.setValue(0)
-        progress_bar.setTextVisible(False)
-        self.setCellWidget(row, 4, progress_bar)
+        progress_item = QTableWidgetItem()
+        progress_item.setData(Qt.ItemDataRole.UserRole, 0)
+        self.setItem(row, 4, progress_item)
         
         return row
 
@@ -244,9 +275,13 @@ class TaskTable(QTableWidget):
             item.setForeground(QColor(color))
 
     def update_progress(self, row, value):
-        widget = self.cellWidget(row, 4)
-        if isinstance(widget, QProgressBar):
-            widget.setValue(value)
+        item = self.item(row, 4)
+        if item is not None:
+            item.setData(Qt.ItemDataRole.UserRole, value)
+
+    def get_progress(self, row):
+        item = self.item(row, 4)
+        return item.data(Qt.ItemDataRole.UserRole) if item is not None else None
 
     def get_checked_rows(self):
         rows = []
@@ -266,7 +301,77 @@ class TaskTable(QTableWidget):
         for row in sorted(rows, reverse=True):
             self.removeRow(row)
 
+class PreviewCanvas(QLabel):
+    """
+    Paints only the visible part of a preview, scaled on the fly, with any
+    sharper detail renderings of parts of it drawn on top. Text set with
+    setText replaces the picture until the next set_image.
+    """
+    def __init__(self, text=""):
+        super().__init__(text)
+        self.pixmap = None
+        self.full_size = None
+        self.scale_factor = 1.0
+        # (pixmap, box in full-size pixels), newest last
+        self.details = []
+
+    def set_picture(self, pixmap, full_size):
+        self.pixmap = pixmap if pixmap and not pixmap.isNull() else None
+        self.full_size = full_size
+        if self.pixmap is None:
+            self.details = []
+            self.setMinimumSize(0, 0)
+        super().setText("")
+
+    def setText(self, text):
+        self.pixmap = None
+        self.details = []
+        self.setMinimumSize(0, 0)
+        super().setText(text)
+
+    def set_scale(self, scale_factor):
+        self.scale_factor = scale_factor
+        width, height = self.display_size()
+        self.setMinimumSize(width, height)
+        self.update()
+
+    def display_size(self):
+        return (max(1, int(self.full_size[0] * self.scale_factor)),
+                max(1, int(self.full_size[1] * self.scale_factor)))
+
+    def origin(self):
+        width, height = self.display_size()
+        return max(0, (self.width() - width) // 2), max(0, (self.height() - height) // 2)
+
+    def paintEvent(self, event):
+        if self.pixmap is None:
+            return super().paintEvent(event)
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        ox, oy = self.origin()
+        width, height = self.display_size()
+        exposed = QRectF(event.rect()).intersected(QRectF(ox, oy, width, height))
+        if exposed.isEmpty():
+            return
+        full = (0, 0, self.full_size[0], self.full_size[1])
+        for pixmap, box in [(self.pixmap, full)] + self.details:
+            target = QRectF(ox + box[0] * self.scale_factor, oy + box[1] * self.scale_factor,
+                            (box[2] - box[0]) * self.scale_factor, (box[3] - box[1]) * self.scale_factor)
+            target = target.intersected(exposed)
+            if target.isEmpty():
+                continue
+            kx = pixmap.width() / ((box[2] - box[0]) * self.scale_factor)
+            ky = pixmap.height() / ((box[3] - box[1]) * self.scale_factor)
+            left = target.left() - ox - box[0] * self.scale_factor
+            top = target.top() - oy - box[1] * self.scale_factor
+            source = QRectF(left * kx, top * ky, target.width() * kx, target.height() * ky)
+            painter.drawPixmap(target, pixmap, source)
+
+
 class InteractivePreviewWidget(QWidget):
+    # Visible box in full-size pixels and the device pixels per full-size pixel
+    view_changed = pyqtSignal(object, float)
+
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -299,7 +404,7 @@ class InteractivePreviewWidget(QWidget):
         self.scroll_area.setWidgetResizable(True)
         self.scroll_area.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
-        self.image_label = QLabel("暂无预览")
+        self.image_label = PreviewCanvas("暂无预览")
         self.image_label.setObjectName("PreviewCanvas")
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
@@ -308,28 +413,102 @@ class InteractivePreviewWidget(QWidget):
         self.layout.addLayout(self.toolbar)
         self.layout.addWidget(self.scroll_area)
         
-        self.pixmap = None
         self.scale_factor = 1.0
-        
-    def set_image(self, pixmap):
-        self.pixmap = pixmap
+
+        # Zooming, scrolling and resizing settle before view_changed is sent
+        self.view_timer = QTimer(self)
+        self.view_timer.setSingleShot(True)
+        self.view_timer.setInterval(VIEW_SETTLE_MS)
+        self.view_timer.timeout.connect(self._emit_view)
+        self.scroll_area.horizontalScrollBar().valueChanged.connect(self.view_timer.start)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.view_timer.start)
+
+    @property
+    def pixmap(self):
+        return self.image_label.pixmap
+
+    def set_image(self, pixmap, full_size=None, keep_view=False):
+        """
+        Shows pixmap as a rendering of an image of full_size (its own size
+        by default). keep_view keeps the zoom and the detail renderings
+        when the full size is unchanged, for a sharper rendering of the
+        same picture.
+        """
+        if full_size is None and pixmap is not None:
+            full_size = (pixmap.width(), pixmap.height())
+        same = keep_view and self.image_label.full_size == full_size
+        self.image_label.set_picture(pixmap, full_size)
+        if same:
+            self.image_label.update()
+            return
+        self.image_label.details = []
         self.scale_factor = 1.0
         self.fit_to_window()
-        
+
+    def set_detail(self, pixmap, box):
+        """
+        Draws pixmap over the part box of the full-size image.
+        """
+        if self.pixmap is None:
+            return
+        details = self.image_label.details
+        details.append((pixmap, tuple(box)))
+        del details[:-MAX_DETAILS]
+        self.image_label.update()
+
+    def base_scale(self):
+        """
+        Pixels of the base rendering per full-size pixel.
+        """
+        if self.pixmap is None:
+            return 0.0
+        return self.pixmap.width() / max(1, self.image_label.full_size[0])
+
+    def covers(self, box, scale):
+        """
+        Whether box is already drawn with at least scale pixels per
+        full-size pixel.
+        """
+        if self.base_scale() >= scale:
+            return True
+        for pixmap, (left, top, right, bottom) in self.image_label.details:
+            if (left <= box[0] and top <= box[1] and right >= box[2] and bottom >= box[3]
+                    and pixmap.width() / max(1, right - left) >= scale):
+                return True
+        return False
+
+    def visible_box(self):
+        """
+        The part of the full-size image in view, (left, top, right, bottom).
+        """
+        if self.pixmap is None:
+            return None
+        viewport = self.scroll_area.viewport()
+        ox, oy = self.image_label.origin()
+        full_w, full_h = self.image_label.full_size
+        x = self.scroll_area.horizontalScrollBar().value() - ox
+        y = self.scroll_area.verticalScrollBar().value() - oy
+        box = (x / self.scale_factor, y / self.scale_factor,
+               (x + viewport.width()) / self.scale_factor, (y + viewport.height()) / self.scale_factor)
+        return (max(0, int(box[0])), max(0, int(box[1])),
+                min(full_w, math.ceil(box[2])), min(full_h, math.ceil(box[3])))
+
+    def viewport_pixels(self):
+        """
+        Size of the view in device pixels.
+        """
+        viewport = self.scroll_area.viewport()
+        ratio = self.devicePixelRatioF()
+        return round(viewport.width() * ratio), round(viewport.height() * ratio)
+
     def update_display(self):
         if self.pixmap:
             if self.scale_factor <= 0:
                 self.scale_factor = 0.1
-                
-            scaled_w = int(self.pixmap.width() * self.scale_factor)
-            scaled_h = int(self.pixmap.height() * self.scale_factor)
-            
-            self.image_label.setPixmap(self.pixmap.scaled(
-                scaled_w, scaled_h,
-                Qt.AspectRatioMode.KeepAspectRatio,
-                Qt.TransformationMode.SmoothTransformation
-            ))
-            self.image_label.resize(scaled_w, scaled_h)
+            # Qt caps widget sizes
+            self.scale_factor = min(self.scale_factor, MAX_CANVAS_SIZE / max(self.image_label.full_size))
+            self.image_label.set_scale(self.scale_factor)
+            self.view_timer.start()
             
     def zoom_in(self):
         self.scale_factor *= 1.2
@@ -347,8 +526,7 @@ class InteractivePreviewWidget(QWidget):
         view_w = self.scroll_area.viewport().width()
         view_h = self.scroll_area.viewport().height()
         
-        img_w = self.pixmap.width()
-        img_h = self.pixmap.height()
+        img_w, img_h = self.image_label.full_size
         
         if img_w == 0 or img_h == 0:
             return
@@ -359,20 +537,108 @@ class InteractivePreviewWidget(QWidget):
         self.scale_factor = min(scale_w, scale_h) * 0.95 # Leave some margin
         self.update_display()
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.view_timer.start()
+
+    def _emit_view(self):
+        box = self.visible_box()
+        if box and box[2] > box[0] and box[3] > box[1]:
+            self.view_changed.emit(box, self.scale_factor * self.devicePixelRatioF())
+
+class GridCanvas(QLabel):
+    """
+    Paints a picture fitted into the label, with the boxes of a grid
+    (in picture pixels) outlined and numbered over it.
+    """
+    def __init__(self, text=""):
+        super().__init__(text)
+        self.pixmap = None
+        self.boxes = []
+
+    def set_picture(self, pixmap):
+        self.pixmap = pixmap if pixmap and not pixmap.isNull() else None
+        self.boxes = []
+        super().setText("")
+        self.update()
+
+    def setText(self, text):
+        self.pixmap = None
+        self.boxes = []
+        super().setText(text)
+
+    def paintEvent(self, event):
+        if self.pixmap is None:
+            return super().paintEvent(event)
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+        area = self.contentsRect()
+        scale = min(area.width() / self.pixmap.width(), area.height() / self.pixmap.height())
+        width, height = self.pixmap.width() * scale, self.pixmap.height() * scale
+        ox, oy = area.x() + (area.width() - width) / 2, area.y() + (area.height() - height) / 2
+        painter.drawPixmap(QRectF(ox, oy, width, height), self.pixmap, QRectF(self.pixmap.rect()))
+        if not self.boxes:
+            return
+        painter.setPen(QPen(QColor(GRID_COLOR), 1))
+        for i, (left, top, right, bottom) in enumerate(self.boxes):
+            cell = QRectF(ox + left * scale, oy + top * scale, (right - left) * scale, (bottom - top) * scale)
+            painter.drawRect(cell)
+            if cell.width() >= GRID_LABEL_MIN and cell.height() >= GRID_LABEL_MIN:
+                painter.drawText(cell.adjusted(4, 2, 0, 0), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, str(i + 1))
+
+
 class PreviewWidget(QWidget):
     def __init__(self):
         super().__init__()
         layout = QVBoxLayout()
-        self.label = QLabel("预览区域")
+        self.label = GridCanvas("预览区域")
         self.label.setObjectName("PreviewLabel")
         self.label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.label.setMinimumHeight(200)
         layout.addWidget(self.label)
+
+        # Thumbnails of the tiles a split would produce
+        self.tiles = QListWidget()
+        self.tiles.setViewMode(QListWidget.ViewMode.IconMode)
+        self.tiles.setFlow(QListWidget.Flow.LeftToRight)
+        self.tiles.setWrapping(False)
+        self.tiles.setMovement(QListWidget.Movement.Static)
+        self.tiles.setIconSize(QSize(TILE_THUMB_SIZE, TILE_THUMB_SIZE))
+        self.tiles.setFixedHeight(TILE_THUMB_SIZE + 56)
+        self.tiles.setVisible(False)
+        layout.addWidget(self.tiles)
         self.setLayout(layout)
     
     def set_image(self, pixmap):
-        self.label.setPixmap(pixmap.scaled(
-            self.label.size(), 
-            Qt.AspectRatioMode.KeepAspectRatio, 
-            Qt.TransformationMode.SmoothTransformation
-        ))
+        self.label.set_picture(pixmap)
+        self.set_grid(None)
+
+    def set_grid(self, cells):
+        """
+        Outlines cells = [(box in the original, box in the picture), ...]
+        over the picture and lists a thumbnail of each, cut from the
+        picture. None hides the grid.
+        """
+        pixmap = self.label.pixmap
+        self.tiles.clear()
+        if pixmap is None or not cells:
+            self.label.boxes = []
+            self.tiles.setVisible(False)
+            self.label.update()
+            return
+        self.label.boxes = [box for _, box in cells]
+        for i, ((left, top, right, bottom), (x0, y0, x1, y1)) in enumerate(cells):
+            thumb = pixmap.copy(QRect(x0, y0, x1 - x0, y1 - y0)).scaled(
+                TILE_THUMB_SIZE, TILE_THUMB_SIZE,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+            item = QListWidgetItem(QIcon(thumb), f"{i + 1}\n{right - left}×{bottom - top}")
+            item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+            self.tiles.addItem(item)
+        self.tiles.setVisible(True)
+        self.label.update()
+
+    def clear(self, text="预览区域"):
+        self.label.setText(text)
+        self.set_grid(None)
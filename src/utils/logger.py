@@ -1,22 +1,177 @@
 import logging
+import logging.handlers
 import os
+import sys
+import queue
+import time
+import atexit
+import threading
 from datetime import datetime
 
+LOGGER_NAME = "ImageProcessor"
+
+# Per-subsystem levels, e.g. "INFO,core.processor=DEBUG,ui=WARNING".
+# A bare level applies to the whole application.
+LEVELS_ENV = "IMAGE_PROCESSOR_LOG_LEVELS"
+
+FORMAT = "%(asctime)s [%(levelname)s] %(module)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` records per call site through in every `interval`
+    seconds. Further records from that site are counted instead of logged;
+    the count and the last suppressed message are reported on the first
+    record of the next window, or by flush().
+    Only INFO and DEBUG records are limited: warnings and errors, such as
+    the name of each file that failed, always get through.
+    """
+    def __init__(self, burst=10, interval=5.0, clock=time.monotonic):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._sites = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or getattr(record, 'summary', False):
+            return True
+        key = (record.pathname, record.lineno)
+        now = self.clock()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site['start'] >= self.interval:
+                suppressed = site['suppressed'] if site else 0
+                self._sites[key] = {'start': now, 'count': 1, 'suppressed': 0, 'last': None, 'record': record}
+                if suppressed:
+                    record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed in the last {self.interval:g}s)"
+                    record.args = None
+                return True
+            site['count'] += 1
+            if site['count'] <= self.burst:
+                return True
+            site['suppressed'] += 1
+            site['last'] = record.getMessage()
+            return False
+
+    def flush(self):
+        """
+        Returns summary records for every call site with suppressed
+        messages and resets those counts.
+        """
+        summaries = []
+        with self._lock:
+            for site in self._sites.values():
+                if not site['suppressed']:
+                    continue
+                summary = logging.makeLogRecord(site['record'].__dict__)
+                summary.msg = f"{site['suppressed']} similar messages suppressed, last: {site['last']}"
+                summary.args = None
+                summary.exc_info = None
+                summary.exc_text = None
+                summary.summary = True
+                summaries.append(summary)
+                site['suppressed'] = 0
+        return summaries
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Writes to whatever sys.stderr is at emit time; the listener outlives
+    redirections made after setup.
+    """
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+def parse_levels(spec):
+    """
+    Parses a LEVELS_ENV value into {logger_suffix: level}; the empty
+    suffix stands for the application logger itself.
+    """
+    levels = {}
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, level = part.rpartition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def get_logger(subsystem=None):
+    """
+    Returns the logger of a subsystem, e.g. get_logger("core.processor"),
+    whose level can be set separately through LEVELS_ENV.
+    """
+    return logging.getLogger(f"{LOGGER_NAME}.{subsystem}" if subsystem else LOGGER_NAME)
+
+
+_listener = None
+_queue_handler = None
+
+
+def flush_summaries():
+    """
+    Logs pending suppression summaries, e.g. at the end of a batch.
+    """
+    if _queue_handler is None:
+        return
+    for f in _queue_handler.filters:
+        if isinstance(f, RateLimitFilter):
+            for record in f.flush():
+                _queue_handler.handle(record)
+
+
+def shutdown():
+    global _listener
+    flush_summaries()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logger(log_dir="logs"):
+    """
+    Routes all records through a queue to a background listener that owns
+    the file and console handlers, so logging threads never wait on I/O.
+    """
+    global _listener, _queue_handler
+    app_logger = logging.getLogger(LOGGER_NAME)
+    if _listener is not None:
+        return app_logger
+
     if not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
     log_filename = datetime.now().strftime("app_%Y-%m-%d.log")
     log_path = os.path.join(log_dir, log_filename)
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(module)s: %(message)s",
-        handlers=[
-            logging.FileHandler(log_path, encoding='utf-8'),
-            logging.StreamHandler()
-        ]
-    )
-    return logging.getLogger("ImageProcessor")
+    formatter = logging.Formatter(FORMAT)
+    handlers = [logging.FileHandler(log_path, encoding='utf-8'), ConsoleHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(RateLimitFilter())
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(_queue_handler)
+
+    for name, level in parse_levels(os.environ.get(LEVELS_ENV)).items():
+        get_logger(name).setLevel(level)
+    return app_logger
 
 logger = setup_logger()
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import atexit
+import threading
+from src.utils.logger import get_logger
+
+logger = get_logger("utils.tracing")
+
+
+class _NullSpan:
+    """
+    Span returned while tracing is disabled. A single shared instance keeps
+    the disabled cost to one attribute check and an empty with-block.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'args', 'start')
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class StageStats:
+    """
+    Aggregated timings of one stage. Durations are bucketed into a log2
+    histogram over microseconds so memory stays constant for any batch size.
+    """
+    BUCKETS = 32
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.histogram = [0] * self.BUCKETS
+
+    def add(self, duration_ns):
+        self.count += 1
+        self.total_ns += duration_ns
+        if self.min_ns is None or duration_ns < self.min_ns:
+            self.min_ns = duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        bucket = min(self.BUCKETS - 1, (duration_ns // 1000).bit_length())
+        self.histogram[bucket] += 1
+
+    def percentile_ms(self, pct):
+        """
+        Upper bound of the histogram bucket containing the given percentile.
+        """
+        if not self.count:
+            return 0.0
+        target = pct / 100.0 * self.count
+        seen = 0
+        for bucket, n in enumerate(self.histogram):
+            seen += n
+            if seen >= target:
+                upper_us = (1 << bucket) if bucket else 1
+                return min(upper_us / 1000.0, self.max_ns / 1e6)
+        return self.max_ns / 1e6
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ns / 1e6,
+            'mean_ms': self.total_ns / 1e6 / self.count if self.count else 0.0,
+            'min_ms': (self.min_ns or 0) / 1e6,
+            'max_ms': self.max_ns / 1e6,
+            'p50_ms': self.percentile_ms(50),
+            'p95_ms': self.percentile_ms(95),
+            'histogram_us_log2': list(self.histogram),
+        }
+
+
+class Tracer:
+    """
+    Hot-path stage timer for the processing core.
+
+    Usage:
+        with tracer.stage("encode", file=path):
+            ...
+
+    When disabled, stage() returns a shared no-op span. When enabled, every
+    span updates the per-stage histogram and is kept as a trace event that
+    can be exported in Chrome trace JSON (chrome://tracing, Perfetto).
+    """
+    def __init__(self, enabled=False, max_events=1000000):
+        self.enabled = enabled
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self.stats = {}
+        self.events = []
+        self.dropped_events = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._origin_ns = time.perf_counter_ns()
+            self.stats = {}
+            self.events = []
+            self.dropped_events = 0
+
+    def stage(self, name, **args):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def _record(self, name, start_ns, end_ns, args):
+        tid = threading.get_ident()
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = StageStats()
+            stats.add(end_ns - start_ns)
+            if len(self.events) < self.max_events:
+                self.events.append((name, start_ns, end_ns - start_ns, tid, args))
+            else:
+                self.dropped_events += 1
+
+    def summary(self):
+        with self._lock:
+            return {name: s.to_dict() for name, s in self.stats.items()}
+
+    def format_summary(self):
+        summary = self.summary()
+        if not summary:
+            return "No stages recorded"
+        lines = [f"{'stage':<14} {'count':>8} {'total ms':>10} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}"]
+        for name, s in sorted(summary.items(), key=lambda kv: -kv[1]['total_ms']):
+            lines.append(
+                f"{name:<14} {s['count']:>8} {s['total_ms']:>10.1f} {s['mean_ms']:>9.2f} "
+                f"{s['p95_ms']:>9.2f} {s['max_ms']:>9.2f}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self):
+        """
+        Returns the recorded spans as a Chrome trace event dict.
+        """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            origin = self._origin_ns
+            summary = {name: s.to_dict() for name, s in self.stats.items()}
+        trace_events = []
+        for name, start_ns, dur_ns, tid, args in events:
+            trace_events.append({
+                'name': name,
+                'cat': 'processor',
+                'ph': 'X',
+                'ts': (start_ns - origin) / 1000.0,
+                'dur': dur_ns / 1000.0,
+                'pid': pid,
+                'tid': tid,
+                'args': {k: str(v) for k, v in args.items()},
+            })
+        return {
+            'traceEvents': trace_events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'stages': summary, 'dropped_events': self.dropped_events},
+        }
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+        logger.info(f"Exported trace with {len(self.events)} events to {path}")
+        return path
+
+
+tracer = Tracer()
+
+# IMAGE_PROCESSOR_TRACE=<path> enables tracing and writes the trace on exit
+_trace_path = os.environ.get("IMAGE_PROCESSOR_TRACE")
+if _trace_path:
+    tracer.enable()
+    atexit.register(tracer.export_chrome_trace, _trace_path)
@@ -0,0 +1,81 @@
+import os
+import asyncio
+import threading
+import pytest
+from PIL import Image
+from src.core.async_api import AsyncImageProcessor
+
+@pytest.fixture
+def sample_image(tmp_path):
+    path = os.path.join(tmp_path, "sample.png")
+    img = Image.new('RGB', (400, 300), 'white')
+    for x in range(0, 400, 20):
+        img.paste((x % 256, 80, 160), (x, 0, x + 10, 300))
+    img.save(path)
+    return path
+
+def test_split_and_stitch_report_progress_on_the_loop(sample_image, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    threads = set()
+
+    async def main():
+        async with AsyncImageProcessor(max_workers=2) as images:
+            tiles = await images.split(sample_image, out_dir, rows=2, cols=3,
+                                       progress=lambda done, total: threads.add(threading.get_ident()))
+            stitched = await images.stitch(tiles[:2], os.path.join(tmp_path, "joined.png"))
+            preview = await images.preview(tiles, max_width=50)
+            return tiles, stitched, preview
+
+    tiles, stitched, preview = asyncio.run(main())
+    assert len(tiles) == 6
+    assert threads == {threading.get_ident()}
+    with Image.open(stitched) as img:
+        assert img.size == (133, 300)
+    assert 0 < preview.size[0] <= 50
+
+def test_cancelling_the_task_stops_the_split(tmp_path):
+    source = os.path.join(tmp_path, "big.png")
+    Image.effect_noise((1200, 1200), 60).save(source)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+
+    async def main():
+        async with AsyncImageProcessor(max_workers=1) as images:
+            task = asyncio.ensure_future(images.split(source, out_dir, rows=30, cols=30,
+                                                      progress=lambda done, total: done >= 3 and task.cancel()))
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(main())
+    assert os.listdir(out_dir) == []
+
+def test_tiles_stream_and_stop_early(sample_image):
+    async def main():
+        names = []
+        async with AsyncImageProcessor(max_concurrency=1) as images:
+            async for name, data in images.split_tiles(sample_image, rows=3, cols=3, name="s"):
+                names.append(name)
+                if len(names) == 2:
+                    break
+            everything = [name async for name, data in images.split_tiles(open(sample_image, 'rb').read(), rows=1, cols=2)]
+        return names, everything
+
+    names, everything = asyncio.run(main())
+    assert names == ["s_1.png", "s_2.png"]
+    assert everything == ["tile_1.png", "tile_2.png"]
+
+def test_process_executor(sample_image, tmp_path):
+    async def main():
+        async with AsyncImageProcessor('process', max_workers=1) as images:
+            data = await images.stitch_to_bytes([sample_image, sample_image], output_format="png")
+            tiles = [name async for name, _ in images.split_tiles(sample_image, rows=1, cols=2)]
+        return data, tiles
+
+    data, tiles = asyncio.run(main())
+    assert data.startswith(b"\x89PNG")
+    assert tiles == ["tile_1.png", "tile_2.png"]
+
+def test_unknown_executor():
+    with pytest.raises(ValueError):
+        AsyncImageProcessor('fibers')
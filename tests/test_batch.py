@@ -0,0 +1,92 @@
+import sys
+import threading
+import pytest
+from PyQt6.QtCore import QCoreApplication
+from src.core.batch import BatchRun
+from src.core.worker import Worker
+
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+class FakeScheduler:
+    """Records queue operations instead of running anything."""
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, worker, cost=0):
+        self.pending.append(worker)
+
+    def track(self, worker):
+        pass
+
+    def requeue(self, worker, cost=0):
+        self.pending.append(worker)
+
+    def cancel_pending(self, worker):
+        if worker in self.pending:
+            self.pending.remove(worker)
+            return True
+        return False
+
+def make_worker():
+    return Worker(lambda progress_callback=None: progress_callback(1, 1))
+
+def test_cancel_drops_queued_jobs():
+    scheduler = FakeScheduler()
+    batch = BatchRun(scheduler)
+    workers = [make_worker() for _ in range(3)]
+    cancelled = []
+    for w in workers:
+        w.signals.cancelled.connect(lambda w=w: cancelled.append(w))
+        batch.submit(w)
+
+    batch.cancel()
+    assert scheduler.pending == []
+    assert cancelled == workers
+    assert batch.state == BatchRun.CANCELLED
+
+def test_pause_holds_queued_jobs_until_resume():
+    scheduler = FakeScheduler()
+    batch = BatchRun(scheduler)
+    workers = [make_worker() for _ in range(2)]
+    for w in workers:
+        batch.submit(w)
+
+    batch.pause()
+    assert scheduler.pending == []
+    late = make_worker()
+    batch.submit(late)
+    assert scheduler.pending == []
+
+    batch.resume()
+    assert scheduler.pending == workers + [late]
+
+def test_paused_worker_blocks_at_checkpoint_then_cancels():
+    scheduler = FakeScheduler()
+    batch = BatchRun(scheduler)
+    reached = threading.Event()
+
+    def job(progress_callback=None):
+        reached.set()
+        progress_callback(1, 2)
+        return "unreachable"
+
+    worker = Worker(job)
+    batch.submit(worker)
+    scheduler.pending.remove(worker)  # pretend it was admitted
+    batch.pause()
+
+    results, cancelled = [], []
+    worker.signals.result.connect(results.append)
+    worker.signals.cancelled.connect(lambda: cancelled.append(True))
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    assert reached.wait(5)
+    thread.join(0.2)
+    assert thread.is_alive()  # blocked at the checkpoint
+
+    batch.cancel()
+    thread.join(5)
+    assert not thread.is_alive()
+    app.processEvents()  # deliver signals queued from the worker thread
+    assert results == []
+    assert cancelled == [True]
@@ -0,0 +1,55 @@
+import os
+import shutil
+import pytest
+from PIL import Image
+from src.core.dedup import DuplicateIndex, scan_imports, split_with_duplicates
+
+@pytest.fixture
+def folder(tmp_path):
+    a = os.path.join(tmp_path, "a")
+    b = os.path.join(tmp_path, "b")
+    os.makedirs(a)
+    os.makedirs(b)
+    Image.new('RGB', (40, 40), color='red').save(os.path.join(a, "red.png"))
+    Image.new('RGB', (40, 40), color='blue').save(os.path.join(a, "blue.png"))
+    shutil.copyfile(os.path.join(a, "red.png"), os.path.join(b, "red_copy.png"))
+    return str(tmp_path)
+
+def test_scan_collapses_identical_content(folder):
+    index = DuplicateIndex()
+    unique, duplicates = scan_imports([folder], index)
+    names = sorted(os.path.basename(p) for p in unique)
+    assert len(unique) == 2
+    assert len(duplicates) == 1
+    dup, canonical = duplicates[0]
+    assert {os.path.basename(dup), os.path.basename(canonical)} == {"red.png", "red_copy.png"}
+    assert "blue.png" in names
+
+def test_same_path_imported_twice(folder):
+    index = DuplicateIndex()
+    scan_imports([folder], index)
+    unique, duplicates = scan_imports([os.path.join(folder, "a")], index)
+    assert unique == []
+    assert len(duplicates) == 2
+
+def test_different_files_of_equal_size_are_kept(tmp_path):
+    index = DuplicateIndex()
+    p1 = os.path.join(tmp_path, "x.bin")
+    p2 = os.path.join(tmp_path, "y.bin")
+    with open(p1, 'wb') as f:
+        f.write(b"a" * 1000)
+    with open(p2, 'wb') as f:
+        f.write(b"b" * 1000)
+    assert index.add(p1) is None
+    assert index.add(p2) is None
+
+def test_split_fans_out_to_duplicates(folder, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    source = os.path.join(folder, "a", "red.png")
+    duplicate = os.path.join(folder, "b", "red_copy.png")
+
+    outputs = split_with_duplicates(source, out_dir, duplicate_targets=[(duplicate, out_dir)])
+    names = sorted(os.path.basename(p) for p in outputs)
+    assert names == sorted([f"red_{i}.png" for i in range(1, 5)] + [f"red_copy_{i}.png" for i in range(1, 5)])
+    assert all(os.path.exists(p) for p in outputs)
@@ -0,0 +1,51 @@
+import os
+import re
+import pytest
+from src.core.grouping import (
+    natural_key, safe_name, unique_file_names, group_by_folder, group_by_pattern, group_every, plan_groups, GROUP_EVERY_N
+)
+
+def p(*parts):
+    return os.path.join(os.sep, "data", *parts)
+
+def test_natural_order():
+    names = ["page_10.png", "page_2.png", "page_1.png"]
+    assert sorted(names, key=natural_key) == ["page_1.png", "page_2.png", "page_10.png"]
+
+def test_group_by_folder():
+    paths = [p("ch2", "2.png"), p("ch10", "1.png"), p("ch2", "1.png"), p("other", "ch2", "1.png")]
+    groups = group_by_folder(paths)
+    assert [name for name, _ in groups] == ["ch2", "ch10", "ch2_2"]
+    assert groups[0][1] == [p("ch2", "1.png"), p("ch2", "2.png")]
+
+def test_group_by_pattern():
+    paths = [p("a_2.png"), p("b_1.png"), p("a_10.png"), p("a_1.png"), p("cover.png")]
+    groups = group_by_pattern(paths, r"^(.+?)_\d+$")
+    assert groups == [
+        ("a", [p("a_1.png"), p("a_2.png"), p("a_10.png")]),
+        ("b", [p("b_1.png")]),
+    ]
+    with pytest.raises(re.error):
+        group_by_pattern(paths, "(")
+
+def test_group_by_pattern_optional_group_falls_back_to_match():
+    paths = [p("pa1.png"), p("x2.png"), p("pb2.png")]
+    groups = group_by_pattern(paths, r"(p)?\w\d?")
+    assert groups == [("p", [p("pa1.png"), p("pb2.png")]), ("x2", [p("x2.png")])]
+
+def test_group_every():
+    paths = [p(f"{i}.png") for i in range(7, 0, -1)]
+    groups = group_every(paths, 3)
+    assert [name for name, _ in groups] == ["group_001", "group_002", "group_003"]
+    assert [len(g) for _, g in groups] == [3, 3, 1]
+    assert groups[0][1] == [p("1.png"), p("2.png"), p("3.png")]
+    assert plan_groups(paths, GROUP_EVERY_N, n=10) == [("group_001", sorted(paths, key=natural_key))]
+    with pytest.raises(ValueError):
+        group_every(paths, 0)
+
+def test_safe_name():
+    assert safe_name('Vol 1: "Intro"') == "Vol_1_Intro"
+    assert safe_name("..") == "group"
+
+def test_unique_file_names():
+    assert unique_file_names(["a b", "a_b", "A_B", "c"]) == ["a_b", "a_b_2", "A_B_3", "c"]
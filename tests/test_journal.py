@@ -0,0 +1,77 @@
+import os
+import pytest
+from PIL import Image
+from src.core.processor import ImageProcessor
+from src.core.journal import JobJournal, JOURNAL_NAME
+
+@pytest.fixture
+def source(tmp_path):
+    path = os.path.join(tmp_path, "source.png")
+    Image.new('RGB', (40, 40), color='green').save(path)
+    return path
+
+@pytest.fixture
+def out_dir(tmp_path):
+    path = os.path.join(tmp_path, "out")
+    os.makedirs(path)
+    return path
+
+def split_mtimes(out_dir):
+    return {name: os.stat(os.path.join(out_dir, name)).st_mtime_ns
+            for name in os.listdir(out_dir) if name != JOURNAL_NAME}
+
+def test_unchanged_input_is_skipped(source, out_dir):
+    journal = JobJournal(out_dir)
+    first = ImageProcessor.split_image(source, out_dir, journal=journal)
+    before = split_mtimes(out_dir)
+
+    second = ImageProcessor.split_image(source, out_dir, journal=journal)
+    assert second == first
+    assert split_mtimes(out_dir) == before
+
+def test_changed_parameters_or_missing_output_rerun(source, out_dir):
+    journal = JobJournal(out_dir)
+    ImageProcessor.split_image(source, out_dir, journal=journal)
+    assert journal.lookup(os.path.abspath(source), [source], {'op': 'split', 'rows': 3, 'cols': 2, 'format': 'png', 'quality': 95}) is None
+
+    outputs = ImageProcessor.split_image(source, out_dir, journal=journal)
+    os.remove(outputs[0])
+    params = {'op': 'split', 'rows': 2, 'cols': 2, 'format': 'png', 'quality': 95}
+    assert journal.lookup(os.path.abspath(source), [source], params) is None
+
+def test_modified_input_is_reprocessed(source, out_dir):
+    journal = JobJournal(out_dir)
+    ImageProcessor.split_image(source, out_dir, journal=journal)
+    Image.new('RGB', (60, 60), color='red').save(source)
+    os.utime(source, ns=(1, 1))
+    params = {'op': 'split', 'rows': 2, 'cols': 2, 'format': 'png', 'quality': 95}
+    assert journal.lookup(os.path.abspath(source), [source], params) is None
+
+def test_journal_survives_restart_and_truncated_line(source, out_dir):
+    ImageProcessor.split_image(source, out_dir, journal=JobJournal(out_dir))
+    with open(os.path.join(out_dir, JOURNAL_NAME), 'a', encoding='utf-8') as f:
+        f.write('{"key": "cut short')
+
+    reloaded = JobJournal(out_dir)
+    assert len(reloaded) == 1
+    params = {'op': 'split', 'rows': 2, 'cols': 2, 'format': 'png', 'quality': 95}
+    assert len(reloaded.lookup(os.path.abspath(source), [source], params)) == 4
+
+    # New entries after the damaged line are still readable
+    other = os.path.join(os.path.dirname(source), "other.png")
+    Image.new('RGB', (20, 20)).save(other)
+    ImageProcessor.split_image(other, out_dir, journal=reloaded)
+    assert len(JobJournal(out_dir)) == 2
+
+def test_journal_is_read_on_first_use(source, out_dir, monkeypatch):
+    ImageProcessor.split_image(source, out_dir, journal=JobJournal(out_dir))
+    loads = []
+    real_load = JobJournal._load
+    monkeypatch.setattr(JobJournal, "_load", lambda self: (loads.append(self), real_load(self)))
+
+    journal = JobJournal(out_dir)
+    assert loads == []
+    params = {'op': 'split', 'rows': 2, 'cols': 2, 'format': 'png', 'quality': 95}
+    assert len(journal.lookup(os.path.abspath(source), [source], params)) == 4
+    assert len(journal) == 1
+    assert loads == [journal]
@@ -0,0 +1,59 @@
+import logging
+from src.utils.logger import RateLimitFilter, parse_levels, get_logger, LOGGER_NAME
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_record(msg, lineno=10, level=logging.INFO):
+    return logging.LogRecord("ImageProcessor.test", level, "/src/mod.py", lineno, msg, None, None)
+
+def test_rate_limit_per_call_site():
+    clock = FakeClock()
+    f = RateLimitFilter(burst=3, interval=5.0, clock=clock)
+    passed = [f.filter(make_record(f"file {i}")) for i in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    # Another call site has its own budget
+    assert f.filter(make_record("other", lineno=20))
+
+def test_suppressed_count_reported_in_next_window():
+    clock = FakeClock()
+    f = RateLimitFilter(burst=1, interval=5.0, clock=clock)
+    f.filter(make_record("a"))
+    f.filter(make_record("b"))
+    f.filter(make_record("c"))
+    clock.now = 6.0
+    record = make_record("d")
+    assert f.filter(record)
+    assert "2 similar messages suppressed" in record.getMessage()
+    assert f.flush() == []
+
+def test_flush_returns_summaries():
+    clock = FakeClock()
+    f = RateLimitFilter(burst=1, interval=5.0, clock=clock)
+    for i in range(4):
+        f.filter(make_record(f"file {i}"))
+    summaries = f.flush()
+    assert len(summaries) == 1
+    assert summaries[0].getMessage() == "3 similar messages suppressed, last: file 3"
+    # Summaries pass the filter and are not counted again
+    assert f.filter(summaries[0])
+    assert f.flush() == []
+
+def test_warnings_and_errors_are_never_suppressed():
+    f = RateLimitFilter(burst=0, interval=5.0, clock=FakeClock())
+    for level in (logging.WARNING, logging.ERROR, logging.CRITICAL):
+        assert all(f.filter(make_record(f"failed {i}", level=level)) for i in range(20))
+    assert [f.filter(make_record("done", lineno=20)) for _ in range(2)] == [True, False]
+
+def test_parse_levels():
+    levels = parse_levels("WARNING, core.processor=DEBUG,ui=error,bogus=LOUD")
+    assert levels == {'': logging.WARNING, 'core.processor': logging.DEBUG, 'ui': logging.ERROR}
+    assert parse_levels(None) == {}
+
+def test_subsystem_loggers_are_children():
+    assert get_logger("core.processor").name == f"{LOGGER_NAME}.core.processor"
+    assert get_logger().name == LOGGER_NAME
@@ -0,0 +1,86 @@
+import io
+import os
+import random
+import pytest
+from PIL import Image, ImageChops, ImageDraw
+from src.core.overlap import find_overlap, find_overlaps
+from src.core.processor import ImageProcessor
+
+WIDTH = 720
+
+@pytest.fixture(scope="module")
+def page():
+    """
+    A long page of text-like blocks to take scrolling screenshots of.
+    """
+    rng = random.Random(7)
+    img = Image.new('RGB', (WIDTH, 6000), 'white')
+    draw = ImageDraw.Draw(img)
+    y = 0
+    while y < img.size[1]:
+        for x in range(20, WIDTH - 100, rng.randint(40, 120)):
+            draw.rectangle((x, y, x + rng.randint(10, 80), y + rng.randint(6, 14)), fill=(rng.randint(0, 120),) * 3)
+        y += rng.randint(20, 60)
+    return img
+
+def screenshots(page, tops, height=1280, bars=False):
+    shots = []
+    for top in tops:
+        shot = page.crop((0, top, WIDTH, top + height))
+        if bars:
+            draw = ImageDraw.Draw(shot)
+            draw.rectangle((0, 0, WIDTH, 60), fill=(30, 60, 200))
+            draw.rectangle((0, height - 90, WIDTH, height), fill=(200, 60, 30))
+        shots.append(shot)
+    return shots
+
+def test_finds_overlap_of_scrolled_screenshots(page):
+    shots = screenshots(page, [0, 900, 1500])
+    cuts = find_overlaps(shots)
+    # Rows dropped in total equal the repeated rows
+    assert [sum(c) for c in cuts] == [380, 680]
+
+def test_survives_jpeg_noise(page):
+    shots = []
+    for shot in screenshots(page, [0, 1000]):
+        buf = io.BytesIO()
+        shot.save(buf, 'JPEG', quality=80)
+        shots.append(Image.open(io.BytesIO(buf.getvalue())).convert('RGB'))
+    assert sum(find_overlap(*shots)) == 280
+
+def test_fixed_bars_are_kept_once(page):
+    upper, lower = screenshots(page, [0, 1000], bars=True)
+    cut_upper, cut_lower = find_overlap(upper, lower)
+    # The footer leaves the upper image (with any blank rows above it that
+    # look alike), the header goes with the repeated rows of the lower one
+    assert cut_upper >= 90
+    assert cut_upper + cut_lower == 280
+
+def test_no_overlap_between_unrelated_or_blank_images(page):
+    upper, lower = screenshots(page, [0, 3000])
+    assert find_overlap(upper, lower) == (0, 0)
+    blank = Image.new('RGB', (WIDTH, 800), 'white')
+    assert find_overlap(blank, blank.copy()) == (0, 0)
+
+def test_stitch_with_overlap_rebuilds_the_page(page, tmp_path):
+    tops = [0, 900, 1500, 2600]
+    paths = []
+    for i, shot in enumerate(screenshots(page, tops)):
+        paths.append(os.path.join(tmp_path, f"shot_{i}.png"))
+        shot.save(paths[-1])
+    output = ImageProcessor.stitch_images(paths, os.path.join(tmp_path, "long.png"), overlap=True)
+    with Image.open(output) as stitched:
+        expected = page.crop((0, 0, WIDTH, tops[-1] + 1280))
+        assert stitched.size == expected.size
+        assert ImageChops.difference(stitched.convert('RGB'), expected).getbbox() is None
+
+def test_preview_applies_scaled_overlap(page, tmp_path):
+    paths = []
+    for i, shot in enumerate(screenshots(page, [0, 640])):
+        paths.append(os.path.join(tmp_path, f"shot_{i}.png"))
+        shot.save(paths[-1])
+    plain = ImageProcessor.generate_stitch_preview(paths, max_width=400)
+    trimmed = ImageProcessor.generate_stitch_preview(paths, max_width=400, overlap=True)
+    assert plain.size[1] == 800
+    # 640 of 2560 rows repeat, scaled to the 400 px preview height
+    assert trimmed.size[1] == 600
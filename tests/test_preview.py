@@ -0,0 +1,106 @@
+import os
+import random
+import pytest
+from PIL import Image, ImageChops, ImageStat
+from src.core.preview import StitchPreviewRenderer, grid_overlay, load_split_preview
+from src.core.processor import ImageProcessor
+from src.core.tiled_tiff import encode_tiled_tiff
+
+def blocks(width, height, seed=1):
+    rng = random.Random(seed)
+    img = Image.new('RGB', (width, height), 'white')
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        img.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 40, y + 30))
+    return img
+
+def mean_difference(a, b):
+    return max(ImageStat.Stat(ImageChops.difference(a, b)).mean)
+
+@pytest.fixture
+def sources(tmp_path):
+    paths = []
+    for i, size in enumerate([(400, 600), (300, 500), (500, 300)]):
+        path = os.path.join(tmp_path, f"in_{i}.png")
+        blocks(*size, seed=i).save(path)
+        paths.append(path)
+    return paths
+
+@pytest.mark.parametrize("mode", ["resize", "crop", "fill"])
+def test_full_scale_matches_the_stitch(sources, tmp_path, mode):
+    renderer = StitchPreviewRenderer(sources, mode)
+    with Image.open(ImageProcessor.stitch_images(sources, os.path.join(tmp_path, "s.png"), mode=mode)) as stitched:
+        expected = stitched.convert('RGB')
+    assert renderer.size == expected.size
+    assert mean_difference(renderer.render(1.0), expected) < 2
+
+def test_region_at_a_reduced_scale(sources, tmp_path):
+    renderer = StitchPreviewRenderer(sources, 'fill')
+    box = (50, 450, 450, 1250)
+    region = renderer.render(0.5, box)
+    assert region.size == (200, 400)
+    with Image.open(ImageProcessor.stitch_images(sources, os.path.join(tmp_path, "s.png"), mode='fill')) as stitched:
+        expected = stitched.convert('RGB').crop(box).resize(region.size, Image.Resampling.BILINEAR)
+    assert mean_difference(region, expected) < 2
+
+def test_only_images_in_the_box_are_read(sources):
+    renderer = StitchPreviewRenderer(sources, 'resize')
+    renderer.render(0.25, (0, 0, renderer.width, 100))
+    assert list(renderer._cache) == [0]
+    # A sharper rendering replaces the coarse decode
+    renderer.render(1.0, (0, 0, renderer.width, 100))
+    assert renderer._cache[0][1] == 1.0
+
+def test_overlap_and_tiled_sources(tmp_path):
+    page = blocks(300, 900, seed=7)
+    upper = os.path.join(tmp_path, "upper.png")
+    lower = os.path.join(tmp_path, "lower.tif")
+    page.crop((0, 0, 300, 600)).save(upper)
+    with open(lower, 'wb') as f:
+        f.write(encode_tiled_tiff(page.crop((0, 400, 300, 900)), 'deflate', tile_size=128))
+    renderer = StitchPreviewRenderer([upper, lower], overlap=True)
+    assert renderer.size == (300, 900)
+    assert mean_difference(renderer.render(1.0), page) < 1
+    assert renderer.render(0.1).size == (30, 90)
+
+def test_no_readable_images(tmp_path):
+    with pytest.raises(ValueError):
+        StitchPreviewRenderer([os.path.join(tmp_path, "missing.png")])
+
+def test_grid_overlay_matches_the_split(tmp_path):
+    source = os.path.join(tmp_path, "in.jpg")
+    blocks(3001, 2003).save(source)
+    preview, size = load_split_preview(source, max_size=512)
+    assert size == (3001, 2003) and max(preview.size) == 512
+    cells = grid_overlay(size, preview.size, rows=3, cols=4)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    tiles = ImageProcessor.split_image(source, out_dir, rows=3, cols=4)
+    for (box, _), tile in zip(cells, tiles):
+        with Image.open(tile) as img:
+            assert img.size == (box[2] - box[0], box[3] - box[1])
+    # The last column and row keep the remainder
+    assert cells[-1][0] == (2250, 1334, 3001, 2003)
+    # Neighbouring cells share their edges in the preview
+    assert cells[0][1][2] == cells[1][1][0] and cells[0][1][3] == cells[4][1][1]
+    assert cells[-1][1][2:] == preview.size
+
+@pytest.mark.parametrize("tiled", [False, True])
+def test_split_preview_closes_the_source(tmp_path, monkeypatch, tiled):
+    source = os.path.join(tmp_path, "in.tif")
+    if tiled:
+        with open(source, 'wb') as f:
+            f.write(encode_tiled_tiff(blocks(600, 400), 'deflate', tile_size=128))
+    else:
+        blocks(600, 400).save(source)
+    opened = []
+    real_open = Image.open
+    monkeypatch.setattr(Image, "open", lambda *a, **k: opened.append(real_open(*a, **k)) or opened[-1])
+    preview, size = load_split_preview(source, max_size=100)
+    assert size == (600, 400) and preview.size == (100, 67)
+    assert opened and all(img.fp is None for img in opened)
+
+def test_grid_overlay_keeps_tiny_cells_visible():
+    cells = grid_overlay((100, 20), (50, 10), rows=10, cols=1)
+    assert all(box[3] > box[1] for _, box in cells)
+    assert cells[-1][1][3] == 10
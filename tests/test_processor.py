@@ -1,7 +1,8 @@
+import io
 import os
 import pytest
 from PIL import Image
-from src.core.processor import ImageProcessor
+from src.core.processor import ImageProcessor, OperationCancelled
 
 @pytest.fixture
 def temp_dir(tmp_path):
@@ -85,3 +86,68 @@ def test_stitch_images_fill(sample_images_stitch, temp_dir):
         # img2 (50x50) -> padded to 100x50
         # Total height = 150
         assert img.height == 150
+
+def test_split_image_reports_progress(sample_image, temp_dir):
+    calls = []
+    ImageProcessor.split_image(sample_image, str(temp_dir), rows=2, cols=3,
+                               progress_callback=lambda done, total: calls.append((done, total)))
+    # Decoded, then one report per tile written
+    assert calls == [(i, 6) for i in range(0, 7)]
+
+def test_split_image_cancelled_from_callback(sample_image, temp_dir):
+    def cancel_after_two(done, total):
+        if done == 2:
+            raise OperationCancelled()
+
+    with pytest.raises(OperationCancelled):
+        ImageProcessor.split_image(sample_image, str(temp_dir), progress_callback=cancel_after_two)
+
+def test_stitch_images_reports_progress(sample_images_stitch, temp_dir):
+    calls = []
+    output_path = os.path.join(temp_dir, "stitched_progress.jpg")
+    ImageProcessor.stitch_images(sample_images_stitch, output_path,
+                                 progress_callback=lambda done, total: calls.append((done, total)))
+    # 2 decoded + 2 composed + encode + write
+    assert calls == [(i, 6) for i in range(1, 7)]
+
+def test_cancelled_split_leaves_no_tiles(sample_image, temp_dir):
+    out_dir = os.path.join(temp_dir, "out")
+    os.makedirs(out_dir)
+
+    def cancel_after_two(done, total):
+        if done == 2:
+            raise OperationCancelled()
+
+    with pytest.raises(OperationCancelled):
+        ImageProcessor.split_image(sample_image, out_dir, progress_callback=cancel_after_two)
+    assert os.listdir(out_dir) == []
+
+def test_split_to_buffers_accepts_bytes_files_and_images(sample_image, temp_dir):
+    data = open(sample_image, 'rb').read()
+    sources = [data, io.BytesIO(data), Image.open(sample_image)]
+    for source in sources:
+        tiles = list(ImageProcessor.split_to_buffers(source, rows=2, cols=3, name="scan"))
+        assert [name for name, _ in tiles] == [f"scan_{i}.jpg" for i in range(1, 7)]
+        with Image.open(io.BytesIO(tiles[-1][1])) as tile:
+            assert tile.format == "JPEG"
+            assert tile.size == (34, 50)
+    assert os.listdir(temp_dir) == ["test_img.jpg"]
+
+def test_split_to_buffers_is_lazy(sample_image):
+    calls = []
+    tiles = ImageProcessor.split_to_buffers(open(sample_image, 'rb'), "png",
+                                            progress_callback=lambda done, total: calls.append(done))
+    name, data = next(tiles)
+    assert name == "tile_1.png" and data.startswith(b"\x89PNG")
+    assert calls == [0, 1]
+
+def test_stitch_to_bytes(sample_images_stitch):
+    calls = []
+    sources = [open(sample_images_stitch[0], 'rb').read(), Image.new('RGBA', (50, 50), 'blue')]
+    data = ImageProcessor.stitch_to_bytes(sources, mode='resize',
+                                          progress_callback=lambda done, total: calls.append((done, total)))
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.format == "JPEG"
+        assert img.size == (100, 200)
+    # 2 decoded + 2 composed + encode
+    assert calls == [(i, 5) for i in range(1, 6)]
@@ -0,0 +1,59 @@
+import pytest
+from src.core.progress import BatchProgress, format_eta
+from src.core.worker import Worker
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_batch_progress_fraction_and_eta():
+    clock = FakeClock()
+    progress = BatchProgress(4, clock=clock)
+    assert progress.eta_seconds() is None
+
+    clock.now = 10.0
+    progress.finish("a")
+    progress.update("b", 0.5)
+    # 1.5 of 4 tasks done in 10s -> 2.5 tasks left at 0.15 tasks/s
+    assert progress.fraction() == pytest.approx(0.375)
+    assert progress.eta_seconds() == pytest.approx(10.0 * 0.625 / 0.375)
+
+def test_format_eta():
+    assert format_eta(None) == "剩余时间: 估算中..."
+    assert format_eta(42) == "剩余时间: 42秒"
+    assert format_eta(125) == "剩余时间: 2分5秒"
+
+def test_worker_injects_throttled_progress():
+    def job(progress_callback=None):
+        for i in range(1, 101):
+            progress_callback(i, 100)
+        return "done"
+
+    worker = Worker(job)
+    emitted = []
+    worker.signals.progress.connect(emitted.append)
+    worker.run()
+
+    # Throttling drops most intermediate values but always reports completion
+    assert emitted[-1] == 100
+    assert len(emitted) < 100
+
+def test_worker_does_not_inject_into_plain_functions():
+    worker = Worker(lambda x: x * 2, 21)
+    results = []
+    worker.signals.result.connect(results.append)
+    worker.run()
+    assert results == [42]
+
+def test_worker_cancel_stops_at_next_report():
+    worker = Worker(lambda progress_callback=None: progress_callback(1, 2))
+    worker.cancel()
+    cancelled, errors = [], []
+    worker.signals.cancelled.connect(lambda: cancelled.append(True))
+    worker.signals.error.connect(errors.append)
+    worker.run()
+    assert cancelled == [True]
+    assert errors == []
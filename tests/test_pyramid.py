@@ -0,0 +1,115 @@
+import os
+import json
+import zipfile
+import pytest
+from PIL import Image
+from src.core.processor import OperationCancelled
+from src.core.writer import ArchiveWriter
+from src.core.pyramid import generate_pyramid, level_sizes, tile_box, LAYOUT_XYZ
+
+@pytest.fixture
+def scan(tmp_path):
+    path = os.path.join(tmp_path, "scan.png")
+    img = Image.new('RGB', (600, 300), 'white')
+    img.paste((255, 0, 0), (0, 0, 300, 300))
+    img.save(path)
+    return path
+
+def test_level_sizes_halve_and_round_up():
+    assert level_sizes(5, 3, 256) == [(5, 3), (3, 2), (2, 1), (1, 1)]
+    assert level_sizes(1000, 700, 256, LAYOUT_XYZ) == [(1000, 700), (500, 350), (250, 175)]
+
+def test_tile_box_overlaps_inner_edges():
+    assert tile_box(0, 0, 600, 300, 256, overlap=1) == (0, 0, 257, 257)
+    assert tile_box(1, 1, 600, 300, 256, overlap=1) == (255, 255, 513, 300)
+    assert tile_box(2, 0, 600, 300, 256, overlap=1) == (511, 0, 600, 257)
+
+def test_dzi_layout(scan, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    calls = []
+    result = generate_pyramid(scan, out_dir, tile_size=256, overlap=1, output_format="jpg",
+                              progress_callback=lambda done, total: calls.append((done, total)))
+    assert result == [os.path.join(out_dir, "scan.dzi")]
+    manifest = open(result[0]).read()
+    assert 'TileSize="256"' in manifest and 'Overlap="1"' in manifest
+    assert '<Size Width="600" Height="300"/>' in manifest
+    files = os.path.join(out_dir, "scan_files")
+    # ceil(log2(600)) = 10 halvings down to 1x1
+    assert sorted(os.listdir(files), key=int) == [str(i) for i in range(11)]
+    assert sorted(os.listdir(os.path.join(files, "10"))) == ["0_0.jpg", "0_1.jpg", "1_0.jpg", "1_1.jpg", "2_0.jpg", "2_1.jpg"]
+    with Image.open(os.path.join(files, "10", "1_1.jpg")) as tile:
+        assert tile.size == (258, 45)
+    with Image.open(os.path.join(files, "9", "0_0.jpg")) as tile:
+        assert tile.size == (257, 150)
+        # Reduced from the level above: the left half is still red
+        assert tile.getpixel((10, 10))[0] > 200 and tile.getpixel((10, 10))[1] < 60
+    assert os.listdir(os.path.join(files, "0")) == ["0_0.jpg"]
+    assert calls[0] == (0, len(calls) - 1) and calls[-1] == (len(calls) - 1, len(calls) - 1)
+
+def test_xyz_layout_and_manifest(scan, tmp_path):
+    result = generate_pyramid(scan, str(tmp_path), tile_size=256, layout=LAYOUT_XYZ)
+    manifest = json.load(open(result[0]))
+    assert result == [os.path.join(tmp_path, "scan", "manifest.json")]
+    assert (manifest['min_zoom'], manifest['max_zoom']) == (0, 2)
+    assert [(l['z'], l['cols'], l['rows']) for l in manifest['levels']] == [(0, 1, 1), (1, 2, 1), (2, 3, 2)]
+    assert os.path.exists(os.path.join(tmp_path, "scan", "2", "2", "1.png"))
+    assert os.path.exists(os.path.join(tmp_path, "scan", "0", "0", "0.png"))
+
+def test_pyramid_into_archive(scan, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    result = generate_pyramid(scan, out_dir, tile_size=256, archive="zip")
+    assert result == [os.path.join(out_dir, "scan.zip")]
+    assert os.listdir(out_dir) == ["scan.zip"]
+    with zipfile.ZipFile(result[0]) as zf:
+        names = zf.namelist()
+    assert "scan.dzi" == names[-1]
+    assert "scan_files/10/2_1.png" in names
+
+def test_cancelled_pyramid_leaves_nothing(scan, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+
+    def cancel(done, total):
+        if done == 3:
+            raise OperationCancelled()
+
+    with pytest.raises(OperationCancelled):
+        generate_pyramid(scan, out_dir, tile_size=64, progress_callback=cancel)
+    assert os.listdir(out_dir) == []
+
+def test_cancelled_archive_pyramid_keeps_existing_tiles(scan, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    generate_pyramid(scan, out_dir, tile_size=64)
+    before = sorted(os.path.join(root, name) for root, _, names in os.walk(out_dir) for name in names)
+
+    def cancel(done, total):
+        if done == 3:
+            raise OperationCancelled()
+
+    with pytest.raises(OperationCancelled):
+        generate_pyramid(scan, out_dir, tile_size=64, archive="zip", progress_callback=cancel)
+    assert sorted(os.path.join(root, name) for root, _, names in os.walk(out_dir) for name in names) == before
+
+def test_cancelled_pyramid_leaves_no_entries_in_shared_archive(scan, tmp_path):
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    other = os.path.join(tmp_path, "other.png")
+    Image.new('RGB', (100, 50), 'blue').save(other)
+    archive_path = os.path.join(out_dir, "batch.zip")
+    writer = ArchiveWriter(archive_path, root=out_dir)
+    generate_pyramid(other, out_dir, tile_size=64, writer=writer)
+
+    def cancel(done, total):
+        if done == total:
+            raise OperationCancelled()
+
+    with pytest.raises(OperationCancelled):
+        generate_pyramid(scan, out_dir, tile_size=64, writer=writer, progress_callback=cancel)
+    writer.close()
+    with zipfile.ZipFile(archive_path) as zf:
+        names = zf.namelist()
+    assert "other.dzi" in names
+    assert not [n for n in names if n.startswith("scan")]
@@ -0,0 +1,38 @@
+import gc
+import pytest
+from PIL import Image
+from PyQt6.QtGui import QImage, QColor
+from src.ui.qt_image import pil_to_qimage
+
+@pytest.mark.parametrize("mode, color, fmt", [
+    ('RGB', (10, 20, 30), QImage.Format.Format_RGB888),
+    ('RGBA', (10, 20, 30, 40), QImage.Format.Format_RGBA8888),
+    ('L', 77, QImage.Format.Format_Grayscale8),
+    ('CMYK', (0, 0, 0, 0), QImage.Format.Format_RGB888),
+])
+def test_native_formats(mode, color, fmt):
+    qimage = pil_to_qimage(Image.new(mode, (7, 5), color))
+    assert qimage.format() == fmt
+    assert (qimage.width(), qimage.height()) == (7, 5)
+
+def test_alpha_only_when_transparent():
+    opaque = Image.new('P', (4, 4))
+    assert pil_to_qimage(opaque).format() == QImage.Format.Format_RGB888
+    transparent = Image.new('P', (4, 4))
+    transparent.info['transparency'] = 0
+    assert pil_to_qimage(transparent).format() == QImage.Format.Format_RGBA8888
+
+def test_odd_width_rows_are_not_skewed():
+    img = Image.new('RGB', (5, 3), (0, 0, 0))
+    img.putpixel((4, 2), (255, 0, 0))
+    img.putpixel((0, 1), (0, 255, 0))
+    qimage = pil_to_qimage(img)
+    assert QColor(qimage.pixel(4, 2)).getRgb()[:3] == (255, 0, 0)
+    assert QColor(qimage.pixel(0, 1)).getRgb()[:3] == (0, 255, 0)
+
+def test_buffer_outlives_source_image():
+    img = Image.new('RGB', (64, 64), (1, 2, 3))
+    qimage = pil_to_qimage(img)
+    del img
+    gc.collect()
+    assert QColor(qimage.pixel(63, 63)).getRgb()[:3] == (1, 2, 3)
@@ -0,0 +1,112 @@
+import os
+import sys
+import time
+import threading
+from PIL import Image
+from PyQt6.QtCore import QCoreApplication
+from src.core.scheduler import AdmissionQueue, JobScheduler
+from src.core.worker import Worker
+from src.core.processor import ImageProcessor
+
+MB = 1024 * 1024
+
+app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+
+class FakePool:
+    """Records started jobs instead of running them."""
+    def __init__(self, threads):
+        self.threads = threads
+        self.started = []
+
+    def maxThreadCount(self):
+        return self.threads
+
+    def start(self, job):
+        self.started.append(job)
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    return condition()
+
+def test_admits_up_to_concurrency_limit():
+    queue = AdmissionQueue(max_concurrency=2, memory_budget=100 * MB)
+    for name in "abc":
+        queue.push(name, MB)
+    assert queue.pop_ready() == ["a", "b"]
+    queue.release("a")
+    assert queue.pop_ready() == ["c"]
+
+def test_small_jobs_bypass_large_job_under_budget():
+    queue = AdmissionQueue(max_concurrency=4, memory_budget=100 * MB)
+    queue.push("big1", 60 * MB)
+    queue.push("big2", 60 * MB)
+    queue.push("small1", 10 * MB)
+    queue.push("small2", 10 * MB)
+    assert queue.pop_ready() == ["big1", "small1", "small2"]
+    assert queue.in_flight_bytes == 80 * MB
+    queue.release("big1")
+    assert queue.pop_ready() == ["big2"]
+
+def test_large_job_is_not_starved():
+    queue = AdmissionQueue(max_concurrency=2, memory_budget=100 * MB, max_bypass=1)
+    queue.push("running", 50 * MB)
+    assert queue.pop_ready() == ["running"]
+    queue.push("big", 80 * MB)
+    queue.push("small1", 10 * MB)
+    queue.push("small2", 10 * MB)
+    # One bypass allowed, then the queue waits for "big" to fit
+    assert queue.pop_ready() == ["small1"]
+    queue.release("small1")
+    assert queue.pop_ready() == []
+    queue.release("running")
+    assert queue.pop_ready() == ["big", "small2"]
+
+def test_job_larger_than_budget_runs_alone():
+    queue = AdmissionQueue(max_concurrency=4, memory_budget=10 * MB)
+    queue.push("huge", 50 * MB)
+    queue.push("small", MB)
+    assert queue.pop_ready() == ["huge"]
+    queue.release("huge")
+    assert queue.pop_ready() == ["small"]
+
+def test_estimate_decoded_bytes_reads_header(tmp_path):
+    path = os.path.join(tmp_path, "big.png")
+    Image.new('L', (300, 200)).save(path)
+    assert ImageProcessor.estimate_decoded_bytes(path) == 300 * 200
+    assert ImageProcessor.estimate_decoded_bytes(os.path.join(tmp_path, "missing.png")) == 0
+
+def test_callable_costs_are_estimated_off_the_submitting_thread():
+    pool = FakePool(1)
+    scheduler = JobScheduler(pool, memory_budget=100 * MB)
+    caller = threading.current_thread()
+    threads = []
+
+    def cost():
+        threads.append(threading.current_thread())
+        return 60 * MB
+
+    first, second = Worker(lambda: None), Worker(lambda: None)
+    scheduler.submit(first, cost)
+    scheduler.submit(second, cost)
+    assert pool.started == []
+    assert wait_for(lambda: scheduler.queue.pending_count() == 1)
+    assert pool.started == [first]
+    assert scheduler.queue.in_flight_bytes == 60 * MB
+    assert threads and caller not in threads
+
+def test_job_cancelled_while_estimating_is_not_queued():
+    pool = FakePool(2)
+    scheduler = JobScheduler(pool, memory_budget=100 * MB)
+    release = threading.Event()
+
+    job = Worker(lambda: None)
+    scheduler.submit(job, lambda: release.wait(5) and MB)
+    assert scheduler.cancel_pending(job)
+    release.set()
+    scheduler._estimator.submit(lambda: None).result(5)
+    wait_for(lambda: False, timeout=0.2)
+    assert pool.started == []
+    assert scheduler.queue.pending_count() == 0
@@ -0,0 +1,67 @@
+import os
+import pytest
+from PIL import Image
+from src.core.processor import ImageProcessor
+from src.core.journal import JobJournal
+from src.core.segments import plan_segments, segment_limit
+
+def make_images(folder, heights, width=40):
+    paths = []
+    for i, height in enumerate(heights):
+        path = os.path.join(folder, f"img_{i}.png")
+        Image.new('RGB', (width, height), (i * 40 % 256, 100, 200)).save(path)
+        paths.append(path)
+    return paths
+
+def test_plan_prefers_image_boundaries():
+    assert plan_segments([(0, 40), (0, 50), (0, 30)], 100) == [[(0, 0, 40), (1, 0, 50)], [(2, 0, 30)]]
+    # Only an image taller than the limit is cut itself
+    assert plan_segments([(0, 30), (0, 250), (5, 20)], 100) == [
+        [(0, 0, 30)], [(1, 0, 100)], [(1, 100, 200)], [(1, 200, 250), (2, 5, 20)]]
+    assert plan_segments([(0, 30), (10, 10), (0, 30)], None) == [[(0, 0, 30), (2, 0, 30)]]
+
+def test_segment_limits():
+    assert segment_limit('jpg') == 65535
+    assert segment_limit('webp', 20000) == 16383
+    assert segment_limit('png') is None
+    assert segment_limit('png', 5000) == 5000
+    assert segment_limit('tif', multipage=True) == 65535
+
+def test_webp_stitch_is_cut_under_the_format_limit(tmp_path):
+    paths = make_images(tmp_path, [6000, 6000, 6000], width=16)
+    calls = []
+    outputs = ImageProcessor.stitch_images(paths, os.path.join(tmp_path, "long.webp"),
+                                           progress_callback=lambda done, total: calls.append((done, total)))
+    assert [os.path.basename(p) for p in outputs] == ["long_1.webp", "long_2.webp"]
+    heights = []
+    for output in outputs:
+        with Image.open(output) as part:
+            heights.append(part.size[1])
+    assert heights == [12000, 6000]
+    assert calls[-1] == (3 + 3 + 4, 3 + 3 + 4)
+
+def test_max_height_and_journal(tmp_path):
+    paths = make_images(tmp_path, [100, 150, 80, 120], width=60)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    journal = JobJournal(out_dir)
+    outputs = ImageProcessor.stitch_images(paths, os.path.join(out_dir, "s.png"), max_height=250, journal=journal)
+    sizes = []
+    for output in outputs:
+        with Image.open(output) as part:
+            sizes.append(part.size)
+    assert sizes == [(60, 250), (60, 200)]
+    assert ImageProcessor.stitch_images(paths, os.path.join(out_dir, "s.png"), max_height=250, journal=journal) == outputs
+
+def test_multipage_tiff(tmp_path):
+    paths = make_images(tmp_path, [100, 90, 80], width=60)
+    output = ImageProcessor.stitch_images(paths, os.path.join(tmp_path, "s.jpg"), max_height=200, multipage=True)
+    assert output == os.path.join(tmp_path, "s.tif")
+    with Image.open(output) as tiff:
+        assert tiff.n_frames == 2
+        pages = []
+        for k in range(tiff.n_frames):
+            tiff.seek(k)
+            pages.append((tiff.size, tiff.getpixel((0, 0))))
+    assert pages == [((60, 190), (0, 100, 200)), ((60, 80), (80, 100, 200))]
+    assert [n for n in os.listdir(tmp_path) if n.endswith(".tmp")] == []
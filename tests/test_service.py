@@ -0,0 +1,141 @@
+import io
+import json
+import time
+import zipfile
+import threading
+import http.client
+import pytest
+from PIL import Image
+from src.core.service import ImageService, Job, STREAM_BUFFER
+
+def png_bytes(size=(40, 20), color='red'):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color=color).save(buf, format='PNG')
+    return buf.getvalue()
+
+@pytest.fixture
+def service():
+    svc = ImageService(port=0, max_workers=1, max_queued=1)
+    svc.start()
+    yield svc
+    svc.stop()
+
+def request(service, method, path, body=None, headers=None):
+    host, port = service.server.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    return response, data
+
+def test_split_upload_streams_zip(service):
+    response, data = request(service, "POST", "/split?rows=2&cols=3&name=scan.png", png_bytes((60, 40)))
+    assert response.status == 200
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        names = zf.namelist()
+        assert names == [f"scan_{i}.png" for i in range(1, 7)]
+        with Image.open(io.BytesIO(zf.read("scan_6.png"))) as tile:
+            assert tile.size == (20, 20)
+
+    job_id = response.getheader("X-Job-Id")
+    response, data = request(service, "GET", f"/jobs/{job_id}")
+    status = json.loads(data)
+    assert status['state'] == 'done'
+    assert (status['done'], status['total']) == (6, 6)
+
+def test_split_server_side_path(service, tmp_path):
+    path = str(tmp_path / "page.jpg")
+    Image.new('RGB', (20, 20)).save(path)
+    body = json.dumps({'path': path})
+    response, _ = request(service, "POST", "/split?format=png", body, {"Content-Type": "application/json"})
+    # Off unless asked for
+    assert response.status == 403
+    service.allow_paths = True
+    response, data = request(service, "POST", "/split?format=png", body, {"Content-Type": "application/json"})
+    assert response.status == 200
+    assert zipfile.ZipFile(io.BytesIO(data)).namelist()[0] == "page_1.png"
+
+def test_stitch_zip_upload(service):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        zf.writestr("b.png", png_bytes((40, 10), 'blue'))
+        zf.writestr("a.png", png_bytes((40, 20), 'red'))
+    response, data = request(service, "POST", "/stitch?format=png", buf.getvalue())
+    assert response.status == 200
+    assert response.getheader("Content-Type") == "image/png"
+    with Image.open(io.BytesIO(data)) as img:
+        assert img.size == (40, 30)
+        # Stitched in name order
+        assert img.getpixel((0, 0)) == (255, 0, 0)
+
+def test_bad_input_is_rejected(service):
+    response, data = request(service, "POST", "/split", b"not an image")
+    assert response.status == 400
+    response, _ = request(service, "POST", "/split?rows=0", png_bytes())
+    assert response.status == 400
+    response, _ = request(service, "GET", "/jobs/unknown")
+    assert response.status == 404
+
+def test_backpressure_returns_503(service):
+    gate = threading.Event()
+    # One running and one queued job fill the service (1 worker, 1 queued)
+    jobs = [service.submit('test', lambda job: gate.wait(5)) for _ in range(2)]
+
+    response, data = request(service, "POST", "/split", png_bytes())
+    assert response.status == 503
+    assert response.getheader("Retry-After") == "1"
+    assert service.metrics()['rejected'] == 1
+
+    gate.set()
+    deadline = time.monotonic() + 5
+    while any(j.state != 'done' for j in jobs) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    response, _ = request(service, "POST", "/split", png_bytes())
+    assert response.status == 200
+
+def test_client_disconnect_cancels_job(service):
+    host, port = service.server.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    # Far more tiles than the stream buffer holds
+    conn.request("POST", f"/split?rows={STREAM_BUFFER * 8}&cols=64", png_bytes((4000, 4000)))
+    response = conn.getresponse()
+    job_id = response.getheader("X-Job-Id")
+    conn.close()
+    job = service.job(job_id)
+    deadline = time.monotonic() + 10
+    while job.state == 'running' and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job.state == 'cancelled'
+
+def test_metrics(service):
+    request(service, "POST", "/split", png_bytes())
+    response, data = request(service, "GET", "/metrics")
+    metrics = json.loads(data)
+    assert metrics['completed'] == 1
+    assert metrics['workers'] == 1
+    assert metrics['latency_p50'] is not None
+
+def test_job_that_never_runs_does_not_block_its_request():
+    job = Job('split')
+    job.cancel()
+    assert job.next_result() == ('cancelled',)
+    finished = Job('split')
+    finished.finished = time.time()
+    finished.results.put(('end',))
+    assert finished.next_result() == ('end',)
+    assert finished.next_result() == ('cancelled',)
+
+@pytest.mark.parametrize("length", ["abc", "-1"])
+def test_bad_content_length_is_rejected(service, length):
+    host, port = service.server.server_address[:2]
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.putrequest("POST", "/split")
+    conn.putheader("Content-Length", length)
+    conn.endheaders()
+    response = conn.getresponse()
+    data = response.read()
+    conn.close()
+    assert response.status == 400
+    assert b"bad Content-Length" in data
@@ -0,0 +1,78 @@
+import os
+import random
+import pytest
+from PIL import Image, ImageDraw
+from src.core.processor import ImageProcessor
+from src.core.slicing import page_cuts, page_regions, row_profile
+
+WIDTH = 480
+
+def make_strip(height, seed=5):
+    """
+    A long strip of framed panels holding lines of text-like bars, separated
+    by white gutters. Returns the image, the gutters and the text lines.
+    """
+    rng = random.Random(seed)
+    img = Image.new('RGB', (WIDTH, height), 'white')
+    draw = ImageDraw.Draw(img)
+    gutters, lines = [], []
+    y = 30
+    while y < height - 400:
+        bottom = y + rng.randint(250, 500)
+        draw.rectangle((20, y, WIDTH - 20, bottom), fill=(rng.randint(150, 230),) * 3, outline='black', width=3)
+        for top in range(y + 20, bottom - 20, 24):
+            draw.rectangle((40, top, 40 + rng.randint(100, 380), top + 12), fill='black')
+            lines.append((top, top + 12))
+        gap = rng.randint(30, 60)
+        gutters.append((bottom + 1, bottom + gap))
+        y = bottom + gap
+    return img, gutters, lines
+
+def test_row_profile_separates_blank_and_text_rows():
+    img, gutters, lines = make_strip(1200)
+    profile = row_profile(img, band_height=100)
+    assert len(profile) == 1200
+    assert all(profile[r] == 0 for a, b in gutters for r in range(a + 1, b))
+    assert all(profile[a + 6] > 64 for a, b in lines)
+
+def test_page_cuts_stay_near_target():
+    profile = bytearray([200] * 1000)
+    profile[530:540] = bytes(10)
+    # Two rows of clearance from content, as close to the target as possible
+    assert page_cuts(profile, 500) == [532]
+    # Nothing blank in reach: cut at the target
+    assert page_cuts(bytearray([200] * 1000), 400) == [400, 800]
+    assert page_cuts(profile, 2000) == []
+
+@pytest.mark.parametrize("fmt", ["png", "jpg"])
+def test_cuts_never_split_text(tmp_path, fmt):
+    img, gutters, lines = make_strip(6000)
+    path = os.path.join(tmp_path, f"strip.{fmt}")
+    img.save(path)
+    with Image.open(path) as opened:
+        opened.load()
+        regions = page_regions(opened, 600)
+    assert regions[0][1] == 0 and regions[-1][3] == 6000
+    for (_, _, _, bottom), (_, top, _, _) in zip(regions, regions[1:]):
+        assert bottom == top
+        assert not any(a <= top <= b + 1 for a, b in lines)
+    heights = [bottom - top for _, top, _, bottom in regions]
+    assert all(480 <= h <= 720 for h in heights[:-1])
+
+def test_split_image_into_pages(tmp_path):
+    img, gutters, lines = make_strip(3000)
+    path = os.path.join(tmp_path, "strip.png")
+    img.save(path)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    calls = []
+    outputs = ImageProcessor.split_image(path, out_dir, page_height=700,
+                                         progress_callback=lambda done, total: calls.append((done, total)))
+    assert [os.path.basename(p) for p in outputs] == [f"strip_{i}.png" for i in range(1, len(outputs) + 1)]
+    assert calls[-1] == (len(outputs), len(outputs))
+    total = 0
+    for output in outputs:
+        with Image.open(output) as page:
+            assert page.size[0] == WIDTH
+            total += page.size[1]
+    assert total == 3000
@@ -0,0 +1,103 @@
+import io
+import os
+import random
+import pytest
+from PIL import Image
+from src.core.processor import ImageProcessor
+from src.core.target_size import encode_within, OutputTooLarge, GOOD_FIT, TRIALS
+
+def noisy_image(width=400, height=300, seed=3):
+    """
+    Random blocks, which keep JPEG and PNG sizes well above a few KB.
+    """
+    rng = random.Random(seed)
+    img = Image.new('RGB', (width, height))
+    for y in range(0, height, 4):
+        for x in range(0, width, 4):
+            img.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, x + 4, y + 4))
+    return img
+
+def counting_encode(calls):
+    def encode(img, ext, **kwargs):
+        calls.append((img.size, kwargs.get('quality')))
+        return ImageProcessor._encode(img, ext, **kwargs)
+    return encode
+
+def test_fitting_image_costs_one_encode():
+    calls = []
+    data = encode_within(noisy_image(), 'jpg', 10 ** 7, counting_encode(calls), quality=90)
+    assert calls == [((400, 300), 90)]
+    assert data == ImageProcessor._encode(noisy_image(), 'jpg', quality=90)
+
+def test_quality_search_keeps_the_best_fitting_quality():
+    img = noisy_image()
+    limit = len(ImageProcessor._encode(img, 'jpg', quality=60)) + 100
+    calls = []
+    data = encode_within(img, 'jpg', limit, counting_encode(calls), quality=95)
+    assert len(data) <= limit
+    chosen = max(q for size, q in calls if len(ImageProcessor._encode(img, 'jpg', quality=q)) <= limit)
+    assert data == ImageProcessor._encode(img, 'jpg', quality=chosen)
+    tried = {q for size, q in calls}
+    assert len(data) >= GOOD_FIT * limit or chosen + 1 in tried
+    # Seeded from the first encode, one round of trials is enough
+    assert len(calls) <= 1 + TRIALS
+
+@pytest.mark.parametrize("ext", ["jpg", "webp"])
+def test_quality_search_converges_within_two_rounds(ext):
+    img = noisy_image(seed=11)
+    first = len(ImageProcessor._encode(img, ext, quality=90))
+    for share in (0.9, 0.75, 0.6):
+        calls = []
+        data = encode_within(img, ext, int(first * share), counting_encode(calls), quality=90)
+        assert len(data) <= first * share
+        assert len(calls) <= 1 + 2 * TRIALS
+
+def test_downscale_when_quality_is_not_enough():
+    img = noisy_image()
+    floor = len(ImageProcessor._encode(img, 'jpg', quality=20))
+    with pytest.raises(OutputTooLarge):
+        encode_within(img, 'jpg', floor // 3, ImageProcessor._encode)
+    data = encode_within(img, 'jpg', floor // 3, ImageProcessor._encode, allow_downscale=True)
+    assert len(data) <= floor // 3
+    with Image.open(io.BytesIO(data)) as result:
+        assert result.size[0] < 400 and result.size[0] / result.size[1] == pytest.approx(4 / 3, rel=0.02)
+
+def test_stitch_and_split_respect_max_bytes(tmp_path):
+    paths = []
+    for i in range(2):
+        path = os.path.join(tmp_path, f"in_{i}.jpg")
+        noisy_image(seed=i).save(path, quality=95)
+        paths.append(path)
+    out = ImageProcessor.stitch_images(paths, os.path.join(tmp_path, "out.jpg"), max_bytes=60 * 1024)
+    assert os.path.getsize(out) <= 60 * 1024
+    out_dir = os.path.join(tmp_path, "tiles")
+    os.makedirs(out_dir)
+    tiles = ImageProcessor.split_image(paths[0], out_dir, max_bytes=12 * 1024)
+    assert len(tiles) == 4 and all(os.path.getsize(t) <= 12 * 1024 for t in tiles)
+
+def test_png_that_cannot_shrink_fails_without_output(tmp_path):
+    path = os.path.join(tmp_path, "in.png")
+    noisy_image().save(path)
+    out_dir = os.path.join(tmp_path, "tiles")
+    os.makedirs(out_dir)
+    with pytest.raises(OutputTooLarge):
+        ImageProcessor.split_image(path, out_dir, max_bytes=1024)
+    assert os.listdir(out_dir) == []
+
+def test_downscaled_segments_share_one_width(tmp_path):
+    flat = os.path.join(tmp_path, "a_flat.png")
+    Image.new('RGB', (400, 300), (90, 120, 200)).save(flat)
+    noisy = os.path.join(tmp_path, "b_noisy.png")
+    noisy_image(seed=5).save(noisy)
+    limit = len(ImageProcessor._encode(noisy_image(seed=5), 'jpg', quality=20)) // 3
+    calls = []
+    outputs = ImageProcessor.stitch_images([flat, noisy, flat], os.path.join(tmp_path, "s.jpg"), max_height=300,
+                                           max_bytes=limit, downscale=True,
+                                           progress_callback=lambda done, total: calls.append((done, total)))
+    widths = []
+    for output in outputs:
+        assert os.path.getsize(output) <= limit
+        with Image.open(output) as part:
+            widths.append(part.size[0])
+    assert len(set(widths)) == 1 and widths[0] < 400
+    assert calls[-1][0] == calls[-1][1]
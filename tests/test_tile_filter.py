@@ -0,0 +1,92 @@
+import os
+import json
+import zipfile
+import pytest
+from PIL import Image, ImageDraw
+from src.core.processor import ImageProcessor
+from src.core.tile_filter import TileFilter, ACTION_REFERENCE
+
+def scanned_page(path, noise=True):
+    """
+    A white 400x400 page with text in the top-left quarter and a dust speck
+    in the bottom-right one; the right half of the top row repeats the left.
+    """
+    img = Image.new('RGB', (400, 400), (250, 250, 250))
+    draw = ImageDraw.Draw(img)
+    for y in range(20, 180, 20):
+        draw.rectangle((20, y, 40 + y // 4, y + 8), fill="black")
+    img.paste(img.crop((0, 0, 100, 200)), (100, 0))
+    if noise:
+        draw.point([(300, 300), (301, 300), (300, 301)], fill=(200, 200, 200))
+    img.save(path)
+    return path
+
+def test_blank_colour_ignores_specks_but_not_text():
+    f = TileFilter()
+    speck = Image.new('L', (200, 200), 255)
+    speck.putpixel((50, 50), 0)
+    assert f.blank_colour(speck) == [255]
+    text = Image.new('RGB', (200, 200), 'white')
+    ImageDraw.Draw(text).rectangle((10, 10, 150, 22), fill='black')
+    assert f.blank_colour(text) is None
+    assert f.blank_colour(Image.new('P', (100, 100), 3)) == [3]
+
+def test_duplicates_are_found_across_inputs():
+    f = TileFilter()
+    tile = Image.new('RGB', (50, 50), 'white')
+    ImageDraw.Draw(tile).line((0, 0, 50, 50), fill='black')
+    assert f.check(tile, "a_1.png", "a") is None
+    assert f.check(tile.copy(), "a_2.png", "a") == {'same_as': "a_1.png"}
+    # Not referred to across inputs until the split of a has completed
+    assert f.check(tile.copy(), "b_1.png", "b") is None
+    f.commit("a")
+    f.forget("b")
+    assert f.check(tile.copy(), "c_3.png", "c") == {'same_as': "a_1.png"}
+    assert f.check(tile.copy(), "d_1.png", "d", across_inputs=False) is None
+    assert f.counts == {'kept': 3, 'blank': 0, 'duplicate': 2}
+
+def test_aborted_split_is_never_referred_to():
+    f = TileFilter()
+    tile = Image.new('L', (50, 50))
+    ImageDraw.Draw(tile).line((0, 0, 50, 50), fill=255)
+    assert f.check(tile, "a_1.png", "a") is None
+    f.forget("a")
+    f.commit("b")
+    assert f.check(tile.copy(), "b_1.png", "b") is None
+
+def test_split_skips_blank_and_repeated_tiles(tmp_path):
+    source = scanned_page(os.path.join(tmp_path, "page.png"))
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    f = TileFilter()
+    outputs = ImageProcessor.split_image(source, out_dir, rows=2, cols=4, tile_filter=f)
+    assert [os.path.basename(p) for p in outputs] == ["page_1.png"]
+    assert sorted(os.listdir(out_dir)) == ["page_1.png"]
+    assert f.counts == {'kept': 1, 'blank': 6, 'duplicate': 1}
+
+def test_references_are_listed(tmp_path):
+    source = scanned_page(os.path.join(tmp_path, "page.png"), noise=False)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    outputs = ImageProcessor.split_image(source, out_dir, rows=2, cols=4, tile_filter=TileFilter(ACTION_REFERENCE))
+    assert [os.path.basename(p) for p in outputs] == ["page_1.png", "page_refs.json"]
+    refs = json.load(open(outputs[-1]))
+    assert refs["page_2.png"] == {'same_as': "page_1.png"}
+    assert refs["page_8.png"] == {'blank': [250, 250, 250]}
+    assert len(refs) == 7
+
+def test_unknown_action_is_rejected():
+    with pytest.raises(ValueError):
+        TileFilter("drop")
+
+def test_per_input_archives_do_not_refer_to_each_other(tmp_path):
+    first = scanned_page(os.path.join(tmp_path, "a.png"), noise=False)
+    second = scanned_page(os.path.join(tmp_path, "b.png"), noise=False)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    f = TileFilter(ACTION_REFERENCE)
+    ImageProcessor.split_image(first, out_dir, rows=2, cols=4, tile_filter=f, archive='zip')
+    outputs = ImageProcessor.split_image(second, out_dir, rows=2, cols=4, tile_filter=f, archive='zip')
+    with zipfile.ZipFile(outputs[0]) as z:
+        assert "b_1.png" in z.namelist()
+        assert json.loads(z.read("b_refs.json"))["b_2.png"] == {'same_as': "b_1.png"}
@@ -0,0 +1,77 @@
+import io
+import os
+import random
+import pytest
+from PIL import Image, ImageChops, ImageStat
+from src.core.processor import ImageProcessor
+from src.core.tiled_tiff import TiledTiffWriter, TiledTiff, encode_tiled_tiff, open_overview
+
+def blocks(width, height, seed=1, mode='RGB'):
+    rng = random.Random(seed)
+    img = Image.new(mode, (width, height), 'white')
+    for _ in range(200):
+        x, y = rng.randrange(width), rng.randrange(height)
+        img.paste(tuple(rng.randrange(256) for _ in mode), (x, y, x + 40, y + 25))
+    return img
+
+def largest_difference(a, b):
+    return max(high for low, high in ImageChops.difference(a, b).getextrema())
+
+@pytest.mark.parametrize("compression", ["deflate", "none"])
+@pytest.mark.parametrize("big_tiff", [False, True])
+def test_rows_in_any_bands_read_back_exactly(tmp_path, compression, big_tiff):
+    img = blocks(700, 500)
+    path = os.path.join(tmp_path, "t.tif")
+    with TiledTiffWriter(path, img.size, compression=compression, big_tiff=big_tiff) as writer:
+        for top in range(0, 500, 90):
+            writer.write_rows(img.crop((0, top, 700, min(500, top + 90))))
+    with TiledTiff(path) as tiff:
+        assert tiff.levels == [(700, 500), (350, 250), (175, 125)]
+        assert largest_difference(tiff.read_region((250, 100, 600, 420)), img.crop((250, 100, 600, 420))) == 0
+        assert largest_difference(tiff.read_level(1), img.reduce(2)) <= 1
+    # Other readers see the full image first
+    with Image.open(path) as opened:
+        assert largest_difference(opened.convert('RGB'), img) == 0
+
+def test_jpeg_tiles_and_alpha(tmp_path):
+    img = blocks(300, 300, mode='RGBA')
+    data = encode_tiled_tiff(img, 'jpeg', quality=95, tile_size=128)
+    path = os.path.join(tmp_path, "t.tif")
+    with open(path, 'wb') as f:
+        f.write(data)
+    with TiledTiff(path) as tiff:
+        region = tiff.read_region((0, 0, 300, 300))
+    assert region.mode == 'RGB'
+    # Lossy, but close on average
+    assert max(ImageStat.Stat(ImageChops.difference(region, img.convert('RGB'))).mean) < 10
+    with Image.open(io.BytesIO(encode_tiled_tiff(img, 'deflate'))) as opened:
+        assert opened.mode == 'RGBA'
+
+def test_stitch_to_tiled_tiff(tmp_path):
+    paths = []
+    for i, (width, height) in enumerate([(400, 3000), (300, 2500), (400, 900)]):
+        path = os.path.join(tmp_path, f"in_{i}.png")
+        blocks(width, height, seed=i).save(path)
+        paths.append(path)
+    plain = ImageProcessor.stitch_images(paths, os.path.join(tmp_path, "plain.png"), mode='fill')
+    calls = []
+    tiled = ImageProcessor.stitch_images(paths, os.path.join(tmp_path, "tiled.png"), mode='fill', tiled='deflate',
+                                         progress_callback=lambda done, total: calls.append((done, total)))
+    assert tiled == os.path.join(tmp_path, "tiled.tif")
+    assert calls[-1][0] == calls[-1][1]
+    with Image.open(plain) as expected, TiledTiff(tiled) as tiff:
+        assert tiff.levels[0] == (400, 6400)
+        assert largest_difference(tiff.read_region((0, 2900, 400, 3600)), expected.crop((0, 2900, 400, 3600))) == 0
+    overview = open_overview(tiled, 200)
+    assert max(overview.size) == 200
+    assert open_overview(plain, 200) is None
+
+def test_split_to_tiled_tiffs(tmp_path):
+    source = os.path.join(tmp_path, "in.png")
+    blocks(600, 400).save(source)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    outputs = ImageProcessor.split_image(source, out_dir, tiled='deflate')
+    assert [os.path.basename(p) for p in outputs] == [f"in_{i}.tif" for i in range(1, 5)]
+    with TiledTiff(outputs[3]) as tiff:
+        assert tiff.levels[0] == (300, 200)
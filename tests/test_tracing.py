@@ -0,0 +1,48 @@
+import json
+import os
+import pytest
+from PIL import Image
+from src.core.processor import ImageProcessor
+from src.utils.tracing import Tracer, tracer
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.reset()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+    tracer.reset()
+
+def test_disabled_tracer_records_nothing():
+    t = Tracer()
+    with t.stage("encode"):
+        pass
+    assert t.summary() == {}
+    assert t.events == []
+
+def test_stage_statistics():
+    t = Tracer(enabled=True)
+    for _ in range(3):
+        with t.stage("crop"):
+            pass
+    stats = t.summary()["crop"]
+    assert stats["count"] == 3
+    assert stats["max_ms"] >= stats["min_ms"] >= 0
+    assert sum(stats["histogram_us_log2"]) == 3
+
+def test_split_records_stages_and_exports_chrome_trace(enabled_tracer, tmp_path):
+    path = os.path.join(tmp_path, "rgba.png")
+    Image.new('RGBA', (40, 40), color=(255, 0, 0, 128)).save(path)
+
+    ImageProcessor.split_image(path, str(tmp_path), output_format='jpg')
+
+    summary = enabled_tracer.summary()
+    for stage in ("open", "decode", "crop", "convert", "encode", "write"):
+        assert stage in summary
+    assert summary["write"]["count"] == 4
+
+    trace_path = enabled_tracer.export_chrome_trace(os.path.join(tmp_path, "trace.json"))
+    with open(trace_path, encoding='utf-8') as f:
+        trace = json.load(f)
+    assert all(e["ph"] == "X" for e in trace["traceEvents"])
+    assert {e["name"] for e in trace["traceEvents"]} >= {"encode", "write"}
@@ -42,3 +42,45 @@ def test_task_table_columns():
     assert table.columnCount() == 5
     # Verify headers roughly
     assert table.horizontalHeaderItem(0).text() == "选择"
+
+def test_task_table_progress():
+    table = TaskTable()
+    row = table.add_task("test1.jpg", "split")
+    assert table.get_progress(row) == 0
+    table.update_progress(row, 40)
+    assert table.get_progress(row) == 40
+
+def test_interactive_preview_reports_view_and_coverage():
+    from PyQt6.QtGui import QPixmap
+    from src.ui.widgets import InteractivePreviewWidget
+    preview = InteractivePreviewWidget()
+    preview.resize(400, 500)
+    base = QPixmap(100, 400)
+    preview.set_image(base, (1000, 4000))
+    assert preview.base_scale() == 0.1
+    assert preview.covers((0, 0, 1000, 4000), 0.1)
+    assert not preview.covers((0, 0, 500, 500), 0.5)
+    preview.set_detail(QPixmap(300, 300), (0, 0, 600, 600))
+    assert preview.covers((0, 0, 500, 500), 0.5)
+    # A refined base keeps the details; a new picture drops them
+    preview.set_image(QPixmap(200, 800), (1000, 4000), keep_view=True)
+    assert len(preview.image_label.details) == 1
+    preview.set_image(base, (1000, 3000))
+    assert preview.image_label.details == []
+    preview.image_label.setText("正在生成预览...")
+    assert preview.pixmap is None and preview.visible_box() is None
+
+def test_split_preview_grid_and_tiles():
+    from PyQt6.QtGui import QPixmap
+    from src.ui.widgets import PreviewWidget
+    from src.core.preview import grid_overlay
+    preview = PreviewWidget()
+    preview.set_image(QPixmap(300, 200))
+    preview.set_grid(grid_overlay((3001, 2003), (300, 200), rows=2, cols=3))
+    assert preview.tiles.count() == 6
+    assert preview.tiles.item(5).text() == "6\n1001×1002"
+    assert preview.label.boxes[-1] == (200, 100, 300, 200)
+    preview.set_grid(None)
+    assert preview.tiles.count() == 0 and preview.label.boxes == []
+    preview.clear()
+    assert preview.label.pixmap is None and preview.label.text() == "预览区域"
@@ -0,0 +1,146 @@
+import os
+import time
+import pytest
+from PIL import Image
+from src.core.watcher import HotFolderWatcher, StabilityTracker, WatchStats, InotifySource, PollingSource
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+def make_image(path, color):
+    Image.new('RGB', (20, 20), color=color).save(path)
+
+@pytest.fixture
+def dirs(tmp_path):
+    inbox = os.path.join(tmp_path, "in")
+    outbox = os.path.join(tmp_path, "out")
+    os.makedirs(inbox)
+    return inbox, outbox
+
+def test_tracker_waits_until_file_settles(tmp_path):
+    clock = FakeClock()
+    tracker = StabilityTracker(settle=1.0, clock=clock)
+    path = os.path.join(tmp_path, "a.png")
+    with open(path, 'wb') as f:
+        f.write(b"partial")
+    tracker.touch(path)
+    assert tracker.ready() == []
+    clock.now = 0.5
+    assert tracker.ready() == []
+    # Still being written: the settle period restarts
+    with open(path, 'ab') as f:
+        f.write(b" more")
+    os.utime(path, ns=(1, 1))
+    clock.now = 1.2
+    assert tracker.ready() == []
+    clock.now = 2.5
+    assert tracker.ready() == [(path, 0.0)]
+    assert len(tracker) == 0
+
+def test_tracker_drops_deleted_files(tmp_path):
+    tracker = StabilityTracker(settle=0.0, clock=FakeClock())
+    tracker.touch(os.path.join(tmp_path, "gone.png"))
+    assert tracker.ready() == []
+    assert len(tracker) == 0
+
+def test_stats_throughput_and_latency():
+    clock = FakeClock()
+    stats = WatchStats(clock)
+    clock.now = 30.0
+    for latency in (1.0, 2.0, 3.0):
+        stats.record('processed', latency)
+    stats.record('skipped')
+    stats.record('failed')
+    s = stats.snapshot()
+    assert (s['processed'], s['skipped'], s['failed']) == (3, 1, 1)
+    assert s['per_minute'] == pytest.approx(6.0)
+    assert s['latency_p50'] == 2.0
+    # Completions age out of the throughput window
+    clock.now = 200.0
+    assert stats.snapshot()['per_minute'] == 0.0
+
+def test_polling_source_reports_changes(tmp_path):
+    make_image(os.path.join(tmp_path, "old.png"), 'red')
+    source = PollingSource(str(tmp_path))
+    assert source.wait(0) == []
+    make_image(os.path.join(tmp_path, "new.png"), 'blue')
+    assert source.wait(0) == ["new.png"]
+
+@pytest.mark.skipif(not InotifySource.available(), reason="inotify is Linux only")
+def test_inotify_source_reports_closed_files(tmp_path):
+    source = InotifySource(str(tmp_path))
+    try:
+        make_image(os.path.join(tmp_path, "new.png"), 'blue')
+        assert "new.png" in source.wait(2.0)
+    finally:
+        source.close()
+
+@pytest.mark.parametrize("use_inotify", [False, InotifySource.available()])
+def test_watcher_splits_new_files(dirs, use_inotify):
+    inbox, outbox = dirs
+    results = []
+    watcher = HotFolderWatcher(inbox, outbox, settle=0.1, poll_interval=0.05,
+                               use_inotify=use_inotify, on_result=lambda p, o: results.append((p, o)))
+    watcher.start()
+    try:
+        make_image(os.path.join(inbox, "a.png"), 'red')
+        make_image(os.path.join(inbox, ".hidden.png"), 'red')
+        assert wait_for(lambda: len(results) == 1)
+        assert sorted(n for n in os.listdir(outbox) if not n.startswith(".")) == ["a_1.png", "a_2.png", "a_3.png", "a_4.png"]
+    finally:
+        watcher.stop()
+    assert watcher.stats.processed == 1
+
+def test_restart_does_not_reprocess(dirs):
+    inbox, outbox = dirs
+    make_image(os.path.join(inbox, "a.png"), 'red')
+    first = HotFolderWatcher(inbox, outbox, settle=0.05, poll_interval=0.05, use_inotify=False)
+    first.start()
+    assert wait_for(lambda: first.stats.processed == 1)
+    first.stop()
+
+    make_image(os.path.join(inbox, "b.png"), 'green')
+    second = HotFolderWatcher(inbox, outbox, settle=0.05, poll_interval=0.05, use_inotify=False)
+    second.start()
+    assert wait_for(lambda: second.stats.processed + second.stats.skipped == 2)
+    second.stop()
+    assert (second.stats.processed, second.stats.skipped) == (1, 1)
+
+def test_jobs_can_be_run_elsewhere(dirs):
+    inbox, outbox = dirs
+    jobs = []
+    watcher = HotFolderWatcher(inbox, outbox, settle=0.05, poll_interval=0.05, use_inotify=False, max_pending=1,
+                               run_job=lambda path, job: jobs.append((path, job)))
+    make_image(os.path.join(inbox, "a.png"), 'red')
+    make_image(os.path.join(inbox, "b.png"), 'green')
+    watcher.start()
+    try:
+        assert wait_for(lambda: len(jobs) == 1)
+        assert watcher._executor is None
+        time.sleep(0.2)
+        # Back-pressure holds the second file until the first job ran
+        assert len(jobs) == 1 and watcher.pending_count() == 2
+        jobs[0][1]()
+        assert wait_for(lambda: len(jobs) == 2)
+        jobs[1][1]()
+    finally:
+        watcher.stop()
+    assert sorted(os.path.basename(path) for path, _ in jobs) == ["a.png", "b.png"]
+    assert watcher.stats.processed == 2
+
+def test_output_inside_watched_folder_is_rejected(dirs):
+    inbox, _ = dirs
+    with pytest.raises(ValueError):
+        HotFolderWatcher(inbox, inbox)
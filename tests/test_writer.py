@@ -0,0 +1,155 @@
+import io
+import os
+import tarfile
+import threading
+import zipfile
+import pytest
+from PIL import Image
+from src.core.journal import JobJournal
+from src.core.processor import ImageProcessor, OperationCancelled
+from src.core.writer import AsyncWriter, ArchiveWriter, write_file
+
+@pytest.fixture
+def writer():
+    w = AsyncWriter(io_threads=2, max_pending=4)
+    yield w
+    w.close()
+
+def test_write_file_atomic_leaves_no_temp(tmp_path):
+    path = os.path.join(tmp_path, "out.bin")
+    write_file(path, b"data")
+    assert open(path, 'rb').read() == b"data"
+    assert os.listdir(tmp_path) == ["out.bin"]
+
+def test_submit_returns_future(writer, tmp_path):
+    paths = [os.path.join(tmp_path, f"f{i}.bin") for i in range(20)]
+    futures = [writer.submit(p, bytes([i])) for i, p in enumerate(paths)]
+    assert [f.result(timeout=5) for f in futures] == paths
+    for i, p in enumerate(paths):
+        assert open(p, 'rb').read() == bytes([i])
+
+def test_write_error_is_reported_through_future(writer, tmp_path):
+    future = writer.submit(os.path.join(tmp_path, "missing", "f.bin"), b"x")
+    with pytest.raises(OSError):
+        future.result(timeout=5)
+
+def test_submit_blocks_when_queue_is_full(tmp_path, monkeypatch):
+    gate = threading.Event()
+    import src.core.writer as writer_module
+    real_write = writer_module.write_file
+    monkeypatch.setattr(writer_module, "write_file", lambda *a: (gate.wait(), real_write(*a)))
+    w = AsyncWriter(io_threads=1, max_pending=2)
+    try:
+        submitted = []
+
+        def producer():
+            for i in range(6):
+                submitted.append(w.submit(os.path.join(tmp_path, f"f{i}.bin"), b"x"))
+
+        t = threading.Thread(target=producer)
+        t.start()
+        t.join(0.3)
+        # One write in progress plus a full queue; the producer is held back
+        assert t.is_alive()
+        assert len(submitted) < 6
+        gate.set()
+        t.join(5)
+        assert all(f.result(timeout=5) for f in submitted)
+    finally:
+        gate.set()
+        w.close()
+
+def test_split_through_custom_writer(writer, tmp_path):
+    source = os.path.join(tmp_path, "source.png")
+    Image.new('RGB', (40, 40), color='blue').save(source)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    outputs = ImageProcessor.split_image(source, out_dir, rows=3, cols=3, writer=writer)
+    assert len(outputs) == 9
+    assert all(os.path.exists(p) for p in outputs)
+
+def test_closed_writer_rejects_submissions(tmp_path):
+    w = AsyncWriter(io_threads=1)
+    w.close()
+    with pytest.raises(RuntimeError):
+        w.submit(os.path.join(tmp_path, "f.bin"), b"x")
+
+def _source(tmp_path, name="source.png", size=(40, 40)):
+    source = os.path.join(tmp_path, name)
+    Image.new('RGB', size, color='blue').save(source)
+    return source
+
+@pytest.mark.parametrize("kind", ["zip", "tar"])
+def test_split_into_per_input_archive(tmp_path, kind):
+    source = _source(tmp_path)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    journal = JobJournal(out_dir)
+    outputs = ImageProcessor.split_image(source, out_dir, rows=2, cols=2, journal=journal, archive=kind)
+    assert outputs == [os.path.join(out_dir, f"source.{kind}")]
+    assert sorted(n for n in os.listdir(out_dir) if not n.startswith('.')) == [f"source.{kind}"]
+    if kind == "zip":
+        with zipfile.ZipFile(outputs[0]) as zf:
+            names = zf.namelist()
+            assert all(i.compress_type == zipfile.ZIP_STORED for i in zf.infolist())
+    else:
+        with tarfile.open(outputs[0]) as tf:
+            names = tf.getnames()
+    assert names == [f"source_{i}.png" for i in range(1, 5)]
+    # The journal records the archive, so a rerun is skipped
+    assert ImageProcessor.split_image(source, out_dir, rows=2, cols=2, journal=journal, archive=kind) == outputs
+
+def test_shared_archive_collects_several_inputs(tmp_path):
+    first = _source(tmp_path, "a.png")
+    second = _source(tmp_path, "b.png")
+    archive_path = os.path.join(tmp_path, "batch.zip")
+    w = ArchiveWriter(archive_path, root=str(tmp_path))
+    ImageProcessor.split_image(first, str(tmp_path), rows=1, cols=2, writer=w)
+    ImageProcessor.split_image(second, os.path.join(tmp_path, "sub"), rows=1, cols=2, writer=w)
+    assert not os.path.exists(archive_path)
+    w.close()
+    with zipfile.ZipFile(archive_path) as zf:
+        assert zf.namelist() == ["a_1.png", "a_2.png", "sub/b_1.png", "sub/b_2.png"]
+        with Image.open(io.BytesIO(zf.read("sub/b_2.png"))) as tile:
+            assert tile.size == (20, 40)
+    assert not os.path.exists(os.path.join(tmp_path, "sub"))
+
+def test_failed_split_leaves_no_archive(tmp_path, monkeypatch):
+    source = _source(tmp_path)
+    out_dir = os.path.join(tmp_path, "out")
+    os.makedirs(out_dir)
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(ArchiveWriter, "_write", fail)
+    with pytest.raises(Exception):
+        ImageProcessor.split_image(source, out_dir, rows=2, cols=2, archive="zip")
+    assert os.listdir(out_dir) == []
+
+def _cancel_at(step):
+    def progress(done, total):
+        if done >= step:
+            raise OperationCancelled()
+    return progress
+
+def test_cancelled_archive_split_keeps_existing_files(tmp_path):
+    source = _source(tmp_path, "a.png")
+    ImageProcessor.split_image(source, str(tmp_path), rows=2, cols=2)
+    loose = sorted(n for n in os.listdir(tmp_path) if n.startswith("a_"))
+    with pytest.raises(OperationCancelled):
+        ImageProcessor.split_image(source, str(tmp_path), rows=2, cols=2, archive="zip", progress_callback=_cancel_at(3))
+    assert sorted(n for n in os.listdir(tmp_path) if n.startswith("a_")) == loose
+    assert not os.path.exists(os.path.join(tmp_path, "a.zip"))
+
+def test_cancelled_input_leaves_no_entries_in_shared_archive(tmp_path):
+    first = _source(tmp_path, "a.png")
+    second = _source(tmp_path, "b.png")
+    ImageProcessor.split_image(second, str(tmp_path), rows=1, cols=2)
+    archive_path = os.path.join(tmp_path, "batch.zip")
+    w = ArchiveWriter(archive_path, root=str(tmp_path))
+    ImageProcessor.split_image(first, str(tmp_path), rows=1, cols=2, writer=w)
+    with pytest.raises(OperationCancelled):
+        ImageProcessor.split_image(second, str(tmp_path), rows=2, cols=2, writer=w, progress_callback=_cancel_at(2))
+    w.close()
+    with zipfile.ZipFile(archive_path) as zf:
+        assert zf.namelist() == ["a_1.png", "a_2.png"]
+    assert os.path.exists(os.path.join(tmp_path, "b_1.png")) and os.path.exists(os.path.join(tmp_path, "b_2.png"))
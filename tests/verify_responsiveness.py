@@ -0,0 +1,285 @@
+import sys
+import os
+import time
+import shutil
+import tempfile
+import argparse
+
+# Run headless unless the caller explicitly picked a platform
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import Qt, QObject, QTimer, QEventLoop, QModelIndex
+from PIL import Image
+
+from src.ui.main_window import MainWindow, PREVIEW_ADAPTIVE
+
+
+class LatencyProbe(QObject):
+    """
+    Measures event-loop latency with a precise heartbeat timer.
+    Every tick records how late it fired compared to its interval; a blocked
+    UI thread shows up as one large sample.
+    """
+    def __init__(self, interval_ms=5):
+        super().__init__()
+        self.interval_ms = interval_ms
+        self.samples = []
+        self._last = None
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self):
+        self.samples = []
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+        # Account for a stall that is still in progress when the scenario ends
+        self._tick()
+
+    def _tick(self):
+        now = time.perf_counter()
+        late_ms = (now - self._last) * 1000 - self.interval_ms
+        self.samples.append(max(0.0, late_ms))
+        self._last = now
+
+    def max_ms(self):
+        return max(self.samples) if self.samples else 0.0
+
+    def percentile_ms(self, pct):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+def pump_until(predicate, timeout_s, settle_s=0.5):
+    """
+    Runs the event loop until predicate() holds (then keeps pumping for
+    settle_s so deferred work is measured too) or the timeout expires.
+    Returns True if the predicate was satisfied.
+    """
+    loop = QEventLoop()
+    deadline = time.perf_counter() + timeout_s
+    state = {'done_at': None, 'ok': False}
+
+    def check():
+        now = time.perf_counter()
+        if state['done_at'] is None and predicate():
+            state['done_at'] = now
+            state['ok'] = True
+        if state['done_at'] is not None and now - state['done_at'] >= settle_s:
+            loop.quit()
+        elif now >= deadline:
+            loop.quit()
+
+    poller = QTimer()
+    poller.setInterval(20)
+    poller.timeout.connect(check)
+    poller.start()
+    loop.exec()
+    poller.stop()
+    return state['ok']
+
+
+_generated = [0]
+
+def make_images(directory, count, size=(64, 64)):
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for i in range(count):
+        p = os.path.join(directory, f"img_{i:05d}.png")
+        # Distinct content across all scenarios so import-time
+        # deduplication keeps every file
+        n = _generated[0]
+        _generated[0] += 1
+        Image.new('RGB', size, color=(n % 256, (n // 256) % 256, (n // 65536) % 256)).save(p)
+        files.append(p)
+    return files
+
+
+def loader_idle(widget):
+    return not widget.loader.isRunning() and not widget.loader.queue
+
+
+class ResponsivenessBenchmark:
+    def __init__(self, work_dir, window, probe, args):
+        self.work_dir = work_dir
+        self.window = window
+        self.probe = probe
+        self.args = args
+        self.results = []
+
+    def run_scenario(self, name, action, predicate, timeout_s):
+        print(f"Running scenario: {name}")
+        self.probe.start()
+        QTimer.singleShot(0, action)
+        completed = pump_until(predicate, timeout_s)
+        self.probe.stop()
+        result = {
+            'name': name,
+            'completed': completed,
+            'max_ms': self.probe.max_ms(),
+            'p99_ms': self.probe.percentile_ms(99),
+            'samples': len(self.probe.samples),
+        }
+        self.results.append(result)
+        return result
+
+    def scenario_drop_folder(self):
+        folder = os.path.join(self.work_dir, "drop")
+        make_images(folder, self.args.images)
+        return self.run_scenario(
+            f"drop {self.args.images}-image folder",
+            lambda: self.window.add_split_files([folder]),
+            lambda: self.window.split_list.count() >= self.args.images and loader_idle(self.window.split_list),
+            self.args.timeout
+        )
+
+    def scenario_reorder_stitch(self):
+        folder = os.path.join(self.work_dir, "stitch")
+        files = make_images(folder, self.args.stitch_images)
+        self.window.add_stitch_files(files)
+        pump_until(lambda: self.window.stitch_list.count() >= len(files), self.args.timeout)
+
+        model = self.window.stitch_list.model()
+        moves = {'left': self.args.reorders}
+
+        def move_once():
+            count = self.window.stitch_list.count()
+            model.moveRow(QModelIndex(), 0, QModelIndex(), count)
+            moves['left'] -= 1
+            if moves['left'] > 0:
+                QTimer.singleShot(50, move_once)
+
+        return self.run_scenario(
+            f"reorder stitch list x{self.args.reorders}",
+            move_once,
+            lambda: moves['left'] <= 0 and not self._preview_busy(),
+            self.args.timeout
+        )
+
+    def scenario_switch_preview_quality(self):
+        combo = self.window.combo_preview_quality
+        switches = {'left': self.args.quality_switches}
+
+        def switch_once():
+            combo.setCurrentIndex((combo.currentIndex() + 1) % combo.count())
+            switches['left'] -= 1
+            if switches['left'] > 0:
+                QTimer.singleShot(50, switch_once)
+
+        return self.run_scenario(
+            f"switch preview quality x{self.args.quality_switches}",
+            switch_once,
+            lambda: switches['left'] <= 0 and not self._preview_busy(),
+            self.args.timeout
+        )
+
+    def scenario_zoom_preview(self):
+        window = self.window
+        window.combo_preview_quality.setCurrentIndex(PREVIEW_ADAPTIVE)
+        pump_until(lambda: not self._preview_busy(), self.args.timeout)
+        preview = window.stitch_preview
+        bar = preview.scroll_area.verticalScrollBar()
+        steps = {'left': self.args.zooms}
+
+        def zoom_once():
+            preview.zoom_in()
+            bar.setValue(bar.maximum() // 2)
+            steps['left'] -= 1
+            if steps['left'] > 0:
+                QTimer.singleShot(200, zoom_once)
+
+        return self.run_scenario(
+            f"zoom adaptive preview x{self.args.zooms}",
+            zoom_once,
+            lambda: steps['left'] <= 0 and not preview.view_timer.isActive() and not self._preview_busy(),
+            self.args.timeout
+        )
+
+    def scenario_split(self):
+        folder = os.path.join(self.work_dir, "split_in")
+        out_dir = os.path.join(self.work_dir, "split_out")
+        os.makedirs(out_dir, exist_ok=True)
+        make_images(folder, self.args.split_files)
+        self.window.split_list.clear()
+        self.window.add_split_files([folder])
+        pump_until(lambda: self.window.split_list.count() >= self.args.split_files, self.args.timeout)
+        self.window.output_dir = out_dir
+
+        started = {'flag': False}
+
+        def start():
+            started['flag'] = True
+            self.window.process_split_tasks(None)
+
+        return self.run_scenario(
+            f"split {self.args.split_files} files",
+            start,
+            lambda: started['flag'] and self.window.active_tasks_count == 0,
+            self.args.timeout
+        )
+
+    def _preview_busy(self):
+        window = self.window
+        return any(worker is not None and worker.isRunning() for worker in (window.preview_worker, window.detail_worker)) \
+            or window.pending_detail is not None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure UI event-loop stalls of MainWindow under realistic scenarios.")
+    parser.add_argument("--threshold-ms", type=float, default=100.0, help="Fail if any stall exceeds this latency")
+    parser.add_argument("--images", type=int, default=10000, help="Images in the dropped folder")
+    parser.add_argument("--stitch-images", type=int, default=200, help="Images in the stitch list")
+    parser.add_argument("--reorders", type=int, default=10)
+    parser.add_argument("--quality-switches", type=int, default=6)
+    parser.add_argument("--zooms", type=int, default=6, help="Zoom steps on the adaptive stitch preview")
+    parser.add_argument("--split-files", type=int, default=1000, help="Files in the split run")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-scenario timeout in seconds")
+    parser.add_argument("--interval-ms", type=int, default=5, help="Heartbeat interval of the latency probe")
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
+    probe = LatencyProbe(args.interval_ms)
+
+    work_dir = tempfile.mkdtemp(prefix="responsiveness_")
+    try:
+        bench = ResponsivenessBenchmark(work_dir, window, probe, args)
+        bench.scenario_drop_folder()
+        bench.scenario_reorder_stitch()
+        bench.scenario_switch_preview_quality()
+        bench.scenario_zoom_preview()
+        bench.scenario_split()
+    finally:
+        window.split_list.loader.stop()
+        window.stitch_list.loader.stop()
+        window.threadpool.waitForDone()
+        window.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    failed = False
+    print(f"\n{'scenario':<40} {'max (ms)':>10} {'p99 (ms)':>10} {'samples':>8}  result")
+    for r in bench.results:
+        ok = r['completed'] and r['max_ms'] <= args.threshold_ms
+        failed = failed or not ok
+        verdict = "PASS" if ok else ("TIMEOUT" if not r['completed'] else "FAIL")
+        print(f"{r['name']:<40} {r['max_ms']:>10.1f} {r['p99_ms']:>10.1f} {r['samples']:>8}  {verdict}")
+
+    if failed:
+        print(f"FAIL: event loop stalled longer than {args.threshold_ms:.0f} ms")
+        return 1
+    print(f"PASS: no stall above {args.threshold_ms:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())